@@ -0,0 +1,131 @@
+import os
+import math
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+
+import metrics
+
+
+class Rejected(HTTPException):
+    """Raised when a request is not admitted: 429 for a caller over their rate, 503 when
+    the endpoint is saturated. Retry-After tells the client when to try again."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; each request takes one."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+
+class AdmissionLimiter:
+    """Admission control for one endpoint.
+
+    At most `max_concurrent` requests run at once and at most `max_queue` wait for a
+    slot, each for no longer than `queue_timeout` seconds. Anything beyond that is
+    rejected immediately with 503. Each caller also has a token bucket of `user_rate`
+    requests per second (bursting to `user_burst`); an empty bucket means 429.
+    """
+
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 user_rate: float, user_burst: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._buckets = {}
+        # Read by the admission gauges; outcomes and waits are counted in metrics
+        self.active = 0
+        self.queued = 0
+
+    def _check_rate(self, caller: str):
+        bucket = self._buckets.get(caller)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_IDLE_BUCKETS:
+                # Forget callers whose buckets have refilled; they start full again anyway
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.full()}
+            bucket = self._buckets[caller] = TokenBucket(self.user_rate, self.user_burst)
+        wait = bucket.take()
+        if wait:
+            metrics.admission_requests.inc(self.name, "rate_limited")
+            raise Rejected(429, "Too many requests, please slow down.", wait)
+
+    async def acquire(self, caller: str = None):
+        """Admits a request or raises Rejected. Pair every successful call with `release`."""
+        if caller is not None:
+            self._check_rate(caller)
+
+        if self._slots.locked() and self.queued >= self.max_queue:
+            metrics.admission_requests.inc(self.name, "overloaded")
+            raise Rejected(503, "Server is busy, please try again shortly.", self.queue_timeout)
+
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.admission_requests.inc(self.name, "overloaded")
+            raise Rejected(503, "Server is busy, please try again shortly.", self.queue_timeout)
+        finally:
+            self.queued -= 1
+            metrics.admission_wait_seconds.observe(time.monotonic() - start, self.name)
+
+        self.active += 1
+        metrics.admission_requests.inc(self.name, "admitted")
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self, caller: str = None):
+        await self.acquire(caller)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def limiter_from_env(name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                     user_rate: float, user_burst: float) -> AdmissionLimiter:
+    """Builds a limiter whose defaults can be overridden per endpoint, e.g.
+    ADMISSION_CONVERSATION_MAX_CONCURRENT=64 or ADMISSION_GENERATE_USER_RATE=0.5."""
+    prefix = f"ADMISSION_{name.upper()}_"
+    return AdmissionLimiter(
+        name=name,
+        max_concurrent=int(os.getenv(prefix + "MAX_CONCURRENT", max_concurrent)),
+        max_queue=int(os.getenv(prefix + "MAX_QUEUE", max_queue)),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", queue_timeout)),
+        user_rate=float(os.getenv(prefix + "USER_RATE", user_rate)),
+        user_burst=float(os.getenv(prefix + "USER_BURST", user_burst)),
+    )
@@ -0,0 +1,116 @@
+"""Prompt size per turn of a 50-turn onboarding conversation, full history vs. windowed.
+
+The windowed run uses the onboarding runner's before_model callback, and checks
+that the profile answers from the first turns are still in session state and in
+the prompt after those turns have left the window. Exits with status 1 if not.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_context_window --turns 50
+"""
+import io
+import sys
+import json
+import asyncio
+import argparse
+import contextlib
+
+from google.genai import types
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from fitness_agents.multi_tool_agent import front_manager, context_window, profile_extractor, session_runner
+from benchmarks.fakes import FakeLlm
+
+SCRIPT = [
+    "Hi! I'm ready to get started.",
+    "I'm 5 foot 9 and weigh about 150 pounds. I'm 25.",
+    "I'd say I'm a beginner, I haven't worked out in years.",
+    "Around 30 minutes a day works for me.",
+    "Mostly I want to lose weight and feel more energetic.",
+    "I don't have any equipment at home, and I'm vegetarian.",
+]
+CHATTER = [
+    "Work has been stressful so I tend to skip exercise when I'm tired.",
+    "I used to play soccer in high school and loved the team aspect.",
+    "Mornings are easier for me than evenings.",
+    "My knees get a little sore when I run on pavement.",
+    "My sister wants to join me sometimes, which keeps me motivated.",
+]
+# What the profile extractor should have stored from SCRIPT by the end of the conversation
+EXPECTED_FIELDS = {
+    "height": '5\'9"', "weight": "150 lbs", "age": 25, "fitness_level": "beginner",
+    "workout_time": "30 minutes", "goal": "weight loss", "preferences": "no equipment; vegetarian",
+}
+
+
+def scripted_messages(turns: int) -> list[str]:
+    return [SCRIPT[n] if n < len(SCRIPT) else CHATTER[n % len(CHATTER)] for n in range(turns)]
+
+
+async def replay(messages: list[str], callback) -> tuple:
+    """Runs the conversation; returns the prompt sizes, the final session state and the last request."""
+    model = FakeLlm(reply="That's really helpful, thank you for sharing! " * 4)
+    requests = []
+
+    def recording(callback_context, llm_request):
+        result = callback(callback_context, llm_request) if callback else None
+        requests.append(llm_request)
+        return result
+
+    agent = front_manager.create_front_agent(before_model_callback=recording)
+    agent.model = model
+    service = InMemorySessionService()
+    service.create_session(app_name="bench", user_id="bench-user", session_id="bench-session")
+    runner = Runner(agent=agent, app_name="bench", session_service=service)
+    for message in messages:
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        async for _ in runner.run_async(user_id="bench-user", session_id="bench-session", new_message=content):
+            pass
+    session = service.get_session(app_name="bench", user_id="bench-user", session_id="bench-session")
+    return model.prompt_sizes, session.state, requests[-1]
+
+
+def check_profile_fields(state: dict, last_request) -> list[str]:
+    """Failures if the SCRIPT answers were lost from state or from the final, windowed prompt."""
+    failures = []
+    stored = state.get(profile_extractor.PROFILE_STATE_KEY) or {}
+    if stored != EXPECTED_FIELDS:
+        failures.append(f"state[{profile_extractor.PROFILE_STATE_KEY!r}] is {stored}, expected {EXPECTED_FIELDS}")
+    sent = " ".join(part.text for content in last_request.contents for part in content.parts or [] if part.text)
+    if SCRIPT[1] in sent:
+        failures.append("the profile answers are still in the verbatim window; use more --turns")
+    instruction = str(last_request.config.system_instruction or "")
+    for field, value in EXPECTED_FIELDS.items():
+        if json.dumps({field: value})[1:-1] not in instruction:
+            failures.append(f"{field}={value!r} is missing from the last prompt")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    messages = scripted_messages(args.turns)
+    with contextlib.redirect_stdout(io.StringIO()):
+        full, _, _ = asyncio.run(replay(messages, None))
+        windowed, state, last_request = asyncio.run(replay(messages, session_runner._before_model))
+
+    print(f"window: last {context_window.CONTEXT_WINDOW_TURNS} turns verbatim")
+    print(f"{'turn':>4} {'full chars':>11} {'windowed chars':>15}")
+    for turn, (a, b) in enumerate(zip(full, windowed), start=1):
+        print(f"{turn:>4} {a:>11} {b:>15}")
+    print(f"total prompt chars: full {sum(full)}, windowed {sum(windowed)} "
+          f"({100 * (1 - sum(windowed) / sum(full)):.0f}% smaller)")
+
+    failures = check_profile_fields(state, last_request)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: all {len(EXPECTED_FIELDS)} profile fields survive windowing")
+
+
+if __name__ == "__main__":
+    main()
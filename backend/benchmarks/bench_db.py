@@ -0,0 +1,116 @@
+"""Concurrent request throughput with blocking vs. offloaded Mongo calls.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_db --requests 400 --concurrency 50 --latency 0.01
+
+Also checks that a read racing a write cannot leave the old document in the user
+cache, and exits with status 1 if it does.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("DB_NAME", "bench")
+# Seeded users have no profile; pre-warming their onboarding would call the model
+os.environ.setdefault("ONBOARDING_PREWARM", "false")
+
+import httpx
+import db
+import server
+from benchmarks.fakes import FakeCollection, seed_users
+
+
+class BlockingCollection:
+    """Mimics the old handlers: the sync driver call runs on the event loop."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return self.collection.insert_one(*args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return self.collection.update_one(*args, **kwargs)
+
+
+class SlowReadCollection(FakeCollection):
+    """Returns what it read `delay` seconds earlier, like a query overtaken by a write."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def find_one(self, *args, **kwargs):
+        document = super().find_one(*args, **kwargs)
+        time.sleep(self.delay)
+        return document
+
+
+async def stale_read(delay: float = 0.05):
+    """Reads a user while its details are updated; returns the age a later read sees."""
+    users = SlowReadCollection(delay)
+    auth0_id = seed_users(users, 1)[0]
+    db.use_collections(users, FakeCollection())
+    users.delay = 0
+    await db.update_user_details(auth0_id, {"age": 30})
+    users.delay = delay
+    read = asyncio.create_task(db.get_user(auth0_id))
+    await asyncio.sleep(delay / 2)  # The read has fetched the document but not returned yet
+    await db.update_user_details(auth0_id, {"age": 31})
+    await read
+    user = await db.get_user(auth0_id)
+    return user["details"]["age"]
+
+
+async def drive(total: int, concurrency: int, user_ids: list[str]) -> float:
+    transport = httpx.ASGITransport(app=server.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def one(n):
+            async with semaphore:
+                response = await http.get(f"/users/{user_ids[n % len(user_ids)]}")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated Mongo round trip in seconds")
+    args = parser.parse_args()
+
+    users = FakeCollection(latency=args.latency)
+    workouts = FakeCollection(latency=args.latency)
+    user_ids = seed_users(users, 100)
+
+    modes = {
+        "blocking": (BlockingCollection(users), BlockingCollection(workouts)),
+        f"offloaded (executor={db.DB_EXECUTOR_WORKERS})": (users, workouts),
+    }
+    for label, (users_backend, workouts_backend) in modes.items():
+        if isinstance(users_backend, BlockingCollection):
+            db.users_collection, db.workouts_collection = users_backend, workouts_backend
+        else:
+            db.use_collections(users_backend, workouts_backend)
+        elapsed = asyncio.run(drive(args.requests, args.concurrency, user_ids))
+        print(f"{label:<28} {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f}s for {args.requests} requests)")
+
+    age = asyncio.run(stale_read())
+    print(f"read racing a write          cached age {age} (written 31)")
+    if age != 31:
+        print("FAIL: a read that started before a write cached the old document")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
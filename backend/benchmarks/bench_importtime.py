@@ -0,0 +1,110 @@
+"""Cold start: how long `import server` takes and which packages that time goes to.
+
+Imports the server in a fresh interpreter under `python -X importtime` and reports:
+- the total import time;
+- the packages with the most import time of their own;
+- which heavy SDKs were loaded eagerly.
+It then does the same for the startup warmup, which loads what the server defers.
+Exits with status 1 if importing the server takes more than --budget-ms, or if it
+loads any SDK that should wait for first use:
+
+    python -m benchmarks.bench_importtime --budget-ms 1500 --output importtime.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use or by the startup warmup, never by `import server`
+DEFERRED = ("google.adk", "google.genai", "openai", "litellm", "tiktoken", "tokenizers")
+
+CHILD = """
+import sys, json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter() - start
+if {warm_up}:
+    server.warm_up_backends()
+print(json.dumps({{"seconds": imported, "total_seconds": time.perf_counter() - start,
+                  "modules": sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Self time in seconds per top-level package, from -X importtime output."""
+    per_package = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return dict(per_package)
+
+
+def measure(warm_up: bool) -> dict:
+    env = {**os.environ, "DB_NAME": os.environ.get("DB_NAME", "bench"),
+           "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD.format(warm_up=warm_up)],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Importing the server failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["packages"] = parse_importtime(result.stderr)
+    modules = report.pop("modules")
+    report["deferred_loaded"] = sorted({prefix for prefix in DEFERRED for module in modules
+                                        if module == prefix or module.startswith(prefix + ".")})
+    return report
+
+
+def print_top(packages: dict, top: int):
+    for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<28} {seconds * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    cold = measure(warm_up=False)
+    warm = measure(warm_up=True)
+    # Warmup-only packages: what the lazy imports keep off the startup path
+    deferred = {package: seconds - cold["packages"].get(package, 0.0)
+                for package, seconds in warm["packages"].items()
+                if seconds - cold["packages"].get(package, 0.0) > 0.0005}
+
+    print(f"import server: {cold['seconds'] * 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    print_top(cold["packages"], args.top)
+    print(f"startup warmup, off the startup path: {(warm['total_seconds'] - warm['seconds']) * 1000:.0f} ms")
+    print_top(deferred, args.top)
+
+    report = {"import_ms": cold["seconds"] * 1000, "budget_ms": args.budget_ms,
+              "warmup_ms": (warm["total_seconds"] - warm["seconds"]) * 1000,
+              "import_packages_ms": {package: seconds * 1000 for package, seconds in cold["packages"].items()},
+              "warmup_packages_ms": {package: seconds * 1000 for package, seconds in deferred.items()},
+              "deferred_loaded_at_import": cold["deferred_loaded"]}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    failed = False
+    if cold["deferred_loaded"]:
+        print(f"FAIL: `import server` loads {', '.join(cold['deferred_loaded'])}; they should load on first use")
+        failed = True
+    if cold["seconds"] * 1000 > args.budget_ms:
+        print(f"FAIL: `import server` is over its {args.budget_ms:.0f} ms budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
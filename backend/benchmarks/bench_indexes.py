@@ -0,0 +1,93 @@
+"""Lookup latency on a large users collection, before and after the startup indexes.
+
+Needs a local mongod (a throwaway database is created and dropped):
+
+    python -m benchmarks.bench_indexes --url mongodb://localhost:27017 --users 1000000
+
+Exits with status 1 if the existence check is not covered by the auth0_id index,
+i.e. if Mongo still fetches documents to answer it.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import asyncio
+import statistics
+
+from pymongo import MongoClient, InsertOne
+
+os.environ.setdefault("DB_NAME", "bench")
+
+import db
+
+
+# What db.user_exists asks for: only indexed fields, so the index alone answers it
+EXISTS_PROJECTION = {"_id": 0, "auth0_id": 1}
+
+
+def seed(collection, count: int, batch: int = 10000):
+    for start in range(0, count, batch):
+        collection.bulk_write([InsertOne({
+            "auth0_id": f"bench-user-{n}",
+            "name": f"Bench User {n}",
+            "email": f"bench{n}@example.com",
+            "details": {"height": "5'9\"", "weight": "150 lbs", "age": 30, "fitness_level": "beginner",
+                        "workout_time": "30 minutes", "goal": "lose weight",
+                        "preferences": "no equipment", "tailoring": "x" * 500},
+        }) for n in range(start, min(start + batch, count))], ordered=False)
+
+
+def timed_lookups(collection, count: int, queries: int, projection=None) -> list[float]:
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(queries):
+        auth0_id = f"bench-user-{rng.randrange(count)}"
+        start = time.perf_counter()
+        collection.find_one({"auth0_id": auth0_id}, projection)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list[float]):
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{label:<34} p50 {statistics.median(ordered):9.3f} ms  p95 {p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50, help="lookups per scenario (unindexed scans are slow)")
+    args = parser.parse_args()
+
+    client = MongoClient(args.url)
+    scratch = client["bench_indexes"]
+    client.drop_database(scratch)
+    users = scratch["users"]
+    try:
+        start = time.perf_counter()
+        seed(users, args.users)
+        print(f"seeded {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        report("no index, full document", timed_lookups(users, args.users, args.queries))
+
+        # Build the same indexes the app creates at startup
+        db.use_collections(users, scratch["workouts"])
+        asyncio.run(db.ensure_indexes())
+
+        report("auth0_id index, full document", timed_lookups(users, args.users, args.queries * 20))
+        report("auth0_id index, existence check", timed_lookups(users, args.users, args.queries * 20, EXISTS_PROJECTION))
+        plan = users.find({"auth0_id": "bench-user-0"}, EXISTS_PROJECTION).explain()
+        examined = plan["executionStats"]["totalDocsExamined"]
+        print(f"existence check examined {examined} documents")
+        if examined:
+            print("FAIL: the existence check is not covered by the auth0_id index")
+            sys.exit(1)
+    finally:
+        client.drop_database(scratch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""End-to-end load test of the backend, in-process and offline.
+
+Each simulated user walks the app's real path through its endpoints:
+- sign up and open the dashboard;
+- hold the onboarding conversation, partly over SSE, until the agent calls
+  create_profile_json;
+- send a voice note;
+- generate a workout and long-poll for it.
+The app is started with its lifespan in this process. Mongo, the model and Whisper
+are replaced by the stand-ins in benchmarks.fakes, with configurable latencies, so
+a run is reproducible. Per endpoint it reports p50/p95/p99 latency and throughput,
+and --output writes the results as JSON for comparison across commits. Exits with
+status 1 if a flow fails or any endpoint's error rate is above --max-error-rate:
+
+    python -m benchmarks.bench_load --users 200 --concurrency 50 --output load.json
+
+The model replays a recording keyed by each request's newest message. Without
+--replay it uses the built-in onboarding script below. `--record FILE` runs one flow
+against the real models (credentials required) and saves their replies for --replay.
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+os.environ.setdefault("DB_NAME", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+# Scripted users send turns far faster than people do; lift the per-caller rate limits
+# (concurrency limits stay) so the run measures latency rather than 429s
+for limiter in ("ONBOARDING", "CONVERSATION", "GENERATE"):
+    os.environ.setdefault(f"ADMISSION_{limiter}_USER_BURST", "1000000")
+# The flows reach the voice note in lockstep, more at once than the default queue holds
+os.environ.setdefault("ADMISSION_TRANSCRIBE_MAX_QUEUE", "1000000")
+
+PROFILE = {"height": "5'9\"", "weight": "150 lbs", "age": 30, "fitness_level": "beginner",
+           "workout_time": "30 minutes", "goal": "lose weight", "preferences": "no equipment",
+           "tailoring": "Works long hours and gets bored with repetitive routines."}
+
+# (user message, agent reply); the last reply is the create_profile_json call
+SCRIPT = [
+    ("Hi! I'm 5'9\", 150 lbs and 30 years old.", "Great, thanks! How would you describe your fitness level?"),
+    ("I'd say I'm a beginner.", "How long would you like each workout to be?"),
+    ("About 30 minutes a day.", "What's your main goal: weight loss, muscle gain, endurance or something else?"),
+    ("I want to lose weight.", "Any equipment, dietary restrictions or workout types I should know about?"),
+    ("No equipment, I work out at home.", "What usually gets in the way of working out for you?"),
+    ("I work long hours and get bored with repetitive routines.", None),
+]
+GREETING = "Hi, I'm your coach! Let's build your plan. What's your height, weight and age?"
+SIGN_OFF = "You're all set! I've saved your profile. Your first workout is on its way."
+
+
+def scripted_recording() -> dict:
+    """The onboarding replies for SCRIPT in the recording format ReplayLlm reads."""
+    from benchmarks.fakes import text_response, tool_call_response
+    recording = {"user:Start the conversation.": [text_response(GREETING)],
+                 "tool:create_profile_json": [text_response(SIGN_OFF)]}
+    for message, reply in SCRIPT:
+        response = text_response(reply) if reply else tool_call_response("create_profile_json", PROFILE)
+        recording[f"user:{message}"] = [response]
+    return recording
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def percentile(ordered: list, q: float) -> float:
+    # Nearest-rank percentile of an ascending list
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class Recorder:
+    """Latencies and status codes per endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, endpoint: str, seconds: float, status: int):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            statuses = self.statuses[endpoint]
+            endpoints[endpoint] = {
+                "requests": len(ordered),
+                "errors": sum(count for status, count in statuses.items() if status >= 400),
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "throughput_rps": len(ordered) / elapsed,
+                "p50_ms": percentile(ordered, 0.50) * 1000,
+                "p95_ms": percentile(ordered, 0.95) * 1000,
+                "p99_ms": percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return endpoints
+
+
+async def request(http, recorder: Recorder, endpoint: str, method: str, path: str, **kwargs):
+    start = time.perf_counter()
+    response = await http.request(method, path, **kwargs)
+    recorder.add(endpoint, time.perf_counter() - start, response.status_code)
+    return response
+
+
+async def stream(http, recorder: Recorder, endpoint: str, path: str, body: dict):
+    """Posts to an SSE endpoint, recording time to first event and to the end of the stream."""
+    start = time.perf_counter()
+    first = None
+    async with http.stream("POST", path, json=body) as response:
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("event:"):
+                first = time.perf_counter() - start
+    if first is not None:
+        recorder.add(f"{endpoint} (first event)", first, response.status_code)
+    recorder.add(endpoint, time.perf_counter() - start, response.status_code)
+
+
+async def user_flow(http, recorder: Recorder, n: int, audio: bytes, run_id: str):
+    auth0_id = f"load-{run_id}-{n}"
+    await request(http, recorder, "POST /users/", "POST", "/users/",
+                  json={"auth0_id": auth0_id, "name": f"Load User {n}", "email": f"load{n}@example.com"})
+    await request(http, recorder, "GET /users/{auth0_id}", "GET", f"/users/{auth0_id}")
+    await request(http, recorder, "POST /onboarding/start_onboarding", "POST", "/onboarding/start_onboarding",
+                  json={"auth0_id": auth0_id})
+
+    for turn, (message, _) in enumerate(SCRIPT):
+        body = {"auth0_id": auth0_id, "message": message}
+        if turn % 2:
+            await stream(http, recorder, "POST /workouts/add_to_workout_conversation/stream",
+                         "/workouts/add_to_workout_conversation/stream", body)
+        else:
+            await request(http, recorder, "POST /workouts/add_to_workout_conversation", "POST",
+                          "/workouts/add_to_workout_conversation", json=body)
+
+    await request(http, recorder, "POST /transcribe/", "POST", "/transcribe/",
+                  files={"file": ("recording.wav", audio, "audio/wav")}, data={"auth0_id": auth0_id})
+    await request(http, recorder, "GET /users/profile", "GET", "/users/profile", params={"auth0_id": auth0_id})
+
+    response = await request(http, recorder, "POST /workout/generate", "POST", "/workout/generate",
+                             json={"auth0_id": auth0_id})
+    if response.status_code == 202:
+        await request(http, recorder, "GET /workout/{workout_id}?wait", "GET",
+                      f"/workout/{response.json()['workout_id']}", params={"wait": 20})
+
+
+async def run(args) -> dict:
+    import httpx
+    import db
+    import server
+    import clients
+    from fitness_agents.multi_tool_agent import session_runner, workout_session, workout_engine
+    from benchmarks.fakes import FakeCollection, FakeTranscriptionClient, RecordingLlm, ReplayLlm, text_response
+
+    db.use_collections(FakeCollection(latency=args.db_latency), FakeCollection(latency=args.db_latency))
+    onboarding_agent = session_runner.get_runner().agent
+    workout_agent = workout_session.get_runner().agent
+    if args.record:
+        recorders = [RecordingLlm(inner=agent.canonical_model) for agent in (onboarding_agent, workout_agent)]
+        onboarding_agent.model, workout_agent.model = recorders
+    else:
+        recording = ReplayLlm.load(args.replay).recording if args.replay else scripted_recording()
+        # Workout requests embed the whole profile; unrecorded ones get a plan for PROFILE
+        plan = text_response(workout_engine.generate(PROFILE).model_dump_json())
+        onboarding_agent.model = ReplayLlm(latency=args.model_latency, recording=recording,
+                                           default=text_response("Could you tell me more?"))
+        workout_agent.model = ReplayLlm(latency=args.model_latency, recording=recording, default=plan)
+
+    recorder = Recorder()
+    audio = os.urandom(args.audio_kb * 1024)
+    run_id = f"{os.getpid()}{int(time.time())}"
+    slots = asyncio.Semaphore(args.concurrency)
+    failures = []
+
+    async def one(n):
+        async with slots:
+            try:
+                await user_flow(http, recorder, n, audio, run_id)
+            except Exception as e:
+                failures.append(repr(e))
+
+    # Before startup: the warm-up thread would otherwise replace it with a real client
+    if not args.record:
+        clients.openai = FakeTranscriptionClient(latency=args.transcribe_latency, text=SCRIPT[0][0])
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        async with server.lifespan(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+                start = time.perf_counter()
+                await asyncio.gather(*(one(n) for n in range(args.users)))
+                elapsed = time.perf_counter() - start
+
+    if args.record:
+        merged = {}
+        for model in recorders:
+            merged.update(model.recording)
+        with open(args.record, "w") as f:
+            json.dump(merged, f, indent=2)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "config": vars(args),
+        "seconds": elapsed,
+        "flows": {"completed": args.users - len(failures), "failed": len(failures),
+                  "per_second": (args.users - len(failures)) / elapsed, "failures": failures[:10]},
+        "replay_misses": 0 if args.record else onboarding_agent.model.misses + workout_agent.model.misses,
+        "endpoints": recorder.summary(elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="user flows to run")
+    parser.add_argument("--concurrency", type=int, default=50, help="user flows in flight")
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--model-latency", type=float, default=0.3)
+    parser.add_argument("--transcribe-latency", type=float, default=0.5)
+    parser.add_argument("--audio-kb", type=int, default=256)
+    parser.add_argument("--personalize", action="store_true", help="personalize workouts with the workout agent")
+    parser.add_argument("--replay", help="model recording to replay (default: the built-in script)")
+    parser.add_argument("--record", help="run one flow against the real models and save their replies here")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the server's own output")
+    parser.add_argument("--max-error-rate", type=float, default=0.01,
+                        help="fail when more than this share of an endpoint's requests get a 4xx/5xx")
+    args = parser.parse_args()
+    if args.record:
+        args.users = args.concurrency = 1
+    # Read by the server at import
+    os.environ["WORKOUT_LLM_PERSONALIZATION"] = "true" if args.personalize else "false"
+
+    results = asyncio.run(run(args))
+
+    print(f"{results['flows']['completed']}/{args.users} flows in {results['seconds']:.2f}s "
+          f"({results['flows']['per_second']:.1f} flows/s, concurrency {args.concurrency})")
+    print(f"{'endpoint':<62} {'reqs':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, stats in results["endpoints"].items():
+        print(f"{endpoint:<62} {stats['requests']:>6} {stats['errors']:>5} {stats['throughput_rps']:>7.1f} "
+              f"{stats['p50_ms']:>6.0f}ms {stats['p95_ms']:>6.0f}ms {stats['p99_ms']:>6.0f}ms")
+    for failure in results["flows"]["failures"]:
+        print(f"  failed flow: {failure}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.record:
+        print(f"Model replies recorded to {args.record}")
+    failing = {endpoint: stats["errors"] / stats["requests"] for endpoint, stats in results["endpoints"].items()
+               if stats["errors"] / stats["requests"] > args.max_error_rate}
+    for endpoint, rate in failing.items():
+        print(f"FAIL: {endpoint} error rate {rate:.1%} is over {args.max_error_rate:.1%}")
+    if results["flows"]["failed"]:
+        print(f"FAIL: {results['flows']['failed']} flows failed")
+    if failing or results["flows"]["failed"]:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Fails if any handler blocks the event loop for longer than a threshold.
+
+Drives every user-facing endpoint concurrently through the app (stand-in Mongo,
+model and transcription backends, lifespan included) and times every callback
+the loop runs; one over the threshold is a violation. A ticker also reports how
+late the loop wakes it up. That lag includes plain CPU saturation (many short
+callbacks from concurrent flows on a busy core), so it is reported, not gated.
+
+Everything is measured with asyncio's debug mode off: debug mode captures a
+traceback for every future and stalls the loop itself. On a violation the run is
+repeated in debug mode, only to report where the slow callbacks' tasks were
+created. The SDK warm-up and the benchmark's own client setup finish before
+measuring; the warm-up imports on a thread that holds the GIL, which delays the
+loop at startup however the handlers behave. Exits with status 1 on a violation,
+so it can gate CI:
+
+    python -m benchmarks.bench_loop_lag --users 50 --threshold-ms 50
+"""
+import io
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import contextlib
+import subprocess
+
+os.environ.setdefault("DB_NAME", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+# Seeded users have no profile; pre-warming their onboarding would call the model
+os.environ.setdefault("ONBOARDING_PREWARM", "false")
+# Warmed up explicitly before measuring, see above
+os.environ.setdefault("STARTUP_WARMUP", "false")
+# Every user uploads at once; let them all wait for a transcription slot instead of getting 503
+os.environ.setdefault("ADMISSION_TRANSCRIBE_MAX_QUEUE", "1000000")
+
+import httpx
+import db
+import server
+import clients
+from fitness_agents.multi_tool_agent import session_runner
+from benchmarks.fakes import FakeCollection, FakeLlm, FakeTranscriptionClient, seed_users
+
+PROFILE = {"height": "5'9\"", "weight": "150 lbs", "age": 30, "fitness_level": "beginner",
+           "workout_time": "30 minutes", "goal": "lose weight", "preferences": "no equipment", "tailoring": ""}
+
+
+class SlowCallbacks(logging.Handler):
+    """Collects asyncio debug-mode reports of callbacks that held the loop too long."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.reports = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.reports.append(message)
+
+
+class CallbackTimer:
+    """Times every callback the loop runs, the check debug mode makes without its overhead.
+
+    Keeps the `keep` slowest, each named by its task's coroutine and the line it
+    had reached when the callback returned.
+    """
+
+    def __init__(self, keep: int = 5):
+        self.keep = keep
+        self.slowest = []  # (seconds, name), slowest first
+        self._original = None
+
+    @staticmethod
+    def _name(handle) -> str:
+        task = getattr(handle._callback, "__self__", None)
+        if not isinstance(task, asyncio.Task):
+            return repr(handle)
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", type(coro).__name__)
+        frame = getattr(coro, "cr_frame", None)
+        if frame is None:
+            return name
+        return f"{name} at {os.path.relpath(frame.f_code.co_filename)}:{frame.f_lineno}"
+
+    def __enter__(self):
+        self._original = original = asyncio.events.Handle._run
+        timer = self
+
+        def timed(handle):
+            start = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                took = time.perf_counter() - start
+                if len(timer.slowest) < timer.keep or took > timer.slowest[-1][0]:
+                    timer.slowest.append((took, timer._name(handle)))
+                    timer.slowest.sort(key=lambda entry: -entry[0])
+                    del timer.slowest[timer.keep:]
+
+        asyncio.events.Handle._run = timed
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.events.Handle._run = self._original
+
+
+async def tick(interval: float, lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def user_flow(http: httpx.AsyncClient, n: int, audio: bytes):
+    auth0_id = f"lag-user-{n}"
+    calls = [
+        ("POST", "/users/", {"json": {"auth0_id": auth0_id, "name": f"Lag User {n}", "email": f"lag{n}@example.com"}}),
+        ("GET", f"/users/{auth0_id}", {}),
+        ("POST", "/onboarding/start_onboarding", {"json": {"auth0_id": auth0_id}}),
+        ("POST", "/workouts/add_to_workout_conversation", {"json": {"auth0_id": auth0_id, "message": "I'm 30."}}),
+        ("POST", "/workouts/add_to_workout_conversation/stream", {"json": {"auth0_id": auth0_id, "message": "Beginner."}}),
+        ("POST", "/transcribe/", {"files": {"file": ("recording.wav", audio, "audio/wav")}, "data": {"auth0_id": auth0_id}}),
+        ("POST", "/users/update-fitness-profile", {"json": {"auth0_id": auth0_id, "profile_json": PROFILE}}),
+        ("GET", "/users/profile", {"params": {"auth0_id": auth0_id}}),
+    ]
+    for method, path, kwargs in calls:
+        response = await http.request(method, path, **kwargs)
+        response.raise_for_status()
+
+    response = await http.post("/workout/generate", json={"auth0_id": auth0_id})
+    response.raise_for_status()
+    response = await http.get(f"/workout/{response.json()['workout_id']}", params={"wait": 5})
+    response.raise_for_status()
+
+
+async def run(args, timer: CallbackTimer = None) -> tuple[list, list]:
+    """Runs the user flows; returns the ticker's lags and, in debug mode, the slow callbacks.
+
+    `timer` times the loop's callbacks while the flows run.
+    """
+    loop = asyncio.get_running_loop()
+    loop.slow_callback_duration = args.threshold_ms / 1000
+    slow = SlowCallbacks()
+    asyncio_logger = logging.getLogger("asyncio")
+    asyncio_logger.setLevel(logging.WARNING)
+    asyncio_logger.addHandler(slow)
+
+    users, workouts = FakeCollection(latency=args.db_latency), FakeCollection(latency=args.db_latency)
+    seed_users(users, 100)
+    db.use_collections(users, workouts)
+    session_runner.get_runner().agent.model = FakeLlm(latency=args.model_latency)
+    audio = os.urandom(256 * 1024)
+
+    lags, stop = [], asyncio.Event()
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with server.lifespan(server.app):
+            await asyncio.to_thread(server.warm_up_backends)
+            clients.openai = FakeTranscriptionClient(latency=args.model_latency)
+            transport = httpx.ASGITransport(app=server.app)
+            # Creating the client loads TLS certificates; not part of what is measured
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+                with timer or contextlib.nullcontext():
+                    ticker = asyncio.create_task(tick(0.005, lags, stop))
+                    await asyncio.gather(*(user_flow(http, n, audio) for n in range(args.users)))
+                    stop.set()
+                    await ticker
+    asyncio_logger.removeHandler(slow)
+    return lags, slow.reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="concurrent user flows")
+    parser.add_argument("--threshold-ms", type=float, default=50)
+    parser.add_argument("--db-latency", type=float, default=0.005)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--debug", action="store_true", help="only name the callbacks over the threshold")
+    args = parser.parse_args()
+
+    if args.debug:
+        # Debug mode is slower across the board; the lag it measures is not the verdict
+        _, reports = asyncio.run(run(args), debug=True)
+        for report in reports:
+            print(f"  blocked: {report}")
+        if not reports:
+            print("  (no single callback over the threshold in debug mode)")
+        return
+
+    start = time.perf_counter()
+    timer = CallbackTimer()
+    lags, _ = asyncio.run(run(args, timer))
+    ordered = sorted(lags)
+    worst = ordered[-1] * 1000 if ordered else 0.0
+    p99 = ordered[int(len(ordered) * 0.99)] * 1000 if ordered else 0.0
+    print(f"{args.users} user flows in {time.perf_counter() - start:.2f}s; "
+          f"loop lag p99 {p99:.1f} ms, max {worst:.1f} ms")
+    print(f"slowest callbacks (threshold {args.threshold_ms:.0f} ms):")
+    for seconds, name in timer.slowest:
+        print(f"  {seconds * 1000:6.1f} ms  {name}")
+    if not timer.slowest or timer.slowest[0][0] * 1000 <= args.threshold_ms:
+        print("OK")
+        return
+
+    # A fresh process, since the app's state is bound to the event loop of the first run
+    subprocess.run([sys.executable, "-m", "benchmarks.bench_loop_lag", *sys.argv[1:], "--debug"])
+    print("FAIL: a callback blocked the event loop")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cost of recording metrics on the hot path.
+
+Times each recording primitive and the per-request cost of MetricsMiddleware on a
+bare app, then renders /metrics. Exits with status 1 if an observation costs more
+than --budget-us microseconds:
+
+    python -m benchmarks.bench_metrics --observations 1000000 --requests 5000
+"""
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+from fastapi import FastAPI
+
+import metrics
+
+
+def per_call_us(fn, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def bare_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"item_id": item_id}
+
+    if instrumented:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+async def request_us(app: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for n in range(100):  # Warm-up
+            await http.get(f"/items/{n}")
+        start = time.perf_counter()
+        for n in range(requests):
+            await http.get(f"/items/{n}")
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--observations", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--budget-us", type=float, default=5.0)
+    args = parser.parse_args()
+
+    primitives = {
+        "histogram.observe (existing series)": lambda: metrics.mongo_query_seconds.observe(0.004, "users", "find_one"),
+        "histogram.observe (3 labels)": lambda: metrics.http_request_seconds.observe(0.02, "GET", "/users/{auth0_id}", 200),
+        "time.perf_counter pair": lambda: time.perf_counter() - time.perf_counter(),
+    }
+    costs = {}
+    for label, fn in primitives.items():
+        costs[label] = per_call_us(fn, args.observations)
+        print(f"{label:<38} {costs[label]:6.3f} us")
+
+    plain = asyncio.run(request_us(bare_app(False), args.requests))
+    instrumented = asyncio.run(request_us(bare_app(True), args.requests))
+    print(f"{'request without middleware':<38} {plain:6.1f} us")
+    print(f"{'request with MetricsMiddleware':<38} {instrumented:6.1f} us ({instrumented - plain:+.1f} us)")
+
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"{'render /metrics':<38} {(time.perf_counter() - start) * 1e3:6.2f} ms ({len(body)} bytes)")
+
+    over = [label for label in primitives if "observe" in label and costs[label] > args.budget_us]
+    if over:
+        print(f"FAIL: over the {args.budget_us} us budget: {', '.join(over)}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
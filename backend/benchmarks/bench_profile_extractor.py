@@ -0,0 +1,135 @@
+"""Onboarding turns saved by extracting profile answers locally.
+
+Two checks on a scripted corpus of onboarding messages:
+- Accuracy: each message is labeled with the fields it states. The report gives
+  the share of fields found with the right normalized value, and the fields found
+  that the message never stated.
+- Turns: each message opens a simulated onboarding. Without extraction the coach
+  asks its five question groups in order, one turn each, as the agent instruction
+  says: height/weight/age, level, time, goal, preferences. With extraction it asks
+  only for groups the state is still missing, and each answer must be recognized
+  in the context of its question. Saved latency is saved turns times --turn-seconds.
+
+    python -m benchmarks.bench_profile_extractor --turn-seconds 1.5
+"""
+import time
+import argparse
+
+from fitness_agents.multi_tool_agent import profile_extractor
+
+CORPUS = [
+    ("My age is 25. My height is 5'9\". My weight is 150 lbs. I am a beginner. I prefer to work out for 30 minutes. "
+     "My goal is to lose weight. I have no dietary restrictions OR EQUIPMENT!",
+     {"height": "5'9\"", "weight": "150 lbs", "age": 25, "fitness_level": "beginner", "workout_time": "30 minutes",
+      "goal": "weight loss", "preferences": "no equipment; no dietary restrictions"}),
+    ("I'm 6 foot 1, about 82 kg and 41 years old. Intermediate, maybe an hour a day. I want to build muscle. "
+     "I have dumbbells and a resistance band, bad knees though.",
+     {"height": "6'1\"", "weight": "82 kg", "age": 41, "fitness_level": "intermediate", "workout_time": "60 minutes",
+      "goal": "muscle gain", "preferences": "dumbbells; resistance band; bad knees"}),
+    ("175cm, 11 stone 4 lbs, 28 yo, never really worked out, 20-30 minutes, want to get in shape, vegetarian",
+     {"height": "175 cm", "weight": "158 lbs", "age": 28, "fitness_level": "beginner", "workout_time": "20-30 minutes",
+      "goal": "general fitness", "preferences": "vegetarian"}),
+    ("Hi! I'm 5'4\", 130 pounds and 35. I'd like to improve my stamina for a half marathon.",
+     {"height": "5'4\"", "weight": "130 lbs", "age": 35, "goal": "endurance"}),
+    ("I'm a 52 year old advanced runner, 1.80 m, 70 kg, training for a marathon, about 1.5 hours per session.",
+     {"height": "180 cm", "weight": "70 kg", "age": 52, "fitness_level": "advanced", "workout_time": "90 minutes",
+      "goal": "endurance"}),
+    ("Half an hour is all I have. I go to the gym and want to get stronger.",
+     {"workout_time": "30 minutes", "goal": "muscle gain", "preferences": "gym access"}),
+    ("I'm 19 and pretty out of shape, I want to lose 20 pounds.",
+     {"age": 19, "fitness_level": "beginner", "goal": "weight loss"}),
+    ("I weigh 210 and I'm 6'3. Somewhat active. Back pain sometimes, so nothing too intense.",
+     {"height": "6'3\"", "weight": "210 lbs", "fitness_level": "intermediate", "preferences": "back pain"}),
+    ("I'm not a beginner, more intermediate. 45 min. Flexibility and mobility mostly. Gluten-free diet.",
+     {"fitness_level": "intermediate", "workout_time": "45 minutes", "goal": "flexibility",
+      "preferences": "gluten-free"}),
+    ("Just want to stay healthy. I only have a jump rope and a pull-up bar at home.",
+     {"goal": "general fitness", "preferences": "jump rope; pull up bar"}),
+    ("Hello! Excited to get started.", {}),
+    ("I live 30 minutes from the gym and I'm new to working out.", {"fitness_level": "beginner"}),
+]
+
+# (question the coach asks, fields it covers); the agent instruction's order
+QUESTIONS = [
+    ("What's your current height, weight, and age?", ("height", "weight", "age")),
+    ("How would you describe your fitness level: beginner, intermediate, or advanced?", ("fitness_level",)),
+    ("How long would you like each workout to be?", ("workout_time",)),
+    ("What is your goal: weight loss, muscle gain, endurance training, or anything else?", ("goal",)),
+    ("Any preferences or restrictions with equipment, diet or types of workout?", ("preferences",)),
+]
+
+# How a scripted user answers each question group
+ANSWERS = {
+    ("height", "weight", "age"): "I'm 5'7\", 160 lbs and 33 years old.",
+    ("fitness_level",): "Beginner, I think.",
+    ("workout_time",): "About 40",
+    ("goal",): "I want to lose weight.",
+    ("preferences",): "Nope, nothing",
+}
+
+
+def accuracy():
+    correct = stated = spurious = 0
+    misses = []
+    for text, expected in CORPUS:
+        found = profile_extractor.extract(text)
+        stated += len(expected)
+        for field, value in expected.items():
+            if found.get(field) == value:
+                correct += 1
+            else:
+                misses.append(f"{field}: expected {value!r}, got {found.get(field)!r} in {text[:50]!r}")
+        spurious += len(set(found) - set(expected))
+    return correct, stated, spurious, misses
+
+
+def simulate(opening: str) -> tuple[int, int, bool]:
+    """Turns to a complete profile without and with extraction, and whether every answer was recognized."""
+    known = profile_extractor.extract(opening)
+    turns = 1  # The opening message
+    recognized = True
+    for question, fields in QUESTIONS:
+        if all(field in known for field in fields):
+            continue
+        turns += 1
+        answer = profile_extractor.extract(ANSWERS[fields], question)
+        recognized &= all(field in answer for field in fields)
+        known.update(answer)
+    return 1 + len(QUESTIONS), turns, recognized
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turn-seconds", type=float, default=1.5, help="model round trip per onboarding turn")
+    parser.add_argument("--repeat", type=int, default=2000, help="extraction timing repetitions")
+    args = parser.parse_args()
+
+    correct, stated, spurious, misses = accuracy()
+    print(f"fields extracted correctly: {correct}/{stated} ({correct / stated:.0%}), spurious fields: {spurious}")
+    for miss in misses:
+        print(f"  miss  {miss}")
+
+    baseline_turns = extracted_turns = 0
+    all_recognized = True
+    for text, _ in CORPUS:
+        baseline, extracted, recognized = simulate(text)
+        baseline_turns += baseline
+        extracted_turns += extracted
+        all_recognized &= recognized
+    saved = baseline_turns - extracted_turns
+    print(f"onboarding question turns: {baseline_turns} -> {extracted_turns} over {len(CORPUS)} conversations "
+          f"({saved / baseline_turns:.0%} fewer, ~{saved * args.turn_seconds / len(CORPUS):.1f}s saved per user "
+          f"at {args.turn_seconds}s per turn)")
+    print(f"answers to direct questions recognized: {'all' if all_recognized else 'NOT all'}")
+
+    texts = [text for text, _ in CORPUS]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            profile_extractor.extract(text)
+    elapsed = time.perf_counter() - start
+    print(f"extraction cost: {elapsed / (args.repeat * len(texts)) * 1e6:.1f} us per message")
+
+
+if __name__ == "__main__":
+    main()
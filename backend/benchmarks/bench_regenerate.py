@@ -0,0 +1,79 @@
+"""Weekly regeneration of 100k users against a stand-in workout model.
+
+Needs a local mongod (a throwaway database is created and dropped). The run is
+stopped halfway and resumed from its checkpoint, as after a crash:
+
+    python -m benchmarks.bench_regenerate --url mongodb://localhost:27017 --users 100000
+"""
+import io
+import os
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+from pymongo import MongoClient, InsertOne
+
+os.environ.setdefault("DB_NAME", "bench")
+
+import db
+import regenerate_workouts
+from fitness_agents.multi_tool_agent import workout_engine, workout_session
+from benchmarks.fakes import FakeLlm
+from benchmarks.bench_workout_engine import random_profiles
+
+WEEK = "2025-W01"
+
+
+def seed(collection, count: int, batch: int = 10000):
+    profiles = random_profiles(count)
+    for start in range(0, count, batch):
+        collection.bulk_write([InsertOne({
+            "auth0_id": f"bench-user-{n}",
+            "name": f"Bench User {n}",
+            # Every tenth user never finished onboarding and is skipped
+            "details": {} if n % 10 == 0 else profiles[n],
+        }) for n in range(start, min(start + batch, count))], ordered=False)
+
+
+async def run(args, checkpoint: str):
+    reply = workout_engine.generate({}).model_dump_json()
+    workout_session.get_runner().agent.model = FakeLlm(reply=reply, latency=args.model_latency)
+
+    total_batches = -(-args.users // args.batch_size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = await regenerate_workouts.regenerate(WEEK, args.batch_size, args.concurrency, checkpoint,
+                                                     max_batches=total_batches // 2)
+        second = await regenerate_workouts.regenerate(WEEK, args.batch_size, args.concurrency, checkpoint)
+    for label, report in (("first half (interrupted)", first), ("resumed from checkpoint", second)):
+        print(f"{label:<26} {report['users_this_run']:>7} users in {report['seconds']:6.1f}s "
+              f"({report['users_per_second']:,.0f} users/s), {report['model_calls']} model calls")
+    print(f"total: {second['users']} users, {second['written']} workouts written, "
+          f"{second['skipped']} skipped, {second['fallbacks']} fallbacks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--model-latency", type=float, default=0.5, help="seconds per stand-in model call")
+    args = parser.parse_args()
+
+    client = MongoClient(args.url)
+    scratch = client["bench_regenerate"]
+    client.drop_database(scratch)
+    try:
+        seed(scratch["users"], args.users)
+        db.use_collections(scratch["users"], scratch["workouts"])
+        with tempfile.TemporaryDirectory() as directory:
+            asyncio.run(run(args, os.path.join(directory, "checkpoint.json")))
+        written = scratch["workouts"].count_documents({"plan_week": WEEK})
+        print(f"workouts stored for {WEEK}: {written}")
+    finally:
+        client.drop_database(scratch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Workout generation against a flaky model: no protection vs. retries, hedging and a breaker.
+
+The fake model fails 10% of calls with a 503 and takes 2s instead of 50ms on 3%
+of them. A second scenario takes the backend down to show the circuit breaker
+failing fast. A last check runs onboarding turns after the breaker's reset
+timeout and exits with status 1 unless the first, trial turn closes it again
+and every turn is recorded with outcome "ok".
+Run from the backend directory:
+
+    python -m benchmarks.bench_resilience --requests 400
+"""
+import io
+import sys
+import time
+import asyncio
+import argparse
+import contextlib
+
+import metrics
+
+from fitness_agents.multi_tool_agent import workout_session, workout_engine, resilience, session_runner
+from benchmarks.fakes import FakeLlm
+
+PROFILE = {"fitness_level": "beginner", "goal": "lose weight", "workout_time": "30 minutes", "preferences": "none"}
+
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def run(requests: int, concurrency: int, model: FakeLlm, policy: resilience.Resilience) -> dict:
+    workout_session.get_runner().agent.model = model
+    workout_session.workout_resilience = policy
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await workout_session.generate_exercises(PROFILE)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    # Warm-up fills the latency window the hedging threshold is computed from
+    for _ in range(policy.hedge_min_samples if policy.hedge else 0):
+        await one()
+    latencies.clear()
+    failures = 0
+    calls_before = len(model.prompt_sizes)
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return {
+        "success": 1 - failures / requests,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "model_calls": len(model.prompt_sizes) - calls_before,
+        "stats": policy.stats(),
+    }
+
+
+def flaky_model() -> FakeLlm:
+    reply = workout_engine.generate(PROFILE).model_dump_json()
+    return FakeLlm(reply=reply, latency=0.05, error_rate=0.10, slow_rate=0.03, slow_latency=2.0, seed=7)
+
+
+def report(label: str, result: dict):
+    print(f"{label:<28} success {result['success']:6.1%}  p50 {result['p50'] * 1000:7.1f} ms  "
+          f"p99 {result['p99'] * 1000:7.1f} ms  model calls {result['model_calls']}")
+
+
+async def half_open_trial(turns: int = 3) -> tuple:
+    """Non-streaming onboarding turns once an open breaker's reset timeout has passed.
+
+    Returns the breaker state after the turns, their replies and how many were
+    recorded as successful turns; a successful trial must leave the breaker closed
+    and no turn degraded.
+    """
+    policy = resilience.Resilience("onboarding", deadline=3, retries=0,
+                                   breaker=resilience.CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    session_runner.agent_resilience = policy
+    session_runner.get_runner().agent.model = FakeLlm()
+    policy.breaker.record_failure()  # Opens the breaker
+    await asyncio.sleep(0.1)  # ...and lets it go half-open
+    user_id = "bench-half-open"
+    runner = session_runner.create_session_runner(user_id)
+    ok_before = metrics.agent_turn_seconds.count("onboarding", "ok")
+    replies = [await session_runner.call_agent_async("Hi! I'm ready to get started.", runner, user_id)
+               for _ in range(turns)]
+    return policy.breaker.state, replies, metrics.agent_turn_seconds.count("onboarding", "ok") - ok_before
+
+
+async def main(requests: int, concurrency: int):
+    unprotected = resilience.Resilience("workout", deadline=60, retries=0,
+                                        breaker=resilience.CircuitBreaker(failure_threshold=10 ** 9))
+    protected = resilience.Resilience("workout", deadline=3, retries=2, backoff=0.05, hedge=True,
+                                      breaker=resilience.CircuitBreaker(failure_threshold=10 ** 9))
+    with contextlib.redirect_stdout(io.StringIO()):
+        baseline = await run(requests, concurrency, flaky_model(), unprotected)
+        guarded = await run(requests, concurrency, flaky_model(), protected)
+    report("no retries or hedging", baseline)
+    report("retries + hedging", guarded)
+    print(f"  retries {guarded['stats']['retries']}, hedged {guarded['stats']['hedged']}, "
+          f"hedge wins {guarded['stats']['hedge_wins']}")
+
+    # Backend outage: every call fails after 200ms. The breaker opens after 5 failures
+    # and the remaining requests fail in microseconds instead of waiting on the model.
+    down = FakeLlm(latency=0.2, error_rate=1.0)
+    breaker = resilience.Resilience("workout", deadline=3, retries=0,
+                                    breaker=resilience.CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    with contextlib.redirect_stdout(io.StringIO()):
+        outage = await run(requests, concurrency, down, breaker)
+    report("outage with breaker", outage)
+    print(f"  short-circuited {outage['stats']['short_circuited']} of {requests}, "
+          f"breaker {outage['stats']['breaker_state']}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        state, replies, recorded_ok = await half_open_trial()
+    degraded = replies.count(session_runner.DEGRADED_REPLY)
+    print(f"half-open onboarding trial     breaker {state}, {degraded} of {len(replies)} turns degraded, "
+          f"{recorded_ok} recorded as ok")
+    if state != "closed" or degraded:
+        print("FAIL: a successful trial turn must close the breaker")
+        sys.exit(1)
+    if recorded_ok != len(replies):
+        print('FAIL: successful turns must be recorded with outcome="ok"')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
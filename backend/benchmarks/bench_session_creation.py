@@ -0,0 +1,54 @@
+"""Onboarding session creation cost and resident memory, per-user vs. shared runner.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_session_creation --users 10000
+"""
+import io
+import time
+import argparse
+import tracemalloc
+import contextlib
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from fitness_agents.multi_tool_agent import front_manager, session_runner
+
+
+def per_user_runner(service, user_id):
+    """What create_session_runner used to do: a new Agent and Runner for every user."""
+    service.create_session(app_name=session_runner.APP_NAME, user_id=user_id, session_id=session_runner.session_id_for(user_id))
+    return Runner(agent=front_manager.create_front_agent(), app_name=session_runner.APP_NAME, session_service=service)
+
+
+def shared_runner(service, user_id):
+    session_runner.session_service = service
+    return session_runner.create_session_runner(user_id)
+
+
+def measure(label, create, users):
+    service = InMemorySessionService()
+    keep = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(users):
+            keep.append(create(service, f"bench-user-{n}"))
+    elapsed = time.perf_counter() - start
+    resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<18} {elapsed / users * 1e6:9.1f} us/session  {resident / 2**20:8.1f} MiB resident at {users} users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    args = parser.parse_args()
+
+    measure("per-user runner", per_user_runner, args.users)
+    measure("shared runner", shared_runner, args.users)
+
+
+if __name__ == "__main__":
+    main()
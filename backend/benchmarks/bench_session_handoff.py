@@ -0,0 +1,139 @@
+"""Onboarding conversations handed between two worker processes through durable sessions.
+
+Starts two worker processes on one SESSION_DB_URL (a temporary SQLite file by
+default) and alternates one user's turns between them:
+- worker A starts the conversation;
+- worker B, which has never seen the user, resumes it from storage;
+- worker A takes the next turn while still holding its own, now outdated copy.
+The stand-in model replies with every user message it was sent, so each turn
+shows whether the worker saw the whole conversation. Each turn also reports the
+worst event loop stall while it ran. Exits with status 1 if a turn missed part
+of the conversation:
+
+    python -m benchmarks.bench_session_handoff --users 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from google.genai import types
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+
+
+class HistoryLlm(BaseLlm):
+    """Replies with the user messages in the request, oldest first."""
+
+    model: str = "history"
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        said = [part.text for content in llm_request.contents if content.role == "user"
+                for part in content.parts or [] if part.text]
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=" | ".join(said))]))
+
+
+async def _lag_probe(worst: list, interval: float = 0.005):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst[0] = max(worst[0], time.perf_counter() - start - interval)
+
+
+async def _turn(session_runner, command: str, user_id: str, text: str) -> dict:
+    worst = [0.0]
+    probe = asyncio.create_task(_lag_probe(worst))
+    try:
+        if command == "start":
+            runner = session_runner.create_session_runner(user_id)
+        elif session_runner.session_service.get_session(app_name=session_runner.APP_NAME, user_id=user_id,
+                                                        session_id=session_runner.session_id_for(user_id)):
+            runner = session_runner.get_runner()  # What the server does while the user is in its registry
+        else:
+            runner = await session_runner.resume_session_runner(user_id)
+            if runner is None:
+                return {"reply": None, "lag": worst[0]}
+        reply = await session_runner.call_agent_async(text, runner, user_id)
+        return {"reply": reply, "lag": worst[0]}
+    finally:
+        probe.cancel()
+
+
+def worker(connection, db_url: str):
+    os.environ["SESSION_DB_URL"] = db_url
+    from fitness_agents.multi_tool_agent import session_runner
+    session_runner.get_runner().agent.model = HistoryLlm()
+    loop = asyncio.new_event_loop()
+    connection.send("ready")
+    while True:
+        command, user_id, text = connection.recv()
+        if command == "stop":
+            loop.run_until_complete(asyncio.to_thread(session_runner.close_session_service))
+            break
+        connection.send(loop.run_until_complete(_turn(session_runner, command, user_id, text)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--db-url", help="shared session database (default: a temporary SQLite file)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db_url = args.db_url or f"sqlite:///{os.path.join(directory, 'sessions.db')}"
+    context = multiprocessing.get_context("spawn")
+    workers = {}
+    for name in ("A", "B"):
+        ours, theirs = context.Pipe()
+        process = context.Process(target=worker, args=(theirs, db_url), daemon=True)
+        process.start()
+        theirs.close()  # So a worker that exits shows up as EOFError, not a hang
+        workers[name] = (ours, process)
+    for name, (connection, _) in workers.items():
+        try:
+            connection.recv()  # Imports done; startup is not counted as turn time
+        except EOFError:
+            print(f"FAIL: worker {name} exited during startup; see its traceback above")
+            sys.exit(1)
+
+    # (worker, command, message) for each turn of a conversation
+    script = [("A", "start", "hello"), ("B", "turn", "I'm 5'9 and 150 lbs"), ("A", "turn", "I'm a beginner")]
+    failures = 0
+    worst_lag = {name: 0.0 for name in workers}
+    start = time.perf_counter()
+    for n in range(args.users):
+        user_id = f"handoff-user-{n}"
+        for position, (name, command, text) in enumerate(script):
+            connection = workers[name][0]
+            connection.send((command, user_id, text))
+            try:
+                result = connection.recv()
+            except EOFError:
+                print(f"FAIL: worker {name} exited during {user_id} turn {position + 1}; see its traceback above")
+                sys.exit(1)
+            worst_lag[name] = max(worst_lag[name], result["lag"])
+            expected = " | ".join(message for _, _, message in script[:position + 1])
+            if result["reply"] != expected:
+                failures += 1
+                print(f"FAIL {user_id} turn {position + 1} on worker {name}: "
+                      f"model saw {result['reply']!r}, expected {expected!r}")
+    elapsed = time.perf_counter() - start
+
+    for connection, process in workers.values():
+        connection.send(("stop", None, None))
+        process.join()
+
+    turns = args.users * len(script)
+    print(f"{turns} turns over 2 workers in {elapsed:.2f}s ({elapsed / turns * 1000:.1f} ms/turn), "
+          f"worst loop stall: " + ", ".join(f"{name} {lag * 1000:.1f} ms" for name, lag in worst_lag.items()))
+    if failures:
+        print(f"FAIL: {failures} turns did not see the whole conversation")
+        sys.exit(1)
+    print("OK: every turn saw the whole conversation, whichever worker ran it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Concurrent /transcribe/ uploads against a local stand-in transcription backend.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_transcribe --uploads 200 --size-kb 512 --latency 0.2
+
+Each upload comes from its own user, which is what the rate limit is keyed on. Exits
+with status 1 if the audio reaches the transcription client as a file rather than
+bytes (past 1 MB Starlette spools uploads to disk, and reading that file would block
+the loop), or if uploads naming users that do not exist escape their address's limit.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("DB_NAME", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+# Every upload is sent at once; lift the queue bound
+os.environ.setdefault("ADMISSION_TRANSCRIBE_MAX_QUEUE", "1000000")
+os.environ.setdefault("ADMISSION_TRANSCRIBE_QUEUE_TIMEOUT", "600")
+
+import httpx
+import db
+import server
+import clients
+from benchmarks.fakes import FakeCollection, FakeTranscriptionClient, seed_users
+
+
+async def drive(uploads: int, payload: bytes) -> tuple[float, int]:
+    """Returns the time the uploads took and how many made-up users were turned away."""
+    users = FakeCollection()
+    user_ids = seed_users(users, uploads)
+    db.use_collections(users, FakeCollection())
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        async def one(n):
+            # Every upload shares a filename, which used to make them overwrite each other in /tmp
+            files = {"file": ("recording.wav", payload, "audio/wav")}
+            response = await http.post("/transcribe/", files=files, data={"auth0_id": user_ids[n]})
+            response.raise_for_status()
+            assert "transcription" in response.json(), response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(uploads)))
+        elapsed = time.perf_counter() - start
+
+        # Unknown users fall back to the address's bucket, so a fresh ID per upload runs dry
+        async def made_up(n):
+            files = {"file": ("recording.wav", payload[:1024], "audio/wav")}
+            response = await http.post("/transcribe/", files=files, data={"auth0_id": f"made-up-{n}"})
+            return response.status_code
+
+        burst = int(server.admission["transcribe"].user_burst)
+        statuses = await asyncio.gather(*(made_up(n) for n in range(2 * burst)))
+
+        # Over the limit: refused from Content-Length before the body is read
+        oversized = {"file": ("recording.wav", b"\0" * (server.TRANSCRIBE_MAX_BYTES + 1024 * 1024), "audio/wav")}
+        response = await http.post("/transcribe/", files=oversized)
+        assert response.status_code == 413, f"oversized upload answered {response.status_code}"
+        return elapsed, statuses.count(429)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated transcription time in seconds")
+    args = parser.parse_args()
+
+    fake = FakeTranscriptionClient(latency=args.latency)
+    clients.openai = fake
+    payload = os.urandom(args.size_kb * 1024)
+
+    elapsed, refused = asyncio.run(drive(args.uploads, payload))
+    print(f"uploads:          {args.uploads} x {args.size_kb} KiB")
+    print(f"throughput:       {args.uploads / elapsed:.1f} uploads/s ({elapsed:.2f}s)")
+    print(f"peak in flight:   {fake.peak_in_flight} (limit {server.TRANSCRIBE_CONCURRENCY})")
+    print(f"bytes forwarded:  {fake.bytes_received} (oversized upload refused with 413)")
+    print(f"made-up users:    {refused} refused with 429 past the address's burst")
+    if fake.file_uploads:
+        print(f"FAIL: {fake.file_uploads} uploads were passed to the transcription client as files")
+        sys.exit(1)
+    if not refused:
+        print("FAIL: uploads naming users that do not exist escaped the per-address rate limit")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Throughput of the local rule-based workout engine.
+
+Also checks how session lengths are read, including spelled-out ones ("half an
+hour"), and exits with status 1 if one is misread. Run from the backend directory:
+
+    python -m benchmarks.bench_workout_engine --workouts 50000
+"""
+import sys
+import time
+import random
+import argparse
+
+from fitness_agents.multi_tool_agent import workout_engine
+
+LEVELS = ["Beginner", "intermediate", "ADVANCED", "not sure", None]
+GOALS = ["lose weight", "build muscle", "run a marathon", "get stronger", "feel better", None]
+TIMES = ["15 minutes", "30 min", "45 mins", "1 hour", "1.5 hrs", "an hour", "half an hour",
+         "an hour and a half", "forty-five minutes", "whenever", None]
+# Session length answers and the minutes parse_minutes should read from them
+EXPECTED_MINUTES = {
+    "15 minutes": 15, "30 min": 30, "45 mins": 45, "1 hour": 60, "1.5 hrs": 90,
+    "an hour": 60, "a hour": 60, "one hour": 60, "about an hour a day": 60,
+    "half an hour": 30, "half hour": 30, "a quarter of an hour": 15,
+    "an hour and a half": 90, "one and a half hours": 90, "two hours": 120,
+    "forty-five minutes": 45, "twenty mins": 20,
+    "a day, 20 minutes": 20, "1 hour 30 minutes": 90, "1 hour and 15 mins": 75,
+    "2 hours, 10 minutes": 130, "1h30m": 90, "45 minutes to an hour": 45,
+    "a few minutes": workout_engine.DEFAULT_MINUTES,
+    "whenever": workout_engine.DEFAULT_MINUTES, None: workout_engine.DEFAULT_MINUTES,
+}
+EQUIPMENT = ["no equipment", "dumbbells", "a kettlebell and bands", "pull-up bar and jump rope", "", None]
+
+
+def random_profiles(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    return [{
+        "fitness_level": rng.choice(LEVELS),
+        "goal": rng.choice(GOALS),
+        "workout_time": rng.choice(TIMES),
+        "preferences": rng.choice(EQUIPMENT),
+    } for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workouts", type=int, default=50000)
+    args = parser.parse_args()
+
+    profiles = random_profiles(args.workouts)
+    start = time.perf_counter()
+    for profile in profiles:
+        workout_engine.generate(profile)
+    elapsed = time.perf_counter() - start
+    print(f"{args.workouts} workouts in {elapsed:.2f}s: {args.workouts / elapsed:,.0f} workouts/s, "
+          f"{elapsed / args.workouts * 1e6:.1f} us/workout")
+
+    misread = {text: (workout_engine.parse_minutes(text), minutes) for text, minutes in EXPECTED_MINUTES.items()
+               if workout_engine.parse_minutes(text) != minutes}
+    for text, (got, expected) in misread.items():
+        print(f"FAIL: {text!r} read as {got} minutes, expected {expected}")
+    if misread:
+        sys.exit(1)
+    print(f"OK: {len(EXPECTED_MINUTES)} session lengths read correctly")
+
+
+if __name__ == "__main__":
+    main()
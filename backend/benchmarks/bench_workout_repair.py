@@ -0,0 +1,128 @@
+"""Model calls saved by repairing the workout agent's output locally.
+
+Takes local engine workouts and corrupts them the way the model's output goes wrong:
+lists of different lengths, "Reps" or "timed" as types, durations as text, a code
+fence or prose around the JSON, a missing field, the record-array shape, and
+sometimes no usable output at all. For each output it reports:
+- the share the old strict parse (Exercises.model_validate_json) rejects, each of
+  which needs another generation;
+- the share workout_repair cannot fix, the only ones that are retried now;
+- model calls per workout (1 / (1 - reject rate)) and the time saved at --call-seconds;
+- the cost of one repair.
+
+    python -m benchmarks.bench_workout_repair --outputs 5000 --call-seconds 4
+"""
+import json
+import time
+import random
+import argparse
+
+from fitness_agents.multi_tool_agent import workout_engine, workout_repair
+from fitness_agents.multi_tool_agent.workout_generator import Exercises
+from benchmarks.bench_workout_engine import random_profiles
+
+TYPE_SPELLINGS = {"TIME BASED": ["Timed", "time-based", "TIME_BASED", "duration"],
+                  "REPETITION BASED": ["Reps", "repetition based", "REPETITION_BASED", "rep-based"]}
+
+
+def _shorten(document, rng):
+    field = rng.choice(["description", "duration", "type"])
+    document[field] = document[field][:-rng.randint(1, 2)]
+
+
+def _lengthen(document, rng):
+    document["duration"] = document["duration"] + [rng.choice([30, 45, 60])]
+
+
+def _spell_types(document, rng):
+    document["type"] = [rng.choice(TYPE_SPELLINGS[kind]) for kind in document["type"]]
+
+
+def _text_durations(document, rng):
+    document["duration"] = [rng.choice([f"{seconds} seconds", f"{seconds // 60}:{seconds % 60:02d}",
+                                        f"{max(1, seconds // 3)} reps"]) for seconds in document["duration"]]
+
+
+def _records(document, rng):
+    return {"exercises": [dict(zip(workout_repair.FIELDS, row))
+                          for row in zip(*(document[field] for field in workout_repair.FIELDS))]}
+
+
+def _drop_field(document, rng):
+    field = rng.choice(["description", "type", "duration"])
+    for record in document.get("exercises", [document]):
+        record.pop(field, None)
+
+
+def _unusable(document, rng):
+    return rng.choice(["I'm sorry, I can't create a workout right now.", {"name": []}, "{\"name\": [\"Squats\""])
+
+
+# Applied in this order
+MUTATIONS = [_shorten, _lengthen, _spell_types, _text_durations, _records, _drop_field]
+
+
+def corrupted_output(profile: dict, rng: random.Random, error_rate: float, unusable_rate: float) -> str:
+    workout = workout_engine.generate(profile)
+    document = {"name": list(workout.name), "description": list(workout.description),
+                "duration": list(workout.duration), "type": list(workout.type)}
+    if rng.random() < unusable_rate:
+        document = _unusable(document, rng)
+    elif rng.random() < error_rate:
+        for mutation in sorted(rng.sample(MUTATIONS, rng.randint(1, 2)), key=MUTATIONS.index):
+            document = mutation(document, rng) or document
+    text = document if isinstance(document, str) else json.dumps(document)
+    wrapping = rng.random()
+    if wrapping < 0.1:
+        text = f"```json\n{text}\n```"
+    elif wrapping < 0.15:
+        text = f"Here is your workout:\n{text}"
+    return text
+
+
+def strictly_valid(output: str) -> bool:
+    """What the old parse accepted; lists of different lengths passed and were cut short by zip."""
+    try:
+        exercises = Exercises.model_validate_json(output)
+    except Exception:
+        return False
+    return all(kind in ("TIME BASED", "REPETITION BASED") for kind in exercises.type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--outputs", type=int, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.4, help="share of outputs with fixable defects")
+    parser.add_argument("--unusable-rate", type=float, default=0.02, help="share of outputs with no usable exercise")
+    parser.add_argument("--call-seconds", type=float, default=4.0, help="duration of one workout generation")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    profiles = random_profiles(args.outputs, args.seed)
+    outputs = [corrupted_output(profile, rng, args.error_rate, args.unusable_rate) for profile in profiles]
+
+    rejected = sum(not strictly_valid(output) for output in outputs)
+    unrepairable = 0
+    start = time.perf_counter()
+    for output, profile in zip(outputs, profiles):
+        try:
+            workout_repair.repair(output, profile)
+        except workout_repair.UnrepairableOutput:
+            unrepairable += 1
+    elapsed = time.perf_counter() - start
+
+    stats = workout_repair.stats()
+    for label, failures in (("strict parse", rejected), ("local repair", unrepairable)):
+        rate = failures / args.outputs
+        calls = 1 / (1 - rate) if rate < 1 else float("inf")
+        print(f"{label:<13} needs a retry for {rate:6.1%} of outputs: {calls:.3f} model calls per workout, "
+              f"~{(calls - 1) * args.call_seconds:.2f}s of retries per workout")
+    print(f"outputs: {stats['valid']} valid, {stats['repaired']} repaired, {stats['unrepairable']} unrepairable")
+    for kind, count in sorted(stats["repairs"].items(), key=lambda item: -item[1]):
+        print(f"  {kind:<24} {count}")
+    print(f"repair cost: {elapsed / args.outputs * 1e6:.1f} us per output")
+
+
+if __name__ == "__main__":
+    main()
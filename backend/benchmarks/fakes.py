@@ -0,0 +1,288 @@
+"""Local stand-ins for the external services the backend talks to.
+
+Benchmarks import these instead of a real Mongo / model backend so runs are
+reproducible on a laptop.
+"""
+import copy
+import json
+import time
+import random
+import asyncio
+import itertools
+from types import SimpleNamespace
+from bson import ObjectId
+from pydantic import Field, PrivateAttr
+from google.genai import types
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+
+
+def _get_path(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _match_value(actual, expected):
+    if isinstance(expected, dict) and expected and all(op.startswith("$") for op in expected):
+        for op, operand in expected.items():
+            if op == "$gte" and not (actual is not None and actual >= operand):
+                return False
+            if op == "$gt" and not (actual is not None and actual > operand):
+                return False
+            if op == "$in" and actual not in operand:
+                return False
+        return True
+    return actual == expected
+
+
+def _matches(doc, query):
+    return all(_match_value(_get_path(doc, key), value) for key, value in query.items())
+
+
+class FakeCollection:
+    """In-memory, synchronous stand-in for a pymongo collection.
+
+    `latency` seconds of blocking sleep are added to every call to model the
+    network round trip of a real driver.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs = []
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        self._wait()
+        matches = [doc for doc in self.docs if _matches(doc, query or {})]
+        for field, direction in reversed(sort or []):
+            matches.sort(key=lambda doc: _get_path(doc, field), reverse=direction < 0)
+        if not matches:
+            return None
+        if projection:
+            # Inclusion projections only (plus "_id": 0), which is all the repository uses
+            keep_id = projection.get("_id", 1)
+            return {key: copy.deepcopy(value) for key, value in matches[0].items()
+                    if (key == "_id" and keep_id) or (key != "_id" and projection.get(key))}
+        return copy.deepcopy(matches[0])
+
+    def create_index(self, keys, **kwargs):
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+    def insert_one(self, doc):
+        self._wait()
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def update_one(self, query, update, upsert=False):
+        self._wait()
+        for doc in self.docs:
+            if _matches(doc, query):
+                for key, value in update.get("$set", {}).items():
+                    _set_path(doc, key, value)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    def bulk_write(self, requests, ordered=True):
+        matched = 0
+        for request in requests:
+            # pymongo's UpdateOne keeps its filter and document in private attributes
+            matched += self.update_one(request._filter, request._doc).matched_count
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+
+def seed_users(collection: FakeCollection, count: int):
+    """Adds `count` onboarded users named bench-user-<n> and returns their IDs."""
+    ids = []
+    for n in itertools.islice(itertools.count(), count):
+        auth0_id = f"bench-user-{n}"
+        collection.docs.append({
+            "_id": ObjectId(),
+            "auth0_id": auth0_id,
+            "name": f"Bench User {n}",
+            "email": f"bench{n}@example.com",
+            "details": {},
+            "created_at": "2025-01-01T00:00:00",
+        })
+        ids.append(auth0_id)
+    return ids
+
+
+class FakeTranscriptionClient:
+    """Stand-in for AsyncOpenAI exposing only `audio.transcriptions.create`.
+
+    Each call sleeps `latency` seconds without blocking the loop and tracks the
+    peak number of transcriptions that were in flight at once.
+    """
+
+    def __init__(self, latency: float = 0.2, text: str = "I am a beginner and I want to lose weight."):
+        self.latency = latency
+        self.text = text
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.bytes_received = 0
+        self.file_uploads = 0
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, file):
+        _, audio = file
+        if isinstance(audio, bytes):
+            self.bytes_received += len(audio)
+        else:
+            self.file_uploads += 1  # The server handed over a file object, read here on the loop
+            self.bytes_received += len(audio.read())
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(text=self.text)
+
+
+def prompt_chars(llm_request) -> int:
+    """Size of everything a model request sends: system instruction plus history."""
+    size = len(str(llm_request.config.system_instruction or "")) if llm_request.config else 0
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                size += len(part.text)
+            if part.function_call:
+                size += len(str(part.function_call.args))
+            if part.function_response:
+                size += len(str(part.function_response.response))
+    return size
+
+
+class FakeBackendError(Exception):
+    """What an overloaded model backend raises; `code` marks it as transient."""
+
+    def __init__(self, code: int = 503):
+        super().__init__(f"fake model backend returned {code}")
+        self.code = code
+
+
+class FakeLlm(BaseLlm):
+    """Deterministic stand-in model for ADK agents.
+
+    Replies with `reply` (or `replies` in turn) after `latency` seconds and
+    records the size of every prompt it receives. Faults are injected from a
+    seeded generator: the first `fail_first` calls and an `error_rate` fraction
+    of the rest raise FakeBackendError, and a `slow_rate` fraction take
+    `slow_latency` seconds instead of `latency`.
+    """
+
+    model: str = "fake-llm"
+    latency: float = 0.0
+    reply: str = "Thanks! Tell me a bit more about that."
+    replies: list = Field(default_factory=list)
+    prompt_sizes: list = Field(default_factory=list)
+    fail_first: int = 0
+    error_rate: float = 0.0
+    error_code: int = 503
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr(default=None)
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        self.prompt_sizes.append(prompt_chars(llm_request))
+        slow = self._rng.random() < self.slow_rate
+        failing = len(self.prompt_sizes) <= self.fail_first or self._rng.random() < self.error_rate
+        latency = self.slow_latency if slow else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+        if failing:
+            raise FakeBackendError(self.error_code)
+        text = self.replies[(len(self.prompt_sizes) - 1) % len(self.replies)] if self.replies else self.reply
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def request_key(llm_request) -> str:
+    """Identifies a model request by its newest message: the user's text or the tool result.
+
+    Recorded replies are looked up by this key, so a replay survives any number of
+    concurrent users as long as they follow the same script.
+    """
+    for content in reversed(llm_request.contents):
+        for part in reversed(content.parts or []):
+            if part.function_response:
+                return f"tool:{part.function_response.name}"
+            if part.text:
+                return f"{content.role}:{part.text}"
+    return ""
+
+
+class RecordingLlm(BaseLlm):
+    """Wraps a real model and records its responses per request_key, for ReplayLlm."""
+
+    model: str = "recording"
+    inner: BaseLlm
+    recording: dict = Field(default_factory=dict)
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        responses = []
+        async for response in self.inner.generate_content_async(llm_request, stream):
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            yield response
+        self.recording.setdefault(request_key(llm_request), []).append(responses)
+
+
+class ReplayLlm(BaseLlm):
+    """Replays recorded model responses after `latency` seconds.
+
+    `recording` maps a request_key to the response lists recorded for it; repeats of
+    a key cycle through them. Requests that were never recorded get `default`.
+    """
+
+    model: str = "replay"
+    latency: float = 0.0
+    recording: dict = Field(default_factory=dict)
+    default: list = Field(default_factory=list)
+    misses: int = 0
+    _seen: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ReplayLlm":
+        with open(path) as f:
+            return cls(recording=json.load(f), **kwargs)
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        key = request_key(llm_request)
+        recorded = self.recording.get(key)
+        if recorded:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            responses = recorded[n % len(recorded)]
+        else:
+            self.misses += 1
+            responses = self.default
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for response in responses:
+            yield LlmResponse.model_validate(response)
+
+
+def text_response(text: str) -> list:
+    """A recorded reply consisting of one text message."""
+    return [{"content": {"role": "model", "parts": [{"text": text}]}}]
+
+
+def tool_call_response(name: str, args: dict) -> list:
+    """A recorded reply in which the model calls the tool `name`."""
+    return [{"content": {"role": "model", "parts": [{"function_call": {"name": name, "args": args}}]}}]
@@ -0,0 +1,67 @@
+import os
+import importlib.util
+
+import httpx
+
+# --- Outbound clients ---
+# One pooled httpx client for every outbound HTTP call the backend makes, opened in
+# the app lifespan and closed on shutdown. Connections are kept alive between calls,
+# use HTTP/2 when the `h2` package is installed, and are capped so a burst of requests
+# cannot open an unbounded number of sockets. The OpenAI client sends through it; the
+# openai SDK is only imported when that client is first needed (or in the startup warmup).
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+http = None
+openai = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+def open_clients():
+    """Creates the shared HTTP client; called once at startup."""
+    global http
+    if http is None:
+        http = create_http_client()
+
+
+def get_openai():
+    """Returns the shared OpenAI client, creating it on first use."""
+    global openai
+    if openai is None:
+        from openai import AsyncOpenAI
+        openai = AsyncOpenAI(http_client=http)
+    return openai
+
+
+async def close_clients():
+    """Closes pooled connections; called once at shutdown."""
+    global http, openai
+    if http is not None:
+        await http.aclose()
+    http = None
+    openai = None
+
+
+def stats() -> dict:
+    return {
+        "http2": HTTP2_AVAILABLE,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "open": http is not None,
+    }
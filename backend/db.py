@@ -0,0 +1,266 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo import MongoClient, UpdateOne, ASCENDING, DESCENDING
+from user_cache import UserCache
+import metrics
+
+# MongoDB setup
+MONGO_CONN_STRING = os.getenv("DB_CONN_STRING")
+DB_NAME = os.getenv("DB_NAME")
+USERS_COLLECTION_NAME = os.getenv("USERS_COLLECTION_NAME", "users")
+
+# Pool sizing. pymongo keeps up to DB_MAX_POOL_SIZE sockets per server; the executor
+# bounds how many blocking driver calls can be in flight at once so a slow Mongo
+# cannot grow an unbounded number of threads.
+DB_MAX_POOL_SIZE = int(os.getenv("DB_MAX_POOL_SIZE", "50"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+
+async def run_in_db_executor(fn, *args, **kwargs):
+    """Runs a blocking driver call on the bounded DB executor and awaits the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+class AsyncCollection:
+    """Async facade over a synchronous pymongo collection.
+
+    Every call is offloaded to the DB executor, so the event loop keeps serving
+    other requests while a query is in flight. Each call's latency is recorded
+    per collection and operation. Given a collection name rather than a
+    collection, it connects to Mongo on its first call, from the executor.
+    """
+
+    def __init__(self, collection):
+        self._collection = None if isinstance(collection, str) else collection
+        self.name = collection if isinstance(collection, str) else getattr(collection, "name", "unknown")
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = get_database()[self.name]
+        return self._collection
+
+    async def _timed(self, operation: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await run_in_db_executor(fn, *args, **kwargs)
+        finally:
+            metrics.mongo_query_seconds.observe(time.perf_counter() - start, self.name, operation)
+
+    def _call(self, method: str, *args, **kwargs):
+        return getattr(self.collection, method)(*args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await self._timed("find_one", self._call, "find_one", *args, **kwargs)
+
+    async def find(self, *args, **kwargs) -> list:
+        """Runs a query and returns all of its results; bound it with `limit`."""
+        return await self._timed("find", lambda: list(self.collection.find(*args, **kwargs)))
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._timed("insert_one", self._call, "insert_one", *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._timed("update_one", self._call, "update_one", *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await self._timed("bulk_write", self._call, "bulk_write", *args, **kwargs)
+
+    async def create_index(self, *args, **kwargs):
+        return await self._timed("create_index", self._call, "create_index", *args, **kwargs)
+
+
+# The client is created on first use rather than at import: constructing it resolves
+# mongodb+srv:// DNS records, which would otherwise slow every cold start.
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_database():
+    """Returns the Mongo database, creating the client on first call."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(MONGO_CONN_STRING, maxPoolSize=DB_MAX_POOL_SIZE)
+    return _client[DB_NAME]
+
+
+users_collection = AsyncCollection(USERS_COLLECTION_NAME)
+workouts_collection = AsyncCollection("workouts")
+
+
+# Read-through cache of user documents. Every chat turn checks that the user exists and
+# the dashboard re-reads the same profile, so most of those reads never reach Mongo.
+user_cache = UserCache(
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "60")),
+)
+
+
+def use_collections(users, workouts):
+    """Swaps the backing collections, e.g. for a local stand-in Mongo in benchmarks."""
+    global users_collection, workouts_collection
+    users_collection = users if isinstance(users, AsyncCollection) else AsyncCollection(users)
+    workouts_collection = workouts if isinstance(workouts, AsyncCollection) else AsyncCollection(workouts)
+    user_cache.clear()
+
+
+async def ensure_indexes():
+    """Creates the indexes behind every hot query. Idempotent, so it runs on each startup."""
+    await users_collection.create_index([("auth0_id", ASCENDING)], unique=True)
+    await workouts_collection.create_index([("workout_id", ASCENDING)], unique=True)
+    await workouts_collection.create_index([("workout.created_by", ASCENDING), ("created_at", DESCENDING)])
+    await workouts_collection.create_index([("cache_key", ASCENDING), ("created_at", DESCENDING)])
+    # Weekly plans written by regenerate_workouts.py; only those documents carry the fields
+    await workouts_collection.create_index([("plan_user", ASCENDING), ("plan_week", ASCENDING)], sparse=True)
+
+
+# --- Cross-worker cache invalidation ---
+# Key Concept: each worker invalidates its own cache when it writes a user, but not the
+# other workers' caches. So every worker tails a change stream on the users collection
+# and drops its cached copy of any user another worker wrote, typically within
+# milliseconds. Change streams need a replica set (Atlas always is one). Against a
+# standalone mongod, or with USER_CACHE_CHANGE_STREAM=false, a write can go unseen by
+# the other workers for up to USER_CACHE_TTL_SECONDS (60 by default); lower the TTL,
+# or set it to 0 to disable the cache, if that matters.
+USER_CACHE_CHANGE_STREAM = os.getenv("USER_CACHE_CHANGE_STREAM", "true").lower() == "true"
+_change_stream = None
+
+
+def _watch_users(loop):
+    global _change_stream
+    try:
+        with users_collection.collection.watch([{"$project": {"documentKey": 1}}]) as stream:
+            _change_stream = stream
+            for change in stream:
+                loop.call_soon_threadsafe(user_cache.invalidate_object_id, change["documentKey"]["_id"])
+    except Exception as e:
+        if _change_stream is not None and not _change_stream.alive:
+            return  # Closed by stop_user_cache_invalidation
+        print(f"User cache change stream stopped, clearing cache; writes from other workers "
+              f"now show up here within {user_cache.ttl:g}s: {e}")
+    loop.call_soon_threadsafe(user_cache.clear)
+
+
+def start_user_cache_invalidation():
+    """Starts the change-stream listener if enabled; call from the running event loop."""
+    if USER_CACHE_CHANGE_STREAM:
+        thread = threading.Thread(target=_watch_users, args=(asyncio.get_running_loop(),), daemon=True, name="user-cache-invalidation")
+        thread.start()
+
+
+def stop_user_cache_invalidation():
+    if _change_stream is not None:
+        _change_stream.close()
+
+
+# --- Repository ---
+# Handlers go through these helpers instead of touching the collections directly.
+
+def _project(document: dict, projection: dict = None) -> dict:
+    if projection is None:
+        return document
+    return {key: value for key, value in document.items() if key == "_id" or projection.get(key)}
+
+
+async def get_user(auth0_id: str, projection: dict = None):
+    """Returns the user document for an Auth0 ID (only the projected fields if given), or None."""
+    cached = user_cache.get(auth0_id)
+    if cached is not None:
+        return _project(cached, projection)
+    if projection is not None:
+        return await users_collection.find_one({"auth0_id": auth0_id}, projection)
+    generation = user_cache.generation(auth0_id)
+    user = await users_collection.find_one({"auth0_id": auth0_id})
+    if user is not None:
+        user_cache.put(auth0_id, user, generation)
+    return user
+
+
+async def user_exists(auth0_id: str) -> bool:
+    """Checks for a user without fetching the document; answered from the auth0_id index."""
+    if user_cache.exists(auth0_id):
+        return True
+    generation = user_cache.generation(auth0_id)
+    # Only indexed fields, so the query is covered; _id is not in the index
+    user = await users_collection.find_one({"auth0_id": auth0_id}, {"_id": 0, "auth0_id": 1})
+    if user is None:
+        return False
+    user_cache.put(auth0_id, user, generation, complete=False)
+    return True
+
+
+async def create_user(user_data: dict):
+    """Inserts a new user document and returns the insert result."""
+    generation = user_cache.generation(user_data["auth0_id"])
+    result = await users_collection.insert_one(user_data)
+    user_cache.put(user_data["auth0_id"], {**user_data, "_id": result.inserted_id}, generation)
+    return result
+
+
+async def update_user_details(auth0_id: str, details: dict):
+    """Sets the given `details.*` fields on a user and returns the update result."""
+    result = await users_collection.update_one(
+        {"auth0_id": auth0_id},
+        {"$set": {f"details.{key}": value for key, value in details.items()}}
+    )
+    user_cache.invalidate(auth0_id)
+    return result
+
+
+async def bulk_update_user_details(updates: dict):
+    """Applies {auth0_id: details} updates in a single unordered bulk write."""
+    try:
+        return await users_collection.bulk_write([
+            UpdateOne({"auth0_id": auth0_id}, {"$set": {f"details.{key}": value for key, value in details.items()}})
+            for auth0_id, details in updates.items()
+        ], ordered=False)
+    finally:
+        # Some updates may have landed even if the batch raised
+        for auth0_id in updates:
+            user_cache.invalidate(auth0_id)
+
+
+async def get_workout(workout_id: str):
+    """Returns the workout document for a workout ID, or None."""
+    return await workouts_collection.find_one({"workout_id": workout_id})
+
+
+async def find_recent_workout(cache_key: str, since):
+    """Returns the newest workout generated for a profile cache key since `since`, or None."""
+    return await workouts_collection.find_one(
+        {"cache_key": cache_key, "created_at": {"$gte": since}},
+        sort=[("created_at", -1)]
+    )
+
+
+async def insert_workout(workout_doc: dict):
+    """Stores a workout document and returns the insert result."""
+    return await workouts_collection.insert_one(workout_doc)
+
+
+async def update_workout(workout_id: str, fields: dict):
+    """Sets fields on a workout document, e.g. a generation job's result."""
+    return await workouts_collection.update_one({"workout_id": workout_id}, {"$set": fields})
+
+
+async def users_after(last_id, limit: int, projection: dict = None) -> list:
+    """Returns up to `limit` users in _id order, starting after `last_id` (None for the first page).
+
+    Paging on _id keeps every page an index range scan and lets a batch job resume
+    from the last _id it finished.
+    """
+    query = {} if last_id is None else {"_id": {"$gt": last_id}}
+    return await users_collection.find(query, projection, sort=[("_id", ASCENDING)], limit=limit)
+
+
+async def bulk_write_workouts(operations: list):
+    """Applies workout writes in a single unordered bulk write."""
+    return await workouts_collection.bulk_write(operations, ordered=False)
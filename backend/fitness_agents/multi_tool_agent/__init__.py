@@ -1 +1,2 @@
-from . import front_manager
\ No newline at end of file
+# Submodules are imported where they are used, so importing one (e.g. the local
+# workout engine) does not load google.adk through the agent modules.
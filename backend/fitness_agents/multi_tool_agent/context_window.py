@@ -0,0 +1,87 @@
+import os
+from google.genai import types
+
+# --- Context Window ---
+# Key Concept: a before_model_callback may rewrite the LlmRequest before it reaches the
+# model. Long onboarding conversations would otherwise resend their whole history on
+# every turn, so prompt size and latency grow with each answer. Only the last
+# CONTEXT_WINDOW_TURNS turns are sent verbatim; older turns are folded into a compact
+# summary in the system instruction. The profile answers collected so far are added to
+# it on every call by profile_extractor, so trimming never loses them.
+
+CONTEXT_WINDOW_TURNS = int(os.getenv("CONTEXT_WINDOW_TURNS", "6"))
+SUMMARY_CHARS_PER_MESSAGE = 160
+SUMMARY_MAX_CHARS = 2000
+
+
+def append_instruction(llm_request, *notes: str):
+    """Adds notes to the end of the request's system instruction."""
+    if llm_request.config is None:
+        llm_request.config = types.GenerateContentConfig()
+    instruction = llm_request.config.system_instruction or ""
+    llm_request.config.system_instruction = "\n\n".join([instruction, *notes]).strip()
+
+
+def _text(content) -> str:
+    return " ".join(part.text for part in (content.parts or []) if part.text).strip()
+
+
+def _starts_turn(content) -> bool:
+    # A turn begins with something the user typed, not with a tool result fed back to the model
+    return content.role == "user" and any(part.text for part in (content.parts or []))
+
+
+def request_chars(llm_request) -> int:
+    """Characters a model request sends: the system instruction plus every text part."""
+    config = llm_request.config
+    size = len(str(config.system_instruction or "")) if config else 0
+    return size + sum(len(_text(content)) for content in llm_request.contents)
+
+
+def split_turns(contents: list) -> list:
+    """Groups request contents into turns, each starting at a user message.
+
+    Tool calls and their responses stay inside the turn that produced them, so a
+    window never separates a function call from its result.
+    """
+    turns = []
+    for content in contents:
+        if _starts_turn(content) or not turns:
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _clip(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) <= SUMMARY_CHARS_PER_MESSAGE:
+        return text
+    return text[:SUMMARY_CHARS_PER_MESSAGE - 3] + "..."
+
+
+def summarize_turns(turns: list) -> str:
+    """Condenses older turns into one line per message, newest kept when over budget."""
+    lines = []
+    for turn in turns:
+        for content in turn:
+            text = _text(content)
+            if text:
+                speaker = "User" if content.role == "user" else "Coach"
+                lines.append(f"{speaker}: {_clip(text)}")
+    summary = "\n".join(lines)
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = "..." + summary[-SUMMARY_MAX_CHARS:]
+    return summary
+
+
+def window_history(callback_context, llm_request):
+    """before_model_callback that keeps the last turns verbatim and summarizes the rest."""
+    turns = split_turns(llm_request.contents)
+    if len(turns) <= CONTEXT_WINDOW_TURNS:
+        return None
+
+    older, recent = turns[:-CONTEXT_WINDOW_TURNS], turns[-CONTEXT_WINDOW_TURNS:]
+    llm_request.contents = [content for turn in recent for content in turn]
+
+    append_instruction(llm_request, f"Summary of the earlier conversation ({len(older)} turns):\n{summarize_turns(older)}")
+    return None  # Continue with the (trimmed) request
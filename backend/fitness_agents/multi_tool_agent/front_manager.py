@@ -1,12 +1,6 @@
 import os
 import asyncio
-from dotenv import load_dotenv
 from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm # For multi-model support
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types # For creating message Content/Parts
-import requests
 import json
 
 import warnings
@@ -16,8 +10,6 @@ warnings.filterwarnings("ignore")
 import logging
 logging.basicConfig(level=logging.ERROR)
 
-load_dotenv() 
-
 # @title Define the Weather Agent
 # Use one of the model constants defined earlier
 AGENT_MODEL = "gemini-2.0-flash" # Starting with a powerful Gemini model
@@ -45,8 +37,8 @@ def close_session(session):
     except Exception as e:
         print(f"Error closing session: {e}")
 
-def create_front_agent():
-    """Returns the front agent."""
+def create_front_agent(before_model_callback=None):
+    """Returns the front agent, optionally with a callback that rewrites each model request."""
     print(f"Front manager created using model '{AGENT_MODEL}'.")
     return Agent(
         name="Front_Manager",
@@ -67,4 +59,5 @@ def create_front_agent():
                     "The preferences and tailoring parameters may be full descriptive blocks of texts. "
                     "Once you have everything, make sure, sign off with the user, and THEN call 'create_profile_json' with the user's answers to upload the profile to the database.",
         tools=[create_profile_json], # Make the tool available to this agent
+        before_model_callback=before_model_callback,
     )
\ No newline at end of file
@@ -1,8 +1,11 @@
 import asyncio
+from dotenv import load_dotenv
 import front_manager
 import session_runner
 from google.adk.sessions import Session
 
+load_dotenv()
+
 async def main():
     # Simple interactive loop
     print("front manager is ready! Type 'exit' to quit.")
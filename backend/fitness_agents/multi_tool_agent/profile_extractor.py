@@ -0,0 +1,285 @@
+import re
+import json
+
+from fitness_agents.multi_tool_agent.workout_engine import EQUIPMENT_KEYWORDS
+
+# --- Profile extraction ---
+# Key Concept: users often answer several onboarding questions at once ("I'm 5'9",
+# 150 lbs, 30, a beginner..."), but the agent asks for each field in turn, and
+# every question is a model round trip. Before each model call the user's newest
+# message is run through deterministic patterns for the fields create_profile_json
+# takes. Units are normalized (5 ft 9 -> 5'9", 11 stone -> 154 lbs, an hour -> 60
+# minutes). Matches are merged into the session state, and the agent is told which
+# answers it already has, so it only asks for what is missing.
+
+# Session state key holding the structured profile fields gathered so far
+PROFILE_STATE_KEY = "profile_fields"
+
+FIELDS = ("height", "weight", "age", "fitness_level", "workout_time", "goal", "preferences")
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    return " ".join(text.split())
+
+
+def _number(value: str) -> str:
+    number = float(value)
+    return str(int(number)) if number.is_integer() else str(round(number, 1))
+
+
+# --- Height ---
+_FEET_INCHES = re.compile(r"\b([3-7])\s*(?:'|ft\.?|feet|foot)\s*(?:(1[01]|\d)\s*(?:\"|''|in\.?|inch(?:es)?)?)?(?!\d|\.\d)")
+_CENTIMETERS = re.compile(r"\b(1\d\d|2[0-2]\d)\s*(?:cm|centimet(?:er|re)s?)\b")
+_METERS = re.compile(r"\b([12]\.\d{1,2})\s*(?:m|meters?|metres?)\b")
+
+
+def extract_height(text: str):
+    match = _FEET_INCHES.search(text)
+    if match:
+        return f"{match.group(1)}'{match.group(2) or 0}\""
+    match = _CENTIMETERS.search(text)
+    if match:
+        return f"{match.group(1)} cm"
+    match = _METERS.search(text)
+    if match and 1.2 <= float(match.group(1)) <= 2.3:
+        return f"{round(float(match.group(1)) * 100)} cm"
+    return None
+
+
+# --- Weight ---
+_STONE = re.compile(r"\b(\d{1,2})\s*(?:st|stone)\b(?:\s*(?:and\s*)?(\d{1,2})\s*(?:lbs?|pounds?)\b)?")
+# Not amounts to lose or gain: "lose 80 pounds"
+_NOT_CHANGE = r"(?<!lose )(?<!drop )(?<!gain )(?<!lost )"
+_POUNDS = re.compile(_NOT_CHANGE + r"\b(\d{2,3}(?:\.\d)?)\s*(?:lbs?|pounds?)\b")
+_KILOGRAMS = re.compile(_NOT_CHANGE + r"\b(\d{2,3}(?:\.\d)?)\s*(?:kgs?|kilos?|kilograms?)\b")
+_WEIGH = re.compile(r"\bweigh(?:t is|t:|s|ing)?\s*(?:about|around|roughly)?\s*(\d{2,3})\b(?!\s*(?:kg|kilo|st\b|stone))")
+
+
+def extract_weight(text: str):
+    match = _STONE.search(text)
+    if match:
+        return f"{int(match.group(1)) * 14 + int(match.group(2) or 0)} lbs"
+    match = _POUNDS.search(text)
+    if match and 60 <= float(match.group(1)) <= 700:
+        return f"{_number(match.group(1))} lbs"
+    match = _KILOGRAMS.search(text)
+    if match and 25 <= float(match.group(1)) <= 320:
+        return f"{_number(match.group(1))} kg"
+    match = _WEIGH.search(text)
+    if match:
+        return f"{match.group(1)} lbs"
+    return None
+
+
+# --- Age ---
+_AGE_PATTERNS = (
+    re.compile(r"\b(\d{2})\s*(?:years?|yrs?)[\s-]*old\b"),
+    re.compile(r"\b(\d{2})[\s-]*(?:y/?o|year-old)\b"),
+    re.compile(r"\bage(?:d| is|:)?\s*(\d{2})\b"),
+    # "I'm 30." / "I am 30 and ..." but not "I'm 30 minutes away"
+    re.compile(r"\b(?:i'm|im|i am)\s+(\d{2})\s*(?:[.,!;]|$|and\b|but\b)"),
+    # A bare number closing a list of measurements: "130 pounds and 35."
+    re.compile(r"\b(?:lbs?|pounds|kgs?)\s*,?\s*(?:and\s+)?(\d{2})\s*(?:[.,!;]|$)"),
+)
+
+
+def extract_age(text: str):
+    for pattern in _AGE_PATTERNS:
+        match = pattern.search(text)
+        if match and 13 <= int(match.group(1)) <= 99:
+            return int(match.group(1))
+    return None
+
+
+# --- Fitness level ---
+_LEVELS = {
+    "beginner": re.compile(r"\bbeginner\b|\bnew to (?:working out|exercis\w*|fitness|the gym)\b"
+                           r"|\bnever (?:really )?(?:worked out|exercised)\b|\bnot (?:very )?active\b|\bout of shape\b"),
+    "intermediate": re.compile(r"\bintermediate\b|\bmoderately (?:fit|active)\b|\bsomewhat (?:fit|active)\b"),
+    "advanced": re.compile(r"\badvanced\b|\bvery (?:fit|active)\b|\bathlete\b|\bexpert\b"),
+}
+
+
+def extract_fitness_level(text: str):
+    # The last level mentioned wins: "not a beginner, more intermediate"
+    found = [(match.start(), level) for level, pattern in _LEVELS.items() for match in pattern.finditer(text)]
+    if not found:
+        return None
+    if len(found) > 1 and re.search(r"\bnot (?:a |an )?(?:total |complete )?beginner\b", text):
+        found = [entry for entry in found if entry[1] != "beginner"] or found
+    return max(found)[1]
+
+
+# --- Workout time ---
+_TIME_PHRASES = (
+    (re.compile(r"\b(?:an|one|1) hour and a half\b|\bhour and a half\b"), 90),
+    (re.compile(r"\bhalf an? hour\b|\bhalf hour\b"), 30),
+    (re.compile(r"\b(?:an|one) hour\b"), 60),
+)
+_TIME_RANGE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(?:-|to)\s*(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?)\b")
+# Not distances: "30 minutes from the gym"
+_TIME = re.compile(r"\b(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?)\b(?!\s+(?:away|from|drive|walk|commute))")
+
+
+def _minutes(value: str, unit: str) -> int:
+    return round(float(value) * 60) if unit.startswith("h") else round(float(value))
+
+
+def extract_workout_time(text: str):
+    match = _TIME_RANGE.search(text)
+    if match:
+        low, high = _minutes(match.group(1), match.group(3)), _minutes(match.group(2), match.group(3))
+        if 5 <= low < high <= 240:
+            return f"{low}-{high} minutes"
+    match = _TIME.search(text)
+    if match and 5 <= _minutes(match.group(1), match.group(2)) <= 240:
+        return f"{_minutes(match.group(1), match.group(2))} minutes"
+    for pattern, minutes in _TIME_PHRASES:
+        if pattern.search(text):
+            return f"{minutes} minutes"
+    return None
+
+
+# --- Goal ---
+_GOALS = {
+    "weight loss": re.compile(r"\b(?:lose|losing|drop|shed)\s+(?:some\s+|a few\s+|\d+\s*(?:lbs?|pounds|kg)\s+(?:of\s+)?)?(?:weight|fat|pounds|lbs|kilos)\b"
+                              r"|\b(?:lose|drop|shed)\s+\d+\s*(?:lbs?|pounds|kgs?|kilos)\b"
+                              r"|\b(?:weight|fat)[\s-]loss\b|\bslim(?:ming)? down\b|\bget lean(?:er)?\b|\bburn (?:some )?fat\b"),
+    "muscle gain": re.compile(r"\b(?:build|gain|put on|add)\s+(?:some\s+|more\s+)?(?:muscle|mass|strength)\b"
+                              r"|\bmuscle (?:gain|growth|building)\b|\bget (?:stronger|bigger|strong|buff|toned)\b|\bbulk(?:ing)? up\b"),
+    "endurance": re.compile(r"\bendurance\b|\bstamina\b|\bcardio\b"
+                            r"|\b(?:run|running|train for|training for) (?:a |my first )?(?:5k|10k|half marathon|marathon)\b"),
+    "flexibility": re.compile(r"\bflexib\w*\b|\bmobility\b"),
+    "general fitness": re.compile(r"\b(?:stay|get|be|keep) (?:healthy|in shape|fit|active)\b"
+                                  r"|\b(?:general|overall) (?:fitness|health)\b"),
+}
+
+
+def extract_goal(text: str):
+    found = sorted((match.start(), goal) for goal, pattern in _GOALS.items() if (match := pattern.search(text)))
+    return " and ".join(goal for _, goal in found) or None
+
+
+# --- Preferences (equipment, diet, limitations) ---
+_NO_EQUIPMENT = re.compile(r"\bno\b[^.,;!?]{0,40}\bequipment\b|\bwithout (?:any )?equipment\b"
+                           r"|\bdon'?t have (?:any )?(?:equipment|weights)\b|\bbody ?weight only\b|\bjust (?:my )?body ?weight\b")
+_NO_DIET = re.compile(r"\bno\b[^.,;!?]{0,20}\b(?:dietary|diet|food) restrictions?\b")
+_DIETS = ("vegetarian", "vegan", "pescatarian", "gluten-free", "gluten free", "dairy-free", "dairy free",
+          "lactose intolerant", "halal", "kosher", "keto")
+_GYM = re.compile(r"\b(?:go to|access to|belong to|member of|at) (?:a |the |my )?gym\b|\bgym membership\b")
+_LIMITATIONS = re.compile(r"\b(?:bad|weak|injured|sore|hurt) (knees?|back|shoulders?|ankles?|hips?|wrists?)\b"
+                          r"|\b(knee|back|shoulder|ankle|hip|wrist) (?:pain|injury|injuries|problems?|issues?)\b")
+_NOTHING = re.compile(r"^(?:no|none|nope|nothing|not really|no restrictions|n/a)\b")
+
+
+def extract_preferences(text: str, question_field: str = None):
+    parts = []
+    if _NO_EQUIPMENT.search(text):
+        parts.append("no equipment")
+    else:
+        # In the order the user mentioned them
+        positions = {}
+        for tag, keywords in EQUIPMENT_KEYWORDS.items():
+            starts = [match.start() for keyword in keywords if (match := re.search(rf"\b{re.escape(keyword)}", text))]
+            if starts:
+                positions[tag.replace("_", " ")] = min(starts)
+        equipment = sorted(positions, key=positions.get)
+        if _GYM.search(text):
+            equipment.insert(0, "gym access")
+        parts.extend(equipment)
+    if _NO_DIET.search(text):
+        parts.append("no dietary restrictions")
+    parts.extend(diet for diet in _DIETS if re.search(rf"\b{diet}\b", text))
+    for match in _LIMITATIONS.finditer(text):
+        parts.append(match.group(0))
+    if not parts and question_field == "preferences" and _NOTHING.search(text):
+        parts.append("none")
+    return "; ".join(dict.fromkeys(parts)) or None
+
+
+# --- Answers to a direct question ---
+# A bare "30" only means something given the question it answers
+_QUESTION_FIELDS = (
+    ("age", re.compile(r"\bhow old\b|\byour age\b")),
+    ("weight", re.compile(r"\bweigh")),
+    ("height", re.compile(r"\bhow tall\b|\byour height\b")),
+    ("workout_time", re.compile(r"\bhow (?:long|much time|many minutes)\b")),
+    ("preferences", re.compile(r"\bequipment\b|\brestrictions?\b|\bpreferences?\b")),
+)
+_BARE_NUMBER = re.compile(r"^(?:about |around |roughly |i'm |i am )?(\d{2,3})\b")
+
+
+def question_field(question: str):
+    """The one profile field a coach message asks about, if it asks about exactly one."""
+    asked = [field for field, pattern in _QUESTION_FIELDS if pattern.search(_normalize(question or ""))]
+    return asked[0] if len(asked) == 1 else None
+
+
+def extract(text: str, question: str = None) -> dict:
+    """Profile fields stated in `text`, normalized; `question` is the coach message it answers."""
+    text = _normalize(text or "")
+    asked = question_field(question) if question else None
+    found = {
+        "height": extract_height(text),
+        "weight": extract_weight(text),
+        "age": extract_age(text),
+        "fitness_level": extract_fitness_level(text),
+        "workout_time": extract_workout_time(text),
+        "goal": extract_goal(text),
+        "preferences": extract_preferences(text, asked),
+    }
+    bare = _BARE_NUMBER.search(text)
+    if bare and asked in ("age", "weight", "workout_time") and found[asked] is None:
+        value = int(bare.group(1))
+        if asked == "age" and 13 <= value <= 99:
+            found["age"] = value
+        elif asked == "weight" and 60 <= value <= 700:
+            found["weight"] = f"{value} lbs"
+        elif asked == "workout_time" and 5 <= value <= 240:
+            found["workout_time"] = f"{value} minutes"
+    return {field: value for field, value in found.items() if value is not None}
+
+
+def missing_fields(known: dict) -> list:
+    return [field for field in FIELDS if field not in known]
+
+
+# --- Agent integration ---
+
+def _text(content) -> str:
+    return " ".join(part.text for part in (content.parts or []) if part.text).strip()
+
+
+def remember_answers(callback_context, llm_request):
+    """before_model_callback step: merges fields stated in the user's newest message into state.
+
+    Runs before every model call, so a turn with tool calls sees the same message
+    again; merging is idempotent, and a later answer replaces an earlier one.
+    """
+    contents = llm_request.contents
+    for position in range(len(contents) - 1, -1, -1):
+        if contents[position].role == "user" and _text(contents[position]):
+            question = next((_text(content) for content in reversed(contents[:position])
+                             if content.role == "model" and _text(content)), None)
+            found = extract(_text(contents[position]), question)
+            break
+    else:
+        return
+    known = dict(callback_context.state.get(PROFILE_STATE_KEY) or {})
+    if found and any(known.get(field) != value for field, value in found.items()):
+        known.update(found)
+        callback_context.state[PROFILE_STATE_KEY] = known
+
+
+def known_fields_note(callback_context) -> str:
+    """System instruction addition telling the agent which answers it already has."""
+    known = callback_context.state.get(PROFILE_STATE_KEY)
+    if not known:
+        return ""
+    missing = missing_fields(known)
+    note = (f"Profile answers the user has already given: {json.dumps(known)}. Do not ask for these again "
+            "(you may briefly confirm them) and use them when calling create_profile_json.")
+    if missing:
+        return f"{note} Still to ask, one at a time: {', '.join(missing)}."
+    return f"{note} Every profile field is answered; move on to the behavioral conversation."
@@ -0,0 +1,309 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+import httpx
+
+# --- Resilience ---
+# Key Concept: a model call can hang, fail transiently or fail for minutes at a time.
+# Every agent turn runs under a Resilience policy: a deadline for the whole turn,
+# jittered retries for transient errors, optionally a hedged second attempt when the
+# first is slower than the recent p95, and a circuit breaker that stops calling a
+# backend that keeps failing so callers can answer with a degraded response at once.
+
+# Status codes worth retrying: timeouts, rate limits and server-side failures
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+
+def is_transient(error: Exception) -> bool:
+    """True for errors a retry may fix: timeouts, dropped connections, 429s and 5xxs."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # google.genai's APIError carries `code`; other HTTP clients use `status_code`
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_timeout` seconds. Then a single trial call is let through (half-open):
+    success closes the circuit, failure opens it again."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+class LatencyTracker:
+    """Latencies of the last `window` successful attempts, for the hedging threshold."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Resilience:
+    """Runs agent turns under a deadline, retries, optional hedging and a circuit breaker.
+
+    Only enable `hedge` for stateless calls: a hedged attempt runs the same request a
+    second time, which must not append to a shared conversation. `retry_on` lists
+    exception types retried on top of transient errors, e.g. unusable model output.
+    """
+
+    def __init__(self, name: str, deadline: float, retries: int = 2, backoff: float = 0.25,
+                 max_backoff: float = 4.0, hedge: bool = False, hedge_min_samples: int = 20,
+                 breaker: CircuitBreaker = None, retry_on: tuple = ()):
+        self.name = name
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_on = retry_on
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.short_circuited = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpen(f"{self.name} model backend is unavailable")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: concurrent callers that failed together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _record_failure(self, error: Exception):
+        if isinstance(error, asyncio.TimeoutError):
+            self.timeouts += 1
+        self.failed += 1
+        if is_transient(error):
+            self.breaker.record_failure()  # Bad model output says nothing about the backend's health
+        else:
+            self.breaker.trial_in_flight = False
+
+    async def call(self, attempt):
+        """Returns the result of `await attempt()`, retrying transient failures.
+
+        `attempt` is a zero-argument callable returning a fresh coroutine each time.
+        Raises CircuitOpen without calling it while the breaker is open.
+        """
+        self._check_circuit()
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.deadline
+        for number in range(self.retries + 1):
+            try:
+                result = await asyncio.wait_for(self._attempt(attempt), give_up_at - loop.time())
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                self.breaker.trial_in_flight = False
+                raise
+            except Exception as e:
+                pause = self._backoff(number)
+                retryable = is_transient(e) or isinstance(e, self.retry_on)
+                if number == self.retries or not retryable or loop.time() + pause >= give_up_at:
+                    self._record_failure(e)
+                    raise
+                self.retried += 1
+                print(f"{self.name} attempt {number + 1} failed ({e!r}); retrying in {pause:.2f}s")
+                await asyncio.sleep(pause)
+
+    async def _timed(self, attempt):
+        start = time.monotonic()
+        result = await attempt()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    async def _attempt(self, attempt):
+        threshold = self.latency.percentile(0.95)
+        if not self.hedge or len(self.latency.samples) < self.hedge_min_samples:
+            return await self._timed(attempt)
+
+        # Hedging: if the first attempt is slower than the recent p95, start a second one
+        # and take whichever finishes first. The loser is cancelled.
+        first = asyncio.ensure_future(self._timed(attempt))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=threshold)
+            if not done:
+                self.hedged += 1
+                pending.add(asyncio.ensure_future(self._timed(attempt)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not pending:
+                        raise task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, open_stream, is_last=None):
+        """Yields items from `open_stream()` (an async generator factory) under the breaker
+        and the turn deadline. Retries only happen before the first item, since after
+        that the caller has already seen part of the turn.
+
+        `is_last(item)` marks the item that completes the call. The call counts as a
+        success once that item is reached, before it is yielded, so a consumer that
+        stops reading there (e.g. returns the final reply) still closes the breaker.
+
+        The stream is consumed in its own task and handed over through a queue, so the
+        deadline can cancel a hung model call without interrupting the consumer.
+        """
+        self._check_circuit()
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.deadline
+        start = time.monotonic()
+        number = 0
+        succeeded = False
+
+        def succeed():
+            nonlocal succeeded
+            if not succeeded:
+                succeeded = True
+                self.latency.record(time.monotonic() - start)
+                self.breaker.record_success()
+        while True:
+            items = asyncio.Queue()
+            done = object()
+
+            async def pump():
+                async for item in open_stream():
+                    await items.put(item)
+                await items.put(done)
+
+            producer = asyncio.ensure_future(pump())
+            started = False
+            try:
+                while True:
+                    if producer.done() and producer.exception() is None:
+                        item = items.get_nowait()  # Finished cleanly: the rest, end marker included, is queued
+                    else:
+                        getter = asyncio.ensure_future(items.get())
+                        finished, _ = await asyncio.wait({getter, producer}, timeout=give_up_at - loop.time(),
+                                                         return_when=asyncio.FIRST_COMPLETED)
+                        if getter not in finished:
+                            getter.cancel()
+                            if not producer.done():
+                                raise asyncio.TimeoutError(f"{self.name} turn exceeded {self.deadline}s")
+                            if producer.exception() is not None:
+                                raise producer.exception()
+                            continue
+                        item = getter.result()
+                    if item is done:
+                        succeed()
+                        return
+                    if is_last is not None and is_last(item):
+                        succeed()
+                    started = True
+                    yield item
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled, or the consumer stopped reading before the call completed
+                if not succeeded:
+                    self.breaker.trial_in_flight = False
+                raise
+            except Exception as e:
+                pause = self._backoff(number)
+                if (started or number == self.retries or not (is_transient(e) or isinstance(e, self.retry_on))
+                        or loop.time() + pause >= give_up_at):
+                    self._record_failure(e)
+                    raise
+                self.retried += 1
+                print(f"{self.name} stream attempt {number + 1} failed ({e!r}); retrying in {pause:.2f}s")
+                await asyncio.sleep(pause)
+                number += 1
+            finally:
+                producer.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retried,
+            "timeouts": self.timeouts,
+            "failures": self.failed,
+            "short_circuited": self.short_circuited,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p95_seconds": self.latency.percentile(0.95),
+            "breaker_state": self.breaker.state,
+            "breaker_open": self.breaker.state == "open",
+            "breaker_opened": self.breaker.times_opened,
+        }
+
+
+def from_env(name: str, deadline: float, retries: int, hedge: bool = False, retry_on: tuple = ()) -> Resilience:
+    """Builds a policy whose settings can be overridden with <NAME>_TURN_DEADLINE_SECONDS,
+    <NAME>_RETRIES, <NAME>_HEDGE, <NAME>_BREAKER_FAILURES and <NAME>_BREAKER_RESET_SECONDS."""
+    prefix = name.upper()
+    return Resilience(
+        name=name,
+        deadline=float(os.getenv(f"{prefix}_TURN_DEADLINE_SECONDS", deadline)),
+        retries=int(os.getenv(f"{prefix}_RETRIES", retries)),
+        hedge=os.getenv(f"{prefix}_HEDGE", str(hedge)).lower() == "true",
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET_SECONDS", "30")),
+        ),
+        retry_on=retry_on,
+    )
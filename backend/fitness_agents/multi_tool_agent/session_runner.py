@@ -1,14 +1,25 @@
 import os
+import time
+import uuid
 import asyncio
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm # For multi-model support
-from google.adk.sessions import InMemorySessionService
+import contextvars
+from contextlib import aclosing
+from typing import Optional
+from sqlalchemy.exc import SQLAlchemyError
+from google.adk.sessions import InMemorySessionService, DatabaseSessionService
 from google.adk.runners import Runner
+from google.adk.events import Event
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types # For creating message Content/Parts
-import json, requests
+import json
 
 
 from fitness_agents.multi_tool_agent import front_manager
+from fitness_agents.multi_tool_agent import context_window
+from fitness_agents.multi_tool_agent import profile_extractor
+from fitness_agents.multi_tool_agent import resilience
+from fitness_agents.multi_tool_agent.session_store import WriteBehindSessionService
+import metrics
 
 import warnings
 # Ignore all warnings
@@ -20,94 +31,265 @@ logging.basicConfig(level=logging.ERROR)
 
 # --- Session Management ---
 # Key Concept: SessionService stores conversation history & state.
-# InMemorySessionService is simple, non-persistent storage for this tutorial.
-session_service = InMemorySessionService()
+# With SESSION_DB_URL set (e.g. sqlite:///./sessions.db, or a shared SQL database in
+# production) events are appended to durable storage, so any uvicorn worker can resume
+# any conversation and restarts lose nothing. Unset, sessions live in process memory.
+# The database is only used from background threads (see session_store).
+SESSION_DB_URL = os.getenv("SESSION_DB_URL")
+
+def _open_session_db(attempts: int = 3):
+    # Every worker creates the tables it needs at startup. Workers starting together on an
+    # empty database race to create them; the losers fail, then find them on a retry.
+    for attempt in range(attempts):
+        try:
+            return DatabaseSessionService(db_url=SESSION_DB_URL)
+        except SQLAlchemyError as e:
+            if attempt == attempts - 1:
+                raise
+            print(f"Session database setup failed ({e.__class__.__name__}); retrying")
+            time.sleep(0.2 * (attempt + 1))
+
+def create_session_service():
+    """Returns the durable session service if configured, else an in-memory one."""
+    if SESSION_DB_URL:
+        return WriteBehindSessionService(_open_session_db())
+    return InMemorySessionService()
+
+session_service = create_session_service()
 
 # Define constants for identifying the interaction context
 APP_NAME = "my_app"
-SESSION_ID = "session_001" # Using a fixed ID for simplicity
 
-# Create the specific session where the conversation will happen
+# Called as profile_handler(user_id, profile_json) when the agent creates a profile.
+# The server points this at its batched profile writer.
+profile_handler = None
+
+def set_profile_handler(handler):
+    """Registers the callback that persists profiles produced by create_profile_json."""
+    global profile_handler
+    profile_handler = handler
+
+# Deadline, retries and circuit breaker for onboarding turns. No hedging: a second
+# attempt would run the same turn twice against the user's conversation.
+agent_resilience = resilience.from_env("onboarding", deadline=30, retries=2)
+
+# Sent instead of calling the model while its circuit breaker is open
+DEGRADED_REPLY = "Sorry, our coach is taking a short break right now. Please try again in a minute."
+
+def session_id_for(user_id: str) -> str:
+    """Each user gets their own onboarding session, stable across workers."""
+    return f"onboarding-{user_id}"
+
+
+# Characters sent to the model so far in the current turn attempt, for the token estimate
+_prompt_chars = contextvars.ContextVar("prompt_chars", default=None)
+
+def _before_model(callback_context, llm_request):
+    """Records profile answers, windows the history, then counts what is actually sent."""
+    profile_extractor.remember_answers(callback_context, llm_request)
+    result = context_window.window_history(callback_context, llm_request)
+    note = profile_extractor.known_fields_note(callback_context)
+    if note:
+        context_window.append_instruction(llm_request, note)
+    sent = _prompt_chars.get()
+    if sent is not None:
+        sent[0] += context_window.request_chars(llm_request)
+    return result
 
 
 # --- Runner ---
 # Key Concept: Runner orchestrates the agent execution loop.
+# Neither the agent nor the runner depends on the user (user and session are chosen
+# per run_async call), so the whole process shares one of each.
+_runner = None
+
+def get_runner() -> Runner:
+    """Returns the process-wide onboarding runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        _runner = Runner(
+            # The agent we want to run; older turns are summarized instead of resent
+            agent=front_manager.create_front_agent(before_model_callback=_before_model),
+            app_name=APP_NAME,   # Associates runs with our app
+            session_service=session_service # Uses our session manager
+        )
+    return _runner
+
 def create_session_runner(user_id: str) -> Runner:
-    """Creates a session runner for the agent."""
-    print(f"Creating runner.")
-    session = session_service.create_session(
+    """Starts a fresh onboarding session for the user and returns the shared runner."""
+    session_id = session_id_for(user_id)
+    delete_session(user_id)  # Starting over replaces any stored conversation
+    session_service.create_session(
         app_name=APP_NAME,
         user_id=user_id,
-        session_id=SESSION_ID
-    )
-    print(f"Session created: App='{APP_NAME}', User='{user_id}', Session='{SESSION_ID}'")
-    return Runner(
-        agent=front_manager.create_front_agent(), # The agent we want to run
-        app_name=APP_NAME,   # Associates runs with our app
-        session_service=session_service # Uses our session manager
+        session_id=session_id
     )
+    print(f"Session created: App='{APP_NAME}', User='{user_id}', Session='{session_id}'")
+    return get_runner()
 
-# TODO: Should take in session_id as a parameter to ensure that only the session associated with the user is used.
-async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
-    """Sends a query to the agent and prints the final response."""
+def seed_session_runner(user_id: str, opening: str, greeting: str) -> Runner:
+    """Starts a fresh onboarding session whose opening turn is already recorded.
+
+    The `opening` prompt and the agent's `greeting` are appended as session events,
+    exactly as a model turn would have left them, so the conversation carries on
+    from the greeting without a model call.
+    """
+    runner = create_session_runner(user_id)
+    session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+    invocation_id = f"e-{uuid.uuid4()}"
+    for author, role, text in (("user", "user", opening), (runner.agent.name, "model", greeting)):
+        event = Event(invocation_id=invocation_id, author=author,
+                      content=types.Content(role=role, parts=[types.Part(text=text)]))
+        session_service.append_event(session, event)
+    return runner
+
+async def generate_greeting(opening: str):
+    """Runs the opening turn in a throwaway session and returns the greeting, or None if degraded."""
+    user_id = f"greeting-{uuid.uuid4().hex}"
+    runner = create_session_runner(user_id)
+    try:
+        return await _final_item(stream_agent_async(opening, runner, user_id, streaming=False), degraded=None)
+    finally:
+        delete_session(user_id)
+
+async def load_session(user_id: str):
+    """The user's session; durable sessions are reloaded, as another worker may have advanced them."""
+    if isinstance(session_service, WriteBehindSessionService):
+        return await session_service.refresh(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+    return session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+
+async def flush_session(user_id: str):
+    """Waits until the user's session is in durable storage, so any worker can take the next turn."""
+    if isinstance(session_service, WriteBehindSessionService):
+        await session_service.flush(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+
+def close_session_service():
+    """Waits for durable session writes still queued; called at shutdown."""
+    if isinstance(session_service, WriteBehindSessionService):
+        session_service.close()
+
+async def resume_session_runner(user_id: str):
+    """Returns the shared runner if the user has a stored session, otherwise None."""
+    session = await load_session(user_id)
+    if session is None:
+        return None
+    print(f"Session resumed: App='{APP_NAME}', User='{user_id}', Session='{session.id}', Events={len(session.events)}")
+    return get_runner()
+
+def session_size(user_id: str) -> int:
+    """Approximate resident bytes of a user's session (events + state)."""
+    session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+    if session is None:
+        return 0
+    return len(session.model_dump_json())
+
+def release_session(user_id: str):
+    """Frees the process-local copy of a session; durable sessions stay resumable."""
+    if isinstance(session_service, WriteBehindSessionService):
+        session_service.release(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+    else:
+        delete_session(user_id)
+
+def delete_session(user_id: str):
+    """Drops a user's conversation history from the session service."""
+    session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id_for(user_id))
+
+async def stream_agent_async(query: str, runner: Runner, user_id: str, streaming: bool = True):
+    """Sends a query to the agent and yields its events as they arrive.
+
+    Yields dicts whose `type` is "text" (a partial chunk of model output, only
+    when `streaming`), "tool_call", "tool_result", and finally "final" with the
+    complete response text. The turn runs under `agent_resilience`; while the
+    model backend is failing the only item is a degraded "final" reply.
+    """
+    attempts = 0
+
+    def open_turn():
+        nonlocal attempts
+        # The first attempt stores the user's message before calling the model, so a
+        # retry continues from the stored session instead of sending it again
+        message = query if attempts == 0 else None
+        attempts += 1
+        return _run_turn(message, runner, user_id, streaming)
+
+    # Recorded when the turn's outcome is known, not when the caller closes this generator:
+    # callers that only want the reply stop reading at the "final" item
+    start = time.perf_counter()
+
+    def record(outcome: str):
+        metrics.agent_turn_seconds.observe(time.perf_counter() - start, "onboarding", outcome)
+
+    try:
+        async for item in agent_resilience.stream(open_turn, is_last=lambda item: item["type"] == "final"):
+            if item["type"] == "final":
+                record("ok")
+            yield item
+    except resilience.CircuitOpen:
+        record("degraded")
+        yield {"type": "final", "text": DEGRADED_REPLY, "degraded": True}
+    except Exception:
+        record("error")
+        raise
+
+async def _run_turn(query: Optional[str], runner: Runner, user_id: str, streaming: bool):
+    """One attempt at a turn; `query` is None when resuming after a failed attempt."""
+
+    # The previous turn may have run on another worker
+    if isinstance(session_service, WriteBehindSessionService):
+        await load_session(user_id)
 
     # Prepare the user's message in ADK format
-    content = types.Content(role='user', parts=[types.Part(text=query)])
+    content = types.Content(role='user', parts=[types.Part(text=query)]) if query is not None else None
 
     final_response_text = "Agent did not produce a final response." # Default
 
+    # SSE mode makes the model yield partial text chunks before the aggregated final event
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+
+    # Time between events is charged to the model, except the wait that ends in a tool result
+    sent = [0]
+    _prompt_chars.set(sent)
+    received = 0
+    llm_seconds = tool_seconds = 0.0
+    last = time.perf_counter()
+
     # Key Concept: run_async executes the agent logic and yields Events.
     # We iterate through events to find the final answer.
-    async for event in runner.run_async(user_id=user_id, session_id=SESSION_ID, new_message=content):
+    events = runner.run_async(user_id=user_id, session_id=session_id_for(user_id), new_message=content, run_config=run_config)
+    async for event in events:
         # You can uncomment the line below to see *all* events during execution
         # print(f"  [Event] Author: {event.author}, Type: {type(event).__name__}, Final: {event.is_final_response()}, Content: {event.content}")
         # Key Concept: is_final_response() marks the concluding message for the turn.
         # print(event)    
+        now = time.perf_counter()
+        if event.get_function_responses():
+            tool_seconds += now - last
+        else:
+            llm_seconds += now - last
+        last = now
+
+        if event.partial:
+            if event.content and event.content.parts and event.content.parts[0].text:
+                yield {"type": "text", "text": event.content.parts[0].text}
+            continue
+
+        if event.author != "user" and event.content and event.content.parts:
+            received += sum(len(part.text) for part in event.content.parts if part.text)
+
+        for function_call in event.get_function_calls():
+            yield {"type": "tool_call", "name": function_call.name, "args": function_call.args}
+
         if event.content and event.content.parts[0].function_response:
             # Handle function response
             function_response = event.content.parts[0].function_response
             profile_json = function_response.response
             if function_response.name == "create_profile_json":
-                # Make a POST request to update the fitness profile in a non-blocking way
-                import threading
-                def send_profile_update():
-                    url = os.getenv("VITE_APP_BACKEND_URL") + "/users/update-fitness-profile"
-                    headers = {"Content-Type": "application/json"}
-                    
-                    print(f"Function response received: {profile_json}")
-                    print(f"Type of profile_json: {type(profile_json)}")
-                    
-                    try:
-                        data = {
-                            "auth0_id": user_id,
-                            "profile_json": profile_json
-                        }
-                        print(f"Sending request to {url} with data: {json.dumps(data)}")
-                        
-                        # Set a timeout to prevent hanging
-                        post_response = requests.post(url, headers=headers, json=data, timeout=5)
-                        
-                        print(f"Response status code: {post_response.status_code}")
-                        print(f"Response content: {post_response.text}")
-                        
-                        if post_response.status_code == 200:
-                            print("Profile updated successfully")
-                        else:
-                            print(f"Failed to update profile. Status code: {post_response.status_code}, Response: {post_response.text}")
-                    except requests.exceptions.Timeout:
-                        print("Request timed out - server might be slow or unavailable")
-                    except requests.exceptions.ConnectionError:
-                        print("Connection error - cannot connect to the server")
-                    except Exception as e:
-                        print(f"Exception during profile update request: {e}")
-                        import traceback
-                        traceback.print_exc()
-                
-                # Run the request in a separate thread to avoid blocking
-                thread = threading.Thread(target=send_profile_update)
-                thread.daemon = True  # Allow Python to exit even if thread is running
-                thread.start()
-                print("Profile update request started in background thread")
+                # Hand the profile to the server's in-process writer; no loopback HTTP call
+                if profile_handler is None:
+                    print(f"No profile handler registered; profile for user {user_id} was not saved")
+                else:
+                    profile_handler(user_id, profile_json)
+            yield {"type": "tool_result", "name": function_response.name, "response": function_response.response}
         
         if event.is_final_response():
             if event.content and event.content.parts:
@@ -117,6 +299,29 @@ async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
                 final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
             # Add more checks here if needed (e.g., specific error codes)
             break # Stop processing events once the final response is found
+    # Closed here rather than by the garbage collector, whose finalizer wakes the loop from outside
+    await events.aclose()
 
     #print(f"<<< Agent Response: {final_response_text}")
-    return final_response_text
\ No newline at end of file
+    await flush_session(user_id)
+    metrics.agent_llm_seconds.observe(llm_seconds, "onboarding")
+    metrics.agent_tool_seconds.observe(tool_seconds, "onboarding")
+    metrics.agent_turn_tokens.observe(sent[0] // 4, "onboarding", "prompt")
+    metrics.agent_turn_tokens.observe(received // 4, "onboarding", "completion")
+    yield {"type": "final", "text": final_response_text}
+
+async def _final_item(stream, degraded=DEGRADED_REPLY):
+    """Reads a turn's stream up to its "final" item and returns its text, or `degraded`
+    if the breaker answered instead. The stream is closed before returning, not left
+    for the garbage collector."""
+    text = None
+    async with aclosing(stream):
+        async for item in stream:
+            if item["type"] == "final":
+                text = degraded if item.get("degraded") else item["text"]
+                break
+    return text
+
+async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
+    """Sends a query to the agent and returns the final response."""
+    return await _final_item(stream_agent_async(query, runner, user_id, streaming=False))
\ No newline at end of file
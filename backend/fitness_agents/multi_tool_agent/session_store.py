@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from google.adk.sessions import BaseSessionService, Session
+
+# --- Durable sessions off the event loop ---
+# Key Concept: ADK's DatabaseSessionService is synchronous SQLAlchemy, and the Runner
+# calls its session service from inside run_async, on the event loop. Used directly
+# against a shared SQL database, every turn would block the loop on several round
+# trips. WriteBehindSessionService serves the Runner from an in-process copy of each
+# session and runs the durable reads and writes on a thread pool, in order per
+# session. A turn reloads the copy from storage first (another worker may have run
+# the previous turn) and waits for its own writes before replying, so the next turn
+# can go to any worker.
+
+SESSION_WRITE_THREADS = int(os.getenv("SESSION_WRITE_THREADS", "4"))
+
+
+class WriteBehindSessionService(BaseSessionService):
+    """Session service for the Runner: reads from memory, writes to `durable` on background threads.
+
+    Serves the calls the Runner makes (get_session, append_event) and those
+    session_runner makes (create_session, delete_session) from memory, and adds
+    async `refresh` and `flush` to bring a session in from storage and wait for
+    its writes. Listing sessions and events goes straight to `durable`.
+    """
+
+    def __init__(self, durable, threads: int = SESSION_WRITE_THREADS):
+        self.durable = durable
+        # (app_name, user_id, session_id) -> Session served to the Runner; event loop only
+        self._sessions = {}
+        # Same key -> the durable service's Session; only touched by that session's queued operations
+        self._stored = {}
+        # Same key -> the session's latest queued operation, which the next one waits for
+        self._tails = {}
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="session-store")
+        self.writes = 0
+        self.failed_writes = 0
+
+    def _submit(self, key, operation, *args):
+        """Queues `operation(*args)` on the pool after the session's earlier operations."""
+        previous = self._tails.get(key)
+        if previous is not None and previous.done():
+            previous = None
+
+        def run():
+            # The pool is FIFO, so `previous` has already started by the time this runs
+            if previous is not None:
+                wait([previous])
+            return operation(*args)
+
+        future = self._pool.submit(run)
+        self._tails[key] = future
+        if len(self._tails) > 1024:
+            self._tails = {key: tail for key, tail in self._tails.items() if not tail.done()}
+        return future
+
+    def _write(self, key, operation, *args):
+        def logged():
+            try:
+                operation(*args)
+            except Exception as e:
+                self.failed_writes += 1
+                print(f"Error writing session {key[2]}: {e!r}")
+        self.writes += 1
+        self._submit(key, logged)
+
+    # --- Runner and session_runner interface ---
+
+    def create_session(self, *, app_name: str, user_id: str, state: dict = None, session_id: str = None) -> Session:
+        session_id = session_id or uuid.uuid4().hex
+        key = (app_name, user_id, session_id)
+        session = Session(id=session_id, app_name=app_name, user_id=user_id, state=dict(state or {}),
+                          last_update_time=time.time())
+        self._sessions[key] = session
+        self._write(key, self._create_stored, key, dict(state or {}))
+        return session
+
+    def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None):
+        return self._sessions.get((app_name, user_id, session_id))
+
+    def append_event(self, session: Session, event):
+        if event.partial:
+            return event
+        super().append_event(session, event)  # Applies the state delta to the in-process copy
+        session.last_update_time = event.timestamp
+        key = (session.app_name, session.user_id, session.id)
+        self._write(key, self._append_stored, key, event.model_copy(deep=True))
+        return event
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str):
+        key = (app_name, user_id, session_id)
+        self._sessions.pop(key, None)
+        self._write(key, self._delete_stored, key)
+
+    def list_sessions(self, *, app_name: str, user_id: str):
+        return self.durable.list_sessions(app_name=app_name, user_id=user_id)
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str):
+        return self.durable.list_events(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    # --- Durable side, run on the pool ---
+
+    def _create_stored(self, key, state: dict):
+        app_name, user_id, session_id = key
+        self._stored[key] = self.durable.create_session(app_name=app_name, user_id=user_id,
+                                                        state=state, session_id=session_id)
+
+    def _append_stored(self, key, event):
+        stored = self._stored.get(key) or self._load_stored(key, copy=False)
+        if stored is None:
+            raise LookupError("session is not in storage")
+        self.durable.append_event(stored, event)
+
+    def _delete_stored(self, key):
+        self._stored.pop(key, None)
+        app_name, user_id, session_id = key
+        self.durable.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def _load_stored(self, key, copy: bool = True):
+        app_name, user_id, session_id = key
+        stored = self.durable.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if stored is None:
+            self._stored.pop(key, None)
+            return None
+        self._stored[key] = stored
+        return stored.model_copy(deep=True) if copy else stored
+
+    # --- Called by session_runner around turns ---
+
+    async def refresh(self, *, app_name: str, user_id: str, session_id: str):
+        """Reloads the session from storage, after this process's queued writes; None if not stored."""
+        key = (app_name, user_id, session_id)
+        session = await asyncio.wrap_future(self._submit(key, self._load_stored, key))
+        if session is None:
+            self._sessions.pop(key, None)
+        else:
+            self._sessions[key] = session
+        return session
+
+    async def flush(self, *, app_name: str, user_id: str, session_id: str):
+        """Waits until the session's queued writes are in storage."""
+        tail = self._tails.get((app_name, user_id, session_id))
+        if tail is not None:
+            await asyncio.wrap_future(tail)
+
+    def release(self, *, app_name: str, user_id: str, session_id: str):
+        """Drops the in-process copy; the stored session stays resumable."""
+        key = (app_name, user_id, session_id)
+        self._sessions.pop(key, None)
+        self._submit(key, self._stored.pop, key, None)
+
+    def close(self):
+        """Waits for queued writes; called at shutdown."""
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            "sessions_in_memory": len(self._sessions),
+            "writes": self.writes,
+            "failed_writes": self.failed_writes,
+        }
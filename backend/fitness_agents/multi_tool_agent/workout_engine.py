@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import zlib
+import bisect
+
+from fitness_agents.multi_tool_agent.workout_generator import Exercises
+
+# Local, rule-based workout generation. Builds an `Exercises` document from the bundled
+# exercise catalog in microseconds, so a workout never has to wait on the model.
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "exercise_catalog.json")
+
+LEVELS = ("beginner", "intermediate", "advanced")
+GOALS = ("weight_loss", "muscle_gain", "endurance", "general")
+
+# Keywords that map free-text profile answers onto catalog tags
+GOAL_KEYWORDS = {
+    "weight_loss": ("lose", "loss", "fat", "lean", "slim", "tone"),
+    "muscle_gain": ("muscle", "strength", "strong", "gain", "bulk", "build"),
+    "endurance": ("endurance", "cardio", "stamina", "run", "marathon", "conditioning"),
+}
+EQUIPMENT_KEYWORDS = {
+    "dumbbells": ("dumbbell",),
+    "kettlebell": ("kettlebell",),
+    "resistance_band": ("band",),
+    "pull_up_bar": ("pull up bar", "pullup bar", "pull-up bar", "chin up bar"),
+    "jump_rope": ("jump rope", "skipping rope", "rope"),
+}
+# Session lengths written out in words, rewritten as digits before parse_minutes reads them.
+# Compound phrases first, so "an hour and a half" is not read as "1 hour".
+_DURATION_PHRASES = (
+    (re.compile(r"\b(?:an?|one)?\s*hour and a half\b"), "90 minutes"),
+    (re.compile(r"\b(?:an?|one) and a half (?=h)"), "1.5 "),
+    (re.compile(r"\bhalf (?:an? )?hour\b|\bhalf-hour\b"), "30 minutes"),
+    (re.compile(r"\b(?:a )?quarter (?:of an )?hour\b|\bquarter-hour\b"), "15 minutes"),
+)
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "ten": 10, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "forty": 40, "forty-five": 45, "forty five": 45, "sixty": 60, "ninety": 90,
+}
+# Only a number word directly before a unit counts: "a day" or "one of those" are not durations
+_NUMBER_WORD = re.compile(r"\b(forty[- ]five|an?|one|two|three|ten|fifteen|twenty|thirty|forty|sixty|ninety)\s+"
+                          r"(?=(?:h|hr|hrs|hour|hours|m|min|mins|minute|minutes)\b)")
+# A number with an optional unit; the unit may run into the next number, as in "1h30m"
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*(h|hr|hrs|hour|hours|m|min|mins|minute|minutes)?(?![a-z])")
+# What may separate the parts of one duration ("1 hour 30 minutes", "2 hours, and 10 mins");
+# anything else ("45 minutes to an hour") starts a different one
+_DURATION_JOINER = re.compile(r"\s*,?\s*(?:and\s*)?")
+
+# Per-level prescription: seconds per timed exercise and reps per repetition exercise
+LEVEL_PRESCRIPTION = {
+    "beginner": {"seconds": 45, "reps": 10},
+    "intermediate": {"seconds": 60, "reps": 12},
+    "advanced": {"seconds": 75, "reps": 15},
+}
+SECONDS_PER_REP = 3  # Matches how build_workout turns durations back into reps
+DEFAULT_MINUTES = 30
+MIN_EXERCISES = 5
+MAX_EXERCISES = 10
+
+
+def _load_catalog():
+    with open(CATALOG_PATH) as f:
+        return json.load(f)
+
+
+CATALOG = _load_catalog()
+
+# --- Indexes ---
+# Each maps a tag to the set of catalog positions carrying it; lookups are set intersections.
+BY_LEVEL = {level: set() for level in LEVELS}
+BY_GOAL = {goal: set() for goal in GOALS}
+BY_TYPE = {"TIME BASED": set(), "REPETITION BASED": set()}
+BY_EQUIPMENT = {}
+for _position, _exercise in enumerate(CATALOG):
+    BY_TYPE[_exercise["type"]].add(_position)
+    for _level in _exercise["levels"]:
+        BY_LEVEL[_level].add(_position)
+    for _goal in _exercise["goals"]:
+        BY_GOAL[_goal].add(_position)
+    for _equipment in _exercise["equipment"]:
+        BY_EQUIPMENT.setdefault(_equipment, set()).add(_position)
+
+# Exercises sorted by the shortest session they suit; bisect gives everything within a budget
+_BY_MIN_MINUTES = sorted(range(len(CATALOG)), key=lambda position: CATALOG[position]["min_minutes"])
+_MIN_MINUTES_KEYS = [CATALOG[position]["min_minutes"] for position in _BY_MIN_MINUTES]
+
+
+def parse_level(text) -> str:
+    text = str(text or "").lower()
+    for level in ("advanced", "intermediate", "beginner"):
+        if level in text:
+            return level
+    if "expert" in text or "athlete" in text:
+        return "advanced"
+    return "beginner"
+
+
+def parse_goal(text) -> str:
+    text = str(text or "").lower()
+    for goal, keywords in GOAL_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            return goal
+    return "general"
+
+
+def parse_minutes(text) -> int:
+    """Reads a session length such as "30 minutes", "1 hour", "1.5 hrs", "half an hour" or
+    "1 hour 30 minutes" as minutes. The first duration in the text counts."""
+    text = str(text or "").lower()
+    for pattern, digits in _DURATION_PHRASES:
+        text = pattern.sub(digits, text)
+    text = _NUMBER_WORD.sub(lambda match: f"{_NUMBER_WORDS[match.group(1)]} ", text)
+    minutes, end = None, None
+    for match in _DURATION.finditer(text):
+        if minutes is not None and not (match.group(2) and _DURATION_JOINER.fullmatch(text, end, match.start())):
+            break
+        unit = match.group(2) or "min"
+        value = float(match.group(1))
+        minutes = (minutes or 0) + (value * 60 if unit.startswith("h") else value)
+        end = match.end()
+        if not match.group(2):
+            break  # A bare number is a whole duration on its own
+    if minutes is None:
+        return DEFAULT_MINUTES
+    return max(5, min(int(minutes), 180))
+
+
+def parse_equipment(text) -> set:
+    """Returns the equipment tags available to the user; bodyweight is always included."""
+    text = str(text or "").lower()
+    available = {"bodyweight"}
+    if re.search(r"\bno (equipment|gear)\b|\bnone\b", text):
+        return available
+    for tag, keywords in EQUIPMENT_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            available.add(tag)
+    return available
+
+
+def _candidates(level: str, goal: str, equipment: set, minutes: int) -> list:
+    usable = set()
+    for tag in equipment:
+        usable |= BY_EQUIPMENT.get(tag, set())
+    usable &= set(_BY_MIN_MINUTES[:bisect.bisect_right(_MIN_MINUTES_KEYS, minutes)])
+
+    # Strength goals are trained in reps, everything else against the clock. Relax the
+    # type, then the goal, then the level, until there are enough exercises to choose from.
+    kind = BY_TYPE["REPETITION BASED" if goal == "muscle_gain" else "TIME BASED"]
+    matching_level = usable & BY_LEVEL[level]
+    for pool in (matching_level & BY_GOAL[goal] & kind, matching_level & BY_GOAL[goal], matching_level, usable):
+        if len(pool) >= MIN_EXERCISES:
+            return sorted(pool)
+    return sorted(usable)
+
+
+def generate(profile: dict) -> Exercises:
+    """Builds a workout for a user's profile details from the local catalog."""
+    level = parse_level(profile.get("fitness_level"))
+    goal = parse_goal(profile.get("goal"))
+    minutes = parse_minutes(profile.get("workout_time"))
+    equipment = parse_equipment(profile.get("preferences"))
+
+    pool = _candidates(level, goal, equipment, minutes)
+    count = max(MIN_EXERCISES, min(MAX_EXERCISES, minutes // 4))
+    # Rotate through the pool by a stable hash so different profiles see different picks
+    offset = zlib.crc32(f"{level}|{goal}|{minutes}|{sorted(equipment)}".encode()) % len(pool)
+    picks = [CATALOG[pool[(offset + n) % len(pool)]] for n in range(min(count, len(pool)))]
+
+    # Spread the session over the picks: timed work stretches to fill it, reps stay at the prescription
+    prescription = LEVEL_PRESCRIPTION[level]
+    slot_seconds = max(prescription["seconds"], (minutes * 60 // len(picks)) // 15 * 15)
+    workout = {"name": [], "description": [], "duration": [], "type": []}
+    for exercise in picks:
+        workout["name"].append(exercise["name"])
+        workout["description"].append(exercise["description"])
+        workout["type"].append(exercise["type"])
+        if exercise["type"] == "TIME BASED":
+            workout["duration"].append(slot_seconds)
+        else:
+            workout["duration"].append(prescription["reps"] * SECONDS_PER_REP)
+    return Exercises(**workout)
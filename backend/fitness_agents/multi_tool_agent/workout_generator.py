@@ -1,12 +1,5 @@
 import json
 import os
-import asyncio
-from dotenv import load_dotenv
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm # For multi-model support
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types # For creating message Content/Parts
 
 import warnings
 # Ignore all warnings
@@ -15,12 +8,14 @@ warnings.filterwarnings("ignore")
 import logging
 logging.basicConfig(level=logging.ERROR)
 
-load_dotenv()
-
 # @title Define the Weather Agent
 # Use one of the model constants defined earlier
 AGENT_MODEL = "gemini-2.0-flash" # Starting with a powerful Gemini model
 
+# "parallel" asks the model for the Exercises lists, "records" for one object per exercise
+# (ExerciseRecords), which cannot come back with lists of different lengths
+OUTPUT_SCHEMA = os.getenv("WORKOUT_OUTPUT_SCHEMA", "parallel").lower()
+
 def format_exercises(list_of_exercises: list[str]):
     """Converts string array of exercises to JSON format."""
     exercises = { 
@@ -32,6 +27,8 @@ def format_exercises(list_of_exercises: list[str]):
 
 def create_workout_agent():
     """Returns the front agent."""
+    # Imported here so the Exercises schema (used by the local engine) loads without ADK
+    from google.adk.agents import Agent
     print(f"Front manager created using model '{AGENT_MODEL}'.")
     return Agent(
         name="workout_generator",
@@ -39,9 +36,10 @@ def create_workout_agent():
         description="Takes a fitness profile in JSON string and generates a workout routine.", # Crucial for delegation later
         instruction="You are a workout generator. Your goal is to generate a workout routine based on the user's fitness profile data which is in JSON string format."
                     "You will receive a JSON string with the user's height, weight, fitness level, workout time, and goal."
-                    "IMPORTANT: Generate a list of at least 5 exercises that are suitable for the user's fitness level and goal.",
-        output_schema=Exercises,  # Specify the output schema for validation
-        output_key="workout_exercises",
+                    "IMPORTANT: Generate a list of at least 5 exercises that are suitable for the user's fitness level and goal."
+                    "If a draft_workout is included, personalize it to the profile (swap, reorder or retime exercises) rather than starting over.",
+        output_schema=ExerciseRecords if OUTPUT_SCHEMA == "records" else Exercises,  # Constrains the model's output
+        # No output_key: ADK would validate the output strictly before workout_repair could fix it
         tools=[],
     )
 
@@ -54,6 +52,17 @@ class Exercises(BaseModel):
     duration: list[int] = Field(..., description="Duration of the exercise in seconds")
     type: list[str] = Field(..., description="Type of the exercise. Can only be TIME BASED or REPETITION BASED.")
 
+class ExerciseRecord(BaseModel):
+    """One exercise of the compact record-array output."""
+    name: str = Field(..., description="Name of the exercise")
+    description: str = Field(..., description="Description of the exercise")
+    duration: int = Field(..., description="Duration of the exercise in seconds")
+    type: str = Field(..., description="Type of the exercise. Can only be TIME BASED or REPETITION BASED.")
+
+class ExerciseRecords(BaseModel):
+    """Record-array alternative to Exercises (WORKOUT_OUTPUT_SCHEMA=records)."""
+    exercises: list[ExerciseRecord] = Field(..., description="The exercises of the workout, in order")
+
 # workout_agent = Agent(
 #     name="workout_generator",
 #     model=AGENT_MODEL, # Specifies the underlying LLM
@@ -0,0 +1,241 @@
+import re
+import json
+
+from fitness_agents.multi_tool_agent import workout_engine
+from fitness_agents.multi_tool_agent.workout_generator import Exercises
+import metrics
+
+# --- Output repair ---
+# Key Concept: the workout agent's parallel lists often come back slightly wrong:
+# lists of different lengths, "Reps" or "timed" as a type, "45 seconds" as a
+# duration, a description missing. Each of those used to cost a whole new generation.
+# Its raw output now goes through a local repair stage instead. The stage aligns the
+# lists on the exercise names, coerces durations to seconds, and normalizes types to
+# TIME BASED or REPETITION BASED. Anything still missing comes from the exercise
+# catalog. Only output with no usable exercise at all raises UnrepairableOutput,
+# which the workout policy retries with the model.
+
+TIME_BASED = "TIME BASED"
+REPETITION_BASED = "REPETITION BASED"
+FIELDS = ("name", "description", "duration", "type")
+MIN_SECONDS = 5
+MAX_SECONDS = 30 * 60
+
+
+class UnrepairableOutput(ValueError):
+    """The workout agent's output holds no usable exercise; another model call may do better."""
+
+
+def _key(name) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", str(name).lower()).strip()
+
+
+CATALOG_BY_NAME = {_key(exercise["name"]): exercise for exercise in workout_engine.CATALOG}
+
+
+# --- Parsing ---
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _load(response, repairs: list):
+    if isinstance(response, (dict, list)):
+        return response
+    text = _FENCE.sub("", str(response or "").strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    # Prose around the JSON: take the outermost object or array
+    starts = [position for position in (text.find("{"), text.find("[")) if position >= 0]
+    end = max(text.rfind("}"), text.rfind("]"))
+    if starts and end > min(starts):
+        try:
+            document = json.loads(text[min(starts):end + 1])
+            repairs.append("extracted_json")
+            return document
+        except ValueError:
+            pass
+    raise UnrepairableOutput(f"Workout output is not JSON: {text[:80]!r}")
+
+
+def _rows(document, repairs: list) -> list:
+    """One dict per exercise, from either the record-array or the parallel-list shape."""
+    if isinstance(document, dict) and isinstance(document.get("exercises"), list):
+        document = document["exercises"]
+    if isinstance(document, list):
+        rows = []
+        for record in document:
+            if isinstance(record, dict):
+                rows.append(record)
+            elif isinstance(record, str):
+                rows.append({"name": record})
+                repairs.append("record_fields")
+        return rows
+
+    if not isinstance(document, dict) or not document.get("name"):
+        raise UnrepairableOutput("Workout output has no exercise names")
+    names = document["name"] if isinstance(document["name"], list) else [document["name"]]
+    columns = {}
+    for field in FIELDS[1:]:
+        values = document.get(field)
+        if values is None:
+            values = []
+        elif not isinstance(values, list):
+            # One value for every exercise, e.g. "type": "TIME BASED"
+            values = [values] * len(names)
+            repairs.append("broadcast_" + field)
+        if len(values) > len(names):
+            repairs.append("truncated_" + field)
+        elif len(values) < len(names):
+            repairs.append("missing_" + field)
+        columns[field] = values[:len(names)]
+    return [{"name": name, **{field: values[position] for field, values in columns.items() if position < len(values)}}
+            for position, name in enumerate(names)]
+
+
+# --- Coercion ---
+_CLOCK = re.compile(r"^(\d{1,2}):(\d{2})$")
+_QUANTITY = re.compile(r"(\d+(?:\.\d+)?)\s*(seconds?|secs?|s|minutes?|mins?|m|reps?|repetitions?|x)?\b")
+
+
+def coerce_duration(value):
+    """(seconds, implied type) for a duration the model wrote as a number or text; (None, None) if unreadable.
+
+    "90", 90.0 and "1:30" are seconds, "2 min" is 120, and "12 reps" is reps at
+    the engine's seconds per repetition, which also implies REPETITION BASED.
+    """
+    implied = None
+    if isinstance(value, bool) or value is None:
+        return None, None
+    if isinstance(value, (int, float)):
+        seconds = value
+    else:
+        text = str(value).strip().lower()
+        clock = _CLOCK.match(text)
+        match = _QUANTITY.search(text)
+        if clock:
+            seconds = int(clock.group(1)) * 60 + int(clock.group(2))
+        elif match:
+            seconds = float(match.group(1))
+            unit = match.group(2) or "s"
+            if unit.startswith("m"):
+                seconds *= 60
+            elif unit.startswith("r") or unit == "x":
+                seconds *= workout_engine.SECONDS_PER_REP
+                implied = REPETITION_BASED
+        else:
+            return None, None
+    if seconds <= 0:
+        return None, None
+    return max(MIN_SECONDS, min(MAX_SECONDS, round(seconds))), implied
+
+
+def normalize_type(value):
+    """TIME BASED or REPETITION BASED for the model's spelling of either, else None."""
+    text = re.sub(r"[\s_-]+", " ", str(value or "")).strip().upper()
+    if "REP" in text:
+        return REPETITION_BASED
+    if "TIME" in text or "DURATION" in text or "SECOND" in text or "CARDIO" in text:
+        return TIME_BASED
+    return None
+
+
+def _repair_row(row: dict, prescription: dict, repairs: list) -> dict:
+    name = " ".join(str(row["name"]).split())
+    known = CATALOG_BY_NAME.get(_key(name))
+
+    description = row.get("description")
+    if not isinstance(description, str) or not description.strip():
+        description = known["description"] if known else name
+        repairs.append("description_filled")
+
+    duration, implied = coerce_duration(row.get("duration"))
+    if row.get("duration") is not None and (duration is None or duration != row["duration"]):
+        repairs.append("duration_coerced")
+
+    kind = normalize_type(row.get("type"))
+    if kind is None:
+        kind = implied or (known["type"] if known else TIME_BASED)
+        repairs.append("type_filled")
+    elif kind != row.get("type"):
+        repairs.append("type_normalized")
+
+    if duration is None:
+        # The engine's prescription for the user's level
+        duration = (prescription["seconds"] if kind == TIME_BASED
+                    else prescription["reps"] * workout_engine.SECONDS_PER_REP)
+        repairs.append("duration_filled")
+    return {"name": name, "description": description.strip(), "duration": duration, "type": kind}
+
+
+def _repair(response, profile: dict):
+    repairs = []
+    rows = _rows(_load(response, repairs), repairs)
+    prescription = workout_engine.LEVEL_PRESCRIPTION[workout_engine.parse_level(profile.get("fitness_level"))]
+
+    exercises = []
+    seen = set()
+    for row in rows:
+        if not isinstance(row.get("name"), str) or not row["name"].strip():
+            repairs.append("unnamed_dropped")
+            continue
+        if _key(row["name"]) in seen:
+            repairs.append("duplicate_dropped")
+            continue
+        seen.add(_key(row["name"]))
+        exercises.append(_repair_row(row, prescription, repairs))
+    if not exercises:
+        raise UnrepairableOutput("Workout output has no usable exercise")
+
+    if len(exercises) > workout_engine.MAX_EXERCISES:
+        del exercises[workout_engine.MAX_EXERCISES:]
+        repairs.append("truncated_exercises")
+    if len(exercises) < workout_engine.MIN_EXERCISES:
+        # Top up from the local plan for the same profile
+        local = workout_engine.generate(profile)
+        for row in zip(local.name, local.description, local.duration, local.type):
+            if len(exercises) >= workout_engine.MIN_EXERCISES:
+                break
+            if _key(row[0]) not in seen:
+                seen.add(_key(row[0]))
+                exercises.append(dict(zip(FIELDS, row)))
+        repairs.append("padded_from_catalog")
+
+    return Exercises(**{field: [exercise[field] for exercise in exercises] for field in FIELDS}), repairs
+
+
+def repair(response, profile: dict = None) -> Exercises:
+    """Turns the workout agent's raw output (JSON text, parallel lists or record array) into Exercises.
+
+    Raises UnrepairableOutput when no exercise can be recovered. Every call is
+    counted as valid, repaired or unrepairable, with the kinds of repair it took.
+    """
+    try:
+        exercises, repairs = _repair(response, profile or {})
+    except UnrepairableOutput:
+        metrics.workout_outputs.inc("unrepairable")
+        raise
+    metrics.workout_outputs.inc("repaired" if repairs else "valid")
+    for kind in dict.fromkeys(repairs):
+        metrics.workout_output_repairs.inc(kind)
+    return exercises
+
+
+def as_records(exercises: Exercises) -> dict:
+    """Exercises in the record-array shape of ExerciseRecords."""
+    return {"exercises": [dict(zip(FIELDS, row)) for row in
+                          zip(exercises.name, exercises.description, exercises.duration, exercises.type)]}
+
+
+def stats() -> dict:
+    outcomes = {outcome: count for (outcome,), count in metrics.workout_outputs.values().items()}
+    total = sum(outcomes.values())
+    return {
+        "outputs": total,
+        "valid": outcomes.get("valid", 0),
+        "repaired": outcomes.get("repaired", 0),
+        "unrepairable": outcomes.get("unrepairable", 0),
+        # Share of outputs that cost another model call
+        "retry_rate": outcomes.get("unrepairable", 0) / total if total else 0.0,
+        "repairs": {kind: count for (kind,), count in metrics.workout_output_repairs.values().items()},
+    }
@@ -1,14 +1,16 @@
 import json
 import os
+import time
+import uuid
 import asyncio
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm # For multi-model support
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.genai import types
-import requests # For creating message Content/Parts
 
 from fitness_agents.multi_tool_agent import workout_generator
+from fitness_agents.multi_tool_agent import resilience
+from fitness_agents.multi_tool_agent import workout_repair
+import metrics
 
 import warnings
 # Ignore all warnings
@@ -26,31 +28,34 @@ session_service = InMemorySessionService()
 # Define constants for identifying the interaction context
 APP_NAME = "my_app"
 USER_ID = "user_1"
-SESSION_ID = "session_001" # Using a fixed ID for simplicity
+
+# Deadline, retries and circuit breaker for workout generation. Each attempt gets its
+# own session, so generation is stateless and may be hedged (WORKOUT_HEDGE=true).
+# Output workout_repair cannot fix is retried like a transient error.
+workout_resilience = resilience.from_env("workout", deadline=8, retries=1,
+                                         retry_on=(workout_repair.UnrepairableOutput,))
 
 
 
 # --- Runner ---
 # Key Concept: Runner orchestrates the agent execution loop.
-def create_session_runner(user_id: str) -> Runner:
-    """Creates a session runner for the agent."""
-    print(f"Creating runner.")
-    session = session_service.create_session(
-        app_name=APP_NAME,
-        user_id=user_id,
-        session_id=SESSION_ID
-    )
-    print(f"Session created: App='{APP_NAME}', User='{user_id}', Session='{SESSION_ID}'")
-    return Runner(
-        agent=workout_generator.create_workout_agent(), # The agent we want to run
-        app_name=APP_NAME,   # Associates runs with our app
-        session_service=session_service # Uses our session manager
-    )
+# The workout agent is the same for every user, so the process shares one runner.
+_runner = None
+
+def get_runner() -> Runner:
+    """Returns the process-wide workout runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        _runner = Runner(
+            agent=workout_generator.create_workout_agent(), # The agent we want to run
+            app_name=APP_NAME,   # Associates runs with our app
+            session_service=session_service # Uses our session manager
+        )
+    return _runner
 
 
 # @title Define Agent Interaction Function
-# TODO: Should take in session_id as a parameter to ensure that only the session associated with the user is used.
-async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
+async def call_agent_async(query: str, runner: Runner, user_id: str, session_id: str) -> str:
     """Sends a query to the agent and prints the final response."""
 
     # Prepare the user's message in ADK format
@@ -60,57 +65,11 @@ async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
 
     # Key Concept: run_async executes the agent logic and yields Events.
     # We iterate through events to find the final answer.
-    async for event in runner.run_async(user_id=user_id, session_id=SESSION_ID, new_message=content):
+    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
         # You can uncomment the line below to see *all* events during execution
         # print(f"  [Event] Author: {event.author}, Type: {type(event).__name__}, Final: {event.is_final_response()}, Content: {event.content}")
         # Key Concept: is_final_response() marks the concluding message for the turn.
         # print(event)    
-        if event.content and event.content.parts[0].function_response:
-            # Handle function response
-            function_response = event.content.parts[0].function_response
-            workout_json = function_response.response
-            if function_response.name == "create_profile_json":
-                # Make a POST request to update the fitness profile in a non-blocking way
-                import threading
-                def send_workout_update():
-                    url = os.getenv("VITE_APP_BACKEND_URL") + "/users/update-fitness-profile"
-                    headers = {"Content-Type": "application/json"}
-                    
-                    print(f"Function response received: {workout_json}")
-                    print(f"Type of workout_json: {type(workout_json)}")
-                    
-                    try:
-                        data = {
-                            "auth0_id": user_id,
-                            "workout_json": workout_json
-                        }
-                        print(f"Sending request to {url} with data: {json.dumps(data)}")
-                        
-                        # Set a timeout to prevent hanging
-                        post_response = requests.post(url, headers=headers, json=data, timeout=5)
-                        
-                        print(f"Response status code: {post_response.status_code}")
-                        print(f"Response content: {post_response.text}")
-                        
-                        if post_response.status_code == 200:
-                            print("Profile updated successfully")
-                        else:
-                            print(f"Failed to update profile. Status code: {post_response.status_code}, Response: {post_response.text}")
-                    except requests.exceptions.Timeout:
-                        print("Request timed out - server might be slow or unavailable")
-                    except requests.exceptions.ConnectionError:
-                        print("Connection error - cannot connect to the server")
-                    except Exception as e:
-                        print(f"Exception during profile update request: {e}")
-                        import traceback
-                        traceback.print_exc()
-                
-                # Run the request in a separate thread to avoid blocking
-                thread = threading.Thread(target=send_workout_update)
-                thread.daemon = True  # Allow Python to exit even if thread is running
-                thread.start()
-                print("Profile update request started in background thread")
-        
         if event.is_final_response():
             if event.content and event.content.parts:
                 # Assuming text response in the first part
@@ -123,6 +82,42 @@ async def call_agent_async(query: str, runner: Runner, user_id: str) -> str:
     #print(f"<<< Agent Response: {final_response_text}")
     return final_response_text
 
+async def generate_exercises(profile: dict, draft: workout_generator.Exercises = None, user_id: str = USER_ID) -> workout_generator.Exercises:
+    """Runs the workout agent on a fitness profile and returns its structured output.
+
+    With a `draft` (e.g. from the local workout engine) the agent personalizes it
+    instead of starting from scratch. Every attempt gets a throwaway session,
+    so concurrent requests and hedged attempts never share history. The output
+    is repaired locally where possible (see workout_repair). Raises
+    resilience.CircuitOpen while the model backend is failing.
+    """
+    query = {"profile": profile}
+    if draft is not None:
+        # In the shape the agent is asked to answer in
+        query["draft_workout"] = (workout_repair.as_records(draft) if workout_generator.OUTPUT_SCHEMA == "records"
+                                  else draft.model_dump())
+
+    async def attempt():
+        session_id = f"workout-{uuid.uuid4().hex}"
+        session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        try:
+            response = await call_agent_async(json.dumps(query), get_runner(), user_id, session_id)
+        finally:
+            session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        return workout_repair.repair(response, profile)
+
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        exercises = await workout_resilience.call(attempt)
+        outcome = "ok"
+        return exercises
+    except resilience.CircuitOpen:
+        outcome = "degraded"
+        raise
+    finally:
+        metrics.agent_turn_seconds.observe(time.perf_counter() - start, "workout", outcome)
+
 # async def main():
 #     result = await call_agent_async(" height: 5'11, weight: 100 pounds, fitness level: beginner, workout time: 1 hour, goal: weight loss.")
 #     import json
@@ -0,0 +1,56 @@
+import gc
+import threading
+import importlib
+
+# --- Lazy modules ---
+# Key Concept: the agent modules import google.adk and google.genai, which take most of
+# the backend's import time. A LazyModule stands in for such a module and only imports
+# it when one of its attributes is first used, or when warm_up() is called (the server
+# does that in a background thread at startup). The server therefore takes requests,
+# health checks included, before the SDKs have finished loading.
+#
+# The SDKs leave a few hundred thousand objects that live as long as the process.
+# Left to the garbage collector, every full collection walks all of them and holds
+# the GIL, and so the event loop, for hundreds of milliseconds. Once a module is
+# imported, gc.freeze() moves everything allocated so far out of the collector's
+# reach, so later collections only scan what requests allocate.
+
+
+class LazyModule:
+    """Proxy for the module `name`, imported on first attribute access.
+
+    `on_load(module)` runs once, right after the import, whichever caller triggered it.
+    """
+
+    def __init__(self, name: str, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                module = importlib.import_module(self._name)
+                if self._on_load is not None:
+                    self._on_load(module)
+                gc.freeze()
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __repr__(self):
+        return f"<LazyModule {self._name} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def warm_up(*modules: LazyModule):
+    """Imports every module now, e.g. from a startup thread."""
+    for module in modules:
+        module._load()
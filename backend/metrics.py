@@ -0,0 +1,231 @@
+import time
+import bisect
+import math
+
+# --- Metrics ---
+# Key Concept: recording a metric happens on every request, so it has to be cheap.
+# Series are plain lists and floats updated in place, with no locks: every
+# observation is made on the event loop thread (Mongo calls are timed around the
+# executor hop, not inside it), so updates never race. A scrape of /metrics renders
+# everything in the Prometheus text format.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 16384, 65536, 262144, 1048576, 4194304, 16777216, 33554432)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram per label combination; `observe` is a dict lookup and a bisect."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *label_values) -> int:
+        """Observations recorded for one label combination."""
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic count per label combination; `inc` is a dict update."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        # label values -> count
+        self._series = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: int = 1):
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def values(self) -> dict:
+        return dict(self._series)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in list(self._series.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from `read()`, so keeping it current costs nothing.
+
+    With `labels`, `read()` returns a dict from label values to the value of each series.
+    """
+
+    def __init__(self, name: str, documentation: str, read=None, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labels = labels
+        _registry.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.read is None:
+            return lines
+        if not self.labels:
+            lines.append(f"{self.name} {_format_value(self.read())}")
+            return lines
+        for label_values, value in self.read().items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class StatsGauges:
+    """Exports a component's `stats()` dict at scrape time, one gauge `<prefix>_<key>` per number.
+
+    With `labels`, `read()` returns a dict from label values to a stats dict, e.g. one per agent.
+    Non-numeric entries are skipped; booleans are exported as 0 or 1.
+    """
+
+    def __init__(self, prefix: str, documentation: str, read, labels: tuple = ()):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.read = read
+        self.labels = labels
+        _registry.append(self)
+
+    def render(self) -> list:
+        stats = self.read() if self.labels else {(): self.read()}
+        series = {}
+        for label_values, values in stats.items():
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    series.setdefault(key, []).append((label_values, float(value) if isinstance(value, bool) else value))
+        lines = []
+        for key, values in series.items():
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {self.documentation} ({key.replace('_', ' ')})", f"# TYPE {name} gauge"]
+            lines += [f"{name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+                      for label_values, value in values]
+        return lines
+
+
+def _share(counter: Counter, label: str) -> float:
+    values = counter.values()
+    total = sum(values.values())
+    return values.get((label,), 0) / total if total else 0.0
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+agent_turn_seconds = Histogram(
+    "agent_turn_duration_seconds", "Wall time of an agent turn, retries included.", ("agent", "outcome"))
+agent_llm_seconds = Histogram(
+    "agent_turn_llm_seconds", "Time an agent turn spent waiting on the model.", ("agent",))
+agent_tool_seconds = Histogram(
+    "agent_turn_tool_seconds", "Time an agent turn spent running tools.", ("agent",))
+agent_turn_tokens = Histogram(
+    "agent_turn_tokens", "Estimated tokens per agent turn (about 4 characters each).", ("agent", "kind"),
+    buckets=TOKEN_BUCKETS)
+mongo_query_seconds = Histogram(
+    "mongo_query_duration_seconds", "MongoDB call latency, executor wait included.", ("collection", "operation"))
+transcription_seconds = Histogram(
+    "transcription_duration_seconds", "Latency of Whisper transcriptions.", ("outcome",))
+transcription_bytes = Histogram(
+    "transcription_audio_bytes", "Size of uploaded audio.", buckets=SIZE_BUCKETS)
+workout_outputs = Counter(
+    "workout_agent_outputs_total", "Workout agent outputs by outcome: valid, repaired or unrepairable.", ("outcome",))
+workout_output_repairs = Counter(
+    "workout_agent_output_repairs_total", "Workout agent outputs needing each kind of local repair.", ("repair",))
+active_sessions = Gauge("onboarding_active_sessions", "Onboarding sessions held in the session registry.")
+user_cache_lookups = Counter("user_cache_lookups_total", "User cache lookups by result: hit or miss.", ("result",))
+user_cache_invalidations = Counter("user_cache_invalidations_total", "User cache entries dropped because the user changed.")
+user_cache_hit_ratio = Gauge("user_cache_hit_ratio", "Share of user cache lookups served from the cache.",
+                             read=lambda: _share(user_cache_lookups, "hit"))
+user_cache_entries = Gauge("user_cache_entries", "Users held in the user cache.")
+admission_requests = Counter(
+    "admission_requests_total", "Requests at admission control by outcome: admitted, rate_limited or overloaded.",
+    ("endpoint", "outcome"))
+admission_wait_seconds = Histogram(
+    "admission_wait_seconds", "Time admitted or timed-out requests waited in the queue for a slot.", ("endpoint",))
+admission_queue_depth = Gauge("admission_queue_depth", "Requests waiting for an admission slot.", labels=("endpoint",))
+admission_active = Gauge("admission_active_requests", "Admitted requests in progress.", labels=("endpoint",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template (e.g. /users/{auth0_id}).
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses pass through
+    untouched and the per-request cost is one histogram observation.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope; unmatched paths share one series
+            route = scope.get("route")
+            http_request_seconds.observe(time.perf_counter() - start, scope["method"],
+                                         route.path if route is not None else "unmatched", status[0])
@@ -0,0 +1,146 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class OnboardingPrewarm:
+    """Opening greetings prepared before the user asks for them.
+
+    Opening an onboarding conversation sends a fixed prompt to the agent, so the
+    greeting depends only on what is already known about the user, their profile
+    shape. Greetings are kept per shape for `greeting_ttl` seconds and shared
+    across users; concurrent misses for one shape share one generation.
+
+    `schedule` prepares a user's session in the background when onboarding is
+    likely to follow (sign-up, or a dashboard visit without a profile). The user
+    is then marked ready for `ttl` seconds, and start_onboarding takes the
+    greeting instead of waiting on the model.
+    """
+
+    def __init__(self, ttl: float, greeting_ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.greeting_ttl = greeting_ttl
+        self.max_entries = max_entries
+        # shape -> (greeting, stored_at)
+        self._greetings = OrderedDict()
+        self._inflight = {}
+        # user_id -> (greeting, prepared_at)
+        self._ready = OrderedDict()
+        # user_id -> asyncio.Task preparing their session
+        self._tasks = {}
+        self.scheduled = 0
+        self.prepared = 0
+        self.generated = 0
+        self.greeting_hits = 0
+        self.ready_hits = 0
+        self.expired = 0
+        self.failed = 0
+
+    @staticmethod
+    def _fresh(entries: OrderedDict, key, ttl: float):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > ttl:
+            del entries[key]
+            return None
+        return entry[0]
+
+    def _store(self, entries: OrderedDict, key, value):
+        entries[key] = (value, time.monotonic())
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def greeting(self, shape: str):
+        """The cached greeting for a profile shape, or None."""
+        greeting = self._fresh(self._greetings, shape, self.greeting_ttl)
+        if greeting is not None:
+            self.greeting_hits += 1
+        return greeting
+
+    async def get_or_generate_greeting(self, shape: str, generate):
+        """Returns the greeting for `shape`, calling `generate()` (async) on a miss.
+
+        `generate` may return None (e.g. the model is degraded), which is not cached.
+        """
+        greeting = self.greeting(shape)
+        if greeting is not None:
+            return greeting
+        inflight = self._inflight.get(shape)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[shape] = future
+        try:
+            greeting = await generate()
+            self.generated += 1
+            if greeting is not None:
+                self._store(self._greetings, shape, greeting)
+            future.set_result(greeting)
+            return greeting
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[shape]
+
+    def mark_ready(self, user_id: str, greeting: str):
+        self.prepared += 1
+        self._store(self._ready, user_id, greeting)
+
+    def take_ready(self, user_id: str):
+        """Pops the greeting of the user's prepared session, or None if there is none or it expired."""
+        if user_id not in self._ready:
+            return None
+        greeting = self._fresh(self._ready, user_id, self.ttl)
+        if greeting is None:
+            self.expired += 1
+            return None
+        del self._ready[user_id]
+        self.ready_hits += 1
+        return greeting
+
+    def discard(self, user_id: str):
+        self._ready.pop(user_id, None)
+
+    def schedule(self, user_id: str, prepare):
+        """Runs `prepare()` (async) in the background unless the user is already prepared or preparing."""
+        if user_id in self._tasks or self._fresh(self._ready, user_id, self.ttl) is not None:
+            return
+        self.scheduled += 1
+        task = asyncio.create_task(prepare())
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda task: self._finished(user_id, task))
+
+    def _finished(self, user_id: str, task: asyncio.Task):
+        del self._tasks[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+            print(f"Error pre-warming onboarding for {user_id}: {task.exception()!r}")
+
+    async def stop(self):
+        """Cancels preparations still running; called at shutdown."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "greetings": len(self._greetings),
+            "ready_sessions": len(self._ready),
+            "preparing": len(self._tasks),
+            "scheduled": self.scheduled,
+            "prepared": self.prepared,
+            "greetings_generated": self.generated,
+            "greeting_hits": self.greeting_hits,
+            "ready_hits": self.ready_hits,
+            "expired": self.expired,
+            "failed": self.failed,
+        }
@@ -0,0 +1,118 @@
+import asyncio
+import traceback
+
+import db
+
+# Fields of the create_profile_json tool result stored under the user's `details`
+PROFILE_FIELDS = ("height", "weight", "age", "fitness_level", "workout_time", "goal", "preferences", "tailoring")
+
+
+def profile_details(profile_json: dict) -> dict:
+    """Maps a profile produced by the onboarding agent to the user's `details` fields."""
+    return {field: profile_json.get(field) for field in PROFILE_FIELDS}
+
+
+class ProfileWriter:
+    """In-process, batched writer for fitness profiles created by the onboarding agent.
+
+    `submit` never blocks the agent turn: profiles are queued and a background task
+    writes them to Mongo in batches of up to `batch_size`, gathered for at most
+    `batch_interval` seconds. Failed batches are retried with exponential backoff;
+    profiles that still cannot be written are logged and counted, never dropped
+    silently. `on_written(auth0_id)` runs after each successful write.
+    """
+
+    def __init__(self, batch_size: int = 100, batch_interval: float = 0.05,
+                 max_retries: int = 3, retry_backoff: float = 0.5, on_written=None):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.on_written = on_written
+        self._queue = asyncio.Queue()
+        self._task = None
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, auth0_id: str, profile_json: dict):
+        """Queues a profile write for a user."""
+        self._queue.put_nowait((auth0_id, profile_details(profile_json)))
+
+    def start(self):
+        """Starts the background writer on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Waits until every queued profile has been written or given up on."""
+        await self._queue.join()
+
+    async def stop(self):
+        """Flushes pending profiles and stops the background writer."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list):
+        # A later profile for the same user supersedes an earlier one in the batch
+        updates = dict(batch)
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await db.bulk_update_user_details(updates)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += len(updates)
+                    print(f"Error writing {len(updates)} fitness profiles after {attempt + 1} attempts: {e}")
+                    traceback.print_exc()
+                    return
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+        if result.matched_count < len(updates):
+            missing = len(updates) - result.matched_count
+            self.failed += missing
+            print(f"{missing} fitness profiles in a batch of {len(updates)} did not match any user")
+        self.written += result.matched_count
+
+        if self.on_written:
+            for auth0_id in updates:
+                self.on_written(auth0_id)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
@@ -0,0 +1,228 @@
+import os
+import sys
+import hmac
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+
+# --- Per-request profiling ---
+# Key Concept: a single slow request can be profiled in production. A request is
+# profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or at random with probability
+# PROFILE_SAMPLE_RATE. With neither configured the middleware is never installed, so
+# unprofiled traffic pays nothing.
+#
+# cProfile follows a thread, not a request, so on the event loop it would mix in
+# every other request in flight. Instead a sampler thread looks at the request's own
+# task every PROFILE_INTERVAL_MS:
+# - while the task is running on the loop, it records the live Python stack;
+# - while the task is suspended, it records the chain of awaits it is parked in,
+#   ending in the kind of thing it waits on.
+# The result is a wall-clock profile of that request alone: Mongo, the model, tools
+# and validation each show up under the code that awaited them. Each profile is
+# written to PROFILE_DIR in the collapsed-stack format read by flamegraph.pl and
+# speedscope, with a JSON summary next to it.
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "100"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+def authorized(token) -> bool:
+    """Whether `token` matches PROFILE_TOKEN; always False when no token is configured."""
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def _label(code) -> str:
+    # ';' separates frames in the collapsed format (the count follows the last space)
+    name = f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+def _running_stack(leaf, anchor) -> list:
+    """Frames from `anchor` down to `leaf`, or None if `anchor` is not on the stack."""
+    stack = []
+    frame = leaf
+    while frame is not None:
+        stack.append(frame.f_code)
+        if frame is anchor:
+            stack.reverse()
+            return stack
+        frame = frame.f_back
+    return None
+
+
+def _suspended_stack(task, anchor) -> list:
+    """The await chain of a suspended task from `anchor` down, ending in what it waits on."""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) \
+            or getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            if isinstance(awaitable, asyncio.Task):
+                # Awaiting a child task (e.g. wait_for, ensure_future): follow into its coroutine
+                awaitable = awaitable.get_coro()
+                continue
+            if stack and isinstance(awaitable, asyncio.Future) and awaitable.done():
+                stack.append("[runnable, waiting for the loop]")
+            elif stack:
+                stack.append(f"[await {type(awaitable).__name__}]")
+            break
+        if frame is anchor or stack:
+            stack.append(frame.f_code)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) \
+            or getattr(awaitable, "ag_await", None)
+    return stack
+
+
+class RequestProfile:
+    """Samples one request's task from a background thread until `stop()`."""
+
+    def __init__(self, profile_id: str, task, anchor, loop_thread: int, meta: dict):
+        self.profile_id = profile_id
+        self.task = task
+        self.anchor = anchor
+        self.loop_thread = loop_thread
+        self.meta = meta
+        self.samples = Counter()
+        self.running = 0
+        self.suspended = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f"profile-{profile_id}", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self, status: int):
+        # Never joined: the sampler writes the artifact from its own thread, off the event loop
+        self.meta["status"] = status
+        self.meta["duration_ms"] = round((time.perf_counter() - self.started) * 1000, 1)
+        self._stop.set()
+
+    def _sample_once(self):
+        leaf = sys._current_frames().get(self.loop_thread)
+        stack = _running_stack(leaf, self.anchor) if leaf is not None else None
+        if stack is not None:
+            self.running += 1
+        else:
+            stack = _suspended_stack(self.task, self.anchor)
+            if not stack:
+                return
+            self.suspended += 1
+        self.samples[";".join(part if isinstance(part, str) else _label(part) for part in stack)] += 1
+
+    def _sample(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            try:
+                self._sample_once()
+            except Exception:
+                # The loop thread moves on while we read its frames; drop the sample
+                pass
+        try:
+            self._write()
+        except OSError as e:
+            print(f"Error writing profile {self.profile_id}: {e}")
+
+    def _write(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.profile_id)
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        summary = {**self.meta, "interval_ms": PROFILE_INTERVAL_MS,
+                   "samples_running": self.running, "samples_suspended": self.suspended}
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f)
+        _prune()
+
+
+def _prune():
+    """Keeps the newest PROFILE_MAX_ARTIFACTS profiles."""
+    profiles = sorted(name[:-len(".json")] for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for profile_id in profiles[:-PROFILE_MAX_ARTIFACTS]:
+        for suffix in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list:
+    """Summaries of the stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                summaries.append(json.load(f))
+    return summaries
+
+
+def profile_path(profile_id: str):
+    """Path of a stored collapsed-stack file, or None. IDs are generated here, so anything else is refused."""
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ".collapsed")
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asking for it, plus a random sample.
+
+    Profiled requests get their profile ID back in `X-Profile-Id`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+
+    def _wanted(self, scope) -> bool:
+        if self.active >= PROFILE_MAX_CONCURRENT:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return authorized(value.decode("latin-1"))
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        profile_id = f"{stamp}-{os.urandom(4).hex()}"
+        profile = RequestProfile(
+            profile_id, asyncio.current_task(), sys._getframe(), threading.get_ident(),
+            {"id": profile_id, "method": scope["method"], "path": scope["path"], "started_at": stamp},
+        )
+        status = [500]
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        self.active += 1
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            route = scope.get("route")
+            profile.meta["route"] = route.path if route is not None else None
+            profile.stop(status[0])
+            self.active -= 1
@@ -0,0 +1,194 @@
+"""Regenerates the weekly workout plan of every onboarded user.
+
+Users are read from Mongo in pages of --batch-size, ordered by _id. Each page fans
+out to the workout agent with at most --concurrency generations in flight, and the
+results go back in one bulk write per page. Users with the same profile shape
+share one generation; the --max-shapes most recently used are kept. After each page the last _id is
+saved to --checkpoint, so an interrupted run picks up where it stopped:
+
+    python regenerate_workouts.py --week 2025-W20
+    python regenerate_workouts.py --week 2025-W20          # resumes from the checkpoint
+    python regenerate_workouts.py --week 2025-W20 --restart
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from datetime import datetime, date
+
+import shortuuid
+from dotenv import load_dotenv
+from bson import ObjectId
+from pymongo import UpdateOne
+
+load_dotenv()  # Before the modules below read their settings
+
+import db
+from workout_builder import build_workout
+from workout_cache import profile_cache_key
+from fitness_agents.multi_tool_agent import workout_engine, workout_session
+
+DEFAULT_CHECKPOINT = "regenerate_checkpoint.json"
+DEFAULT_MAX_SHAPES = 10000
+
+
+def current_week() -> str:
+    year, week, _ = date.today().isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def load_checkpoint(path: str, week: str) -> dict:
+    """Returns the saved progress for `week`, or a fresh one."""
+    fresh = {"week": week, "last_id": None, "users": 0, "written": 0, "fallbacks": 0, "skipped": 0}
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("week") != week:
+        return fresh
+    return saved
+
+
+def save_checkpoint(path: str, progress: dict):
+    # Write then rename, so a crash mid-write never leaves a truncated checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(progress, f)
+    os.replace(path + ".tmp", path)
+
+
+class Regenerator:
+    """Generates one workout per profile shape per run and builds the bulk writes."""
+
+    def __init__(self, week: str, concurrency: int, personalize: bool = True, max_shapes: int = DEFAULT_MAX_SHAPES):
+        self.week = week
+        self.personalize = personalize
+        self.slots = asyncio.Semaphore(concurrency)
+        # cache_key -> Task; users whose plans have the same shape share one generation.
+        # Least recently used first, evicted past max_shapes so a long run's memory stays flat.
+        self.generations = OrderedDict()
+        self.max_shapes = max_shapes
+        self.model_calls = 0
+        self.fallbacks = 0
+
+    async def _generate(self, details: dict) -> dict:
+        exercises = workout_engine.generate(details)
+        if self.personalize:
+            async with self.slots:
+                self.model_calls += 1
+                try:
+                    exercises = await workout_session.generate_exercises(details, draft=exercises)
+                except Exception as e:
+                    # Keep the local plan rather than leave the user without one this week
+                    self.fallbacks += 1
+                    print(f"Workout personalization failed, using the local plan: {e!r}")
+        return build_workout(exercises, details)
+
+    def workout_for(self, details: dict):
+        key = profile_cache_key(details)
+        task = self.generations.get(key)
+        if task is None:
+            task = self.generations[key] = asyncio.ensure_future(self._generate(details))
+            if len(self.generations) > self.max_shapes:
+                # An evicted task still in flight finishes for the page that awaits it
+                self.generations.popitem(last=False)
+        else:
+            self.generations.move_to_end(key)
+        return key, task
+
+    def operation(self, user: dict, cache_key: str, workout: dict) -> UpdateOne:
+        # Upserting on (week, user) makes a resumed or repeated run overwrite, not duplicate
+        auth0_id = user["auth0_id"]
+        now = datetime.utcnow()
+        return UpdateOne(
+            {"plan_user": auth0_id, "plan_week": self.week},
+            {
+                "$set": {
+                    "workout": {**workout, "created_by": auth0_id},
+                    "status": "ready",
+                    "cache_key": cache_key,
+                    "completed_at": now,
+                },
+                "$setOnInsert": {"workout_id": shortuuid.uuid()[:16], "created_at": now},
+            },
+            upsert=True,
+        )
+
+
+async def regenerate(week: str, batch_size: int, concurrency: int, checkpoint: str,
+                     personalize: bool = True, max_batches: int = None,
+                     max_shapes: int = DEFAULT_MAX_SHAPES) -> dict:
+    """Runs (or resumes) a regeneration and returns its progress and throughput."""
+    progress = load_checkpoint(checkpoint, week)
+    if progress["users"]:
+        print(f"Resuming {week} after {progress['users']} users")
+    await db.ensure_indexes()  # The (plan_user, plan_week) upserts need their index
+    regenerator = Regenerator(week, concurrency, personalize, max_shapes)
+    last_id = ObjectId(progress["last_id"]) if progress["last_id"] else None
+    start = time.monotonic()
+    users_this_run = 0
+    batches = 0
+
+    # Fetch the next page while the current one generates
+    next_page = asyncio.ensure_future(db.users_after(last_id, batch_size, {"auth0_id": 1, "details": 1}))
+    while max_batches is None or batches < max_batches:
+        users = await next_page
+        if not users:
+            break
+        next_page = asyncio.ensure_future(db.users_after(users[-1]["_id"], batch_size, {"auth0_id": 1, "details": 1}))
+
+        onboarded = [user for user in users if user.get("details")]
+        jobs = [regenerator.workout_for(user["details"]) for user in onboarded]
+        workouts = await asyncio.gather(*(task for _, task in jobs))
+        operations = [regenerator.operation(user, key, workout)
+                      for user, (key, _), workout in zip(onboarded, jobs, workouts)]
+        if operations:
+            result = await db.bulk_write_workouts(operations)
+            progress["written"] += result.upserted_count + result.modified_count
+
+        progress["last_id"] = str(users[-1]["_id"])
+        progress["users"] += len(users)
+        progress["skipped"] += len(users) - len(onboarded)
+        progress["fallbacks"] += regenerator.fallbacks
+        regenerator.fallbacks = 0
+        save_checkpoint(checkpoint, progress)
+
+        users_this_run += len(users)
+        batches += 1
+        elapsed = time.monotonic() - start
+        print(f"{progress['users']} users ({users_this_run / elapsed:,.0f}/s), "
+              f"{progress['written']} workouts written, {regenerator.model_calls} model calls")
+    next_page.cancel()
+
+    elapsed = time.monotonic() - start
+    return {
+        **progress,
+        "users_this_run": users_this_run,
+        "model_calls": regenerator.model_calls,
+        "seconds": elapsed,
+        "users_per_second": users_this_run / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--week", default=current_week(), help="plan week, e.g. 2025-W20 (default: this week)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32, help="workout agent calls in flight")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--max-shapes", type=int, default=DEFAULT_MAX_SHAPES,
+                        help="profile shapes whose generated workout is kept for reuse")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--local-only", action="store_true", help="skip the agent and use the local engine")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    report = asyncio.run(regenerate(args.week, args.batch_size, args.concurrency, args.checkpoint,
+                                    personalize=not args.local_only, max_shapes=args.max_shapes))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,173 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Header, Request
 from fastapi.security import OAuth2PasswordBearer
-from pymongo import MongoClient
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Dict, Any, Union
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+import time
+import asyncio
+import gc
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
-from fitness_agents.multi_tool_agent import session_runner
-from fitness_agents.multi_tool_agent import workout_session
+from fastapi.responses import PlainTextResponse, FileResponse
+from contextlib import asynccontextmanager
+from sse_starlette.sse import EventSourceResponse
+from starlette.background import BackgroundTask
 import json
 import traceback
 import uuid
 import shortuuid
-import requests
+
+# Load environment variables before the modules below read their settings
+load_dotenv()
+
+from fitness_agents.multi_tool_agent import workout_engine
+from fitness_agents.multi_tool_agent import profile_extractor
+import db
+import clients
+import metrics
+import profiling
+from session_registry import SessionRegistry
+from profile_writer import ProfileWriter, profile_details
+from workout_cache import WorkoutCache, profile_cache_key
+from user_turns import UserTurns
+from admission import limiter_from_env
+from workout_jobs import WorkoutJobs, JobQueueFull
+from onboarding_prewarm import OnboardingPrewarm
+from workout_builder import WorkoutData, build_workout
+from lazy_module import LazyModule, warm_up
+from upload_limit import UploadLimitMiddleware
+
+# The agent modules load google.adk on first use or in the startup warmup, not at import.
+# Agent-created profiles go to the profile writer as soon as the onboarding agent exists.
+session_runner = LazyModule("fitness_agents.multi_tool_agent.session_runner",
+                            on_load=lambda module: module.set_profile_handler(profile_writer.submit))
+workout_session = LazyModule("fitness_agents.multi_tool_agent.workout_session")
+
+# Load the SDKs and build the agents in a background thread at startup (the server is
+# serving meanwhile); with false, they load on the first request that needs them
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
 
 # important globals
-uid_to_session = {}
+# Live onboarding sessions, bounded by count and idle time so memory stays flat.
+uid_to_session = SessionRegistry(
+    max_sessions=int(os.getenv("SESSION_REGISTRY_MAX", "1000")),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800")),
+    sizer=lambda user_id, runner: session_runner.session_size(user_id),
+    on_remove=lambda user_id, runner: session_runner.release_session(user_id),
+)
 
-# Initialize OpenAI client
-load_dotenv()
-openai = OpenAI()
+metrics.active_sessions.read = lambda: len(uid_to_session)
 
-# Load environment variables
-load_dotenv()
-# MongoDB setup
-MONGO_CONN_STRING = os.getenv("DB_CONN_STRING")
-DB_NAME = os.getenv("DB_NAME")
-USERS_COLLECTION_NAME = os.getenv("USERS_COLLECTION_NAME", "users")
+# Onboarding greetings prepared ahead of start_onboarding: per profile shape, shared across
+# users, and per user for a session seeded in the background at sign-up or dashboard load
+ONBOARDING_PREWARM = os.getenv("ONBOARDING_PREWARM", "true").lower() == "true"
+onboarding_prewarm = OnboardingPrewarm(
+    ttl=float(os.getenv("ONBOARDING_PREWARM_TTL_SECONDS", "300")),
+    greeting_ttl=float(os.getenv("GREETING_CACHE_TTL_SECONDS", "600")),
+)
+
+# Per-user ordering and de-duplication of agent turns
+user_turns = UserTurns(idempotency_ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300")))
+
+# Generated workouts, shared by users whose profiles have the same shape
+workout_cache = WorkoutCache(
+    max_entries=int(os.getenv("WORKOUT_CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("WORKOUT_CACHE_TTL_SECONDS", "86400")),
+)
+
+# Workouts are generated by a bounded worker pool; requests only enqueue the job
+workout_jobs = WorkoutJobs(
+    workers=int(os.getenv("WORKOUT_WORKERS", "8")),
+    max_pending=int(os.getenv("WORKOUT_MAX_PENDING", "1000")),
+)
+# Longest a GET /workout/{id}?wait= long poll is held open
+WORKOUT_MAX_WAIT_SECONDS = 25
+
+FRONTEND_URL = os.getenv("VITE_APP_FRONTEND_URL", "http://localhost:5173")
+
+# Workouts come from the local engine; the LLM only personalizes them when enabled
+WORKOUT_LLM_PERSONALIZATION = os.getenv("WORKOUT_LLM_PERSONALIZATION", "false").lower() == "true"
+
+# Profiles created by the onboarding agent are written in-process, in batches. Once a
+# profile is saved the onboarding session is done: it leaves the registry and storage,
+# so the next onboarding starts over instead of resuming the finished conversation.
+def end_onboarding_session(auth0_id: str):
+    uid_to_session.pop(auth0_id)
+    session_runner.delete_session(auth0_id)
+
+profile_writer = ProfileWriter(on_written=end_onboarding_session)
+
+# Transcription limits: upload size (Whisper's own limit is 25 MB), enforced by
+# UploadLimitMiddleware while the body arrives, and how many transcriptions may be in
+# flight at once.
+TRANSCRIBE_MAX_BYTES = int(os.getenv("TRANSCRIBE_MAX_BYTES", str(25 * 1024 * 1024)))
+# Room for the multipart framing around the audio
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "8"))
+
+# Admission control for the endpoints that call a model. Each caps its concurrent work,
+# lets a bounded number of requests wait briefly for a slot and rate limits each caller;
+# past that, requests are turned away at once with 429/503 and a Retry-After header.
+admission = {
+    "onboarding": limiter_from_env("onboarding", max_concurrent=32, max_queue=64, queue_timeout=5,
+                                   user_rate=0.2, user_burst=3),
+    "conversation": limiter_from_env("conversation", max_concurrent=64, max_queue=128, queue_timeout=5,
+                                     user_rate=1, user_burst=5),
+    "generate": limiter_from_env("generate", max_concurrent=32, max_queue=64, queue_timeout=5,
+                                 user_rate=0.2, user_burst=3),
+    "transcribe": limiter_from_env("transcribe", max_concurrent=TRANSCRIBE_CONCURRENCY, max_queue=32,
+                                   queue_timeout=10, user_rate=1, user_burst=5),
+}
 
 # Configuration for restricted access
 AUTHORIZED_EMAILS = os.getenv("AUTHORIZED_EMAILS", "").split(",")
 
-client = MongoClient(MONGO_CONN_STRING)
-db = client[DB_NAME]
-users_collection = db[USERS_COLLECTION_NAME]
-workouts_collection = db["workouts"]  # New collection for workouts
+def warm_up_backends():
+    """Imports the agent and OpenAI SDKs and builds the agents, ahead of the first request."""
+    start = time.perf_counter()
+    try:
+        warm_up(session_runner, workout_session)
+        session_runner.get_runner()
+        workout_session.get_runner()
+        clients.get_openai()
+    except Exception as e:
+        print(f"Startup warmup failed, loading on first use instead: {e!r}")
+        return
+    gc.freeze()  # The agents and clients built above live as long as the process, like the SDKs
+    print(f"Startup warmup finished in {time.perf_counter() - start:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    clients.open_clients()  # Pooled HTTP client, shared by every request
+    warmup = asyncio.create_task(asyncio.to_thread(warm_up_backends)) if STARTUP_WARMUP else None
+    uid_to_session.start_reaper(float(os.getenv("SESSION_REAP_INTERVAL_SECONDS", "60")))
+    try:
+        await db.ensure_indexes()
+    except Exception as e:
+        # e.g. duplicate auth0_ids from before the unique index; serve anyway and report it
+        print(f"Error creating MongoDB indexes: {e}")
+    db.start_user_cache_invalidation()
+    profile_writer.start()
+    workout_jobs.start()
+    yield
+    await onboarding_prewarm.stop()
+    await workout_jobs.stop()  # Finish queued workouts so none stays pending
+    await profile_writer.stop()  # Flush profiles still queued before exiting
+    db.stop_user_cache_invalidation()
+    await uid_to_session.stop_reaper()
+    if session_runner.loaded:
+        await asyncio.to_thread(session_runner.close_session_service)  # Durable session writes still queued
+    if warmup is not None:
+        await warmup
+    await clients.close_clients()
 
 # Initialize FastAPI app
 app = FastAPI(
 	title="Workout Health App API",
 	description="Backend for an AI-powered workout health application",
-	version="1.0.0"
+	version="1.0.0",
+	lifespan=lifespan
 )
 
 app.add_middleware(
@@ -53,6 +178,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route, served at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Oversized audio is refused before FastAPI buffers it
+app.add_middleware(UploadLimitMiddleware, paths=("/transcribe/",),
+                   max_bytes=TRANSCRIBE_MAX_BYTES + MULTIPART_OVERHEAD_BYTES)
+
+# Opt-in per-request profiling (PROFILE_TOKEN / PROFILE_SAMPLE_RATE); not installed otherwise
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # OAuth2 for authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -88,23 +224,10 @@ class FitnessProfileUpdate(BaseModel):
     profile_json: Dict[str, Any]
 
 # Pydantic models for workouts
-class Exercise(BaseModel):
-    name: str
-    description: str
-    duration: Optional[str] = None
-    reps: Optional[int] = None
-
-class WorkoutData(BaseModel):
-    type: str
-    name: str
-    duration: Optional[str] = None
-    description: str
-    exercises: list[Exercise]
-    created_by: Optional[str] = None  # Auth0 ID of creator
-
 class WorkoutResponse(BaseModel):
     workout_id: str
-    workout: WorkoutData
+    status: str = "ready"  # pending, ready or failed
+    workout: Optional[WorkoutData] = None
     share_url: str
 
 class WorkoutGenerationRequest(BaseModel):
@@ -115,6 +238,21 @@ class WorkoutGenerationRequest(BaseModel):
 def generate_workout_id():
     return shortuuid.uuid()[:16]  # 16 characters is enough for uniqueness while being readable
 
+async def generate_workout_data(details: dict) -> dict:
+    """Builds a workout from the local engine, optionally personalized by the workout agent.
+
+    The local plan is always ready first, so a slow or failing model only costs the
+    personalization, never the workout. The deadline (WORKOUT_TURN_DEADLINE_SECONDS)
+    and retries are applied by workout_session.
+    """
+    exercises = workout_engine.generate(details)
+    if WORKOUT_LLM_PERSONALIZATION:
+        try:
+            exercises = await workout_session.generate_exercises(details, draft=exercises)
+        except Exception as e:
+            print(f"Workout personalization unavailable, using the local plan: {e!r}")
+    return build_workout(exercises, details)
+
 # Endpoint to create a new user
 @app.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def save_user(user: User):
@@ -123,8 +261,7 @@ async def save_user(user: User):
     #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
     
     # Check if user already exists
-    existing_user = users_collection.find_one({"auth0_id": user.auth0_id})
-    if existing_user:
+    if await db.user_exists(user.auth0_id):
         raise HTTPException(status_code=400, detail="User already exists")
 
     # Prepare user data for MongoDB
@@ -137,17 +274,45 @@ async def save_user(user: User):
     }
 
     # Insert into MongoDB
-    result = users_collection.insert_one(user_data)
+    result = await db.create_user(user_data)
 
     # Map MongoDB's _id to id for the response
     user_data["id"] = str(result.inserted_id)  # Convert ObjectId to string
 
+    # A new user goes to onboarding next; have their greeting ready by then
+    schedule_onboarding_prewarm(user.auth0_id, user_data["details"])
+
     return user_data
 
+# Registered before /users/{auth0_id}, which would otherwise match "profile" as an ID
+@app.get("/users/profile")
+async def get_user_profile(auth0_id: str):
+    try:
+        # Look up user in your database
+        user_data = await db.get_user(auth0_id)
+        
+        if not user_data:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        # Check if user has authorized email
+        # if not verify_authorized_email(user_data.get("email", "")):
+        #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
+        
+        # Convert ObjectId to string for JSON serialization
+        if "_id" in user_data:
+            user_data["_id"] = str(user_data["_id"])
+        
+        return user_data
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"Error fetching user profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 # Endpoint to get user data by Auth0 ID
 @app.get("/users/{auth0_id}", response_model=UserResponse)
 async def get_user(auth0_id: str):
-    user = users_collection.find_one({"auth0_id": auth0_id})
+    user = await db.get_user(auth0_id)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -156,32 +321,54 @@ async def get_user(auth0_id: str):
     # if not verify_authorized_email(user.get("email", "")):
     #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
     
+    if not user.get("details"):
+        # The dashboard sends users without a profile to onboarding
+        schedule_onboarding_prewarm(auth0_id, {})
+
     user["id"] = str(user["_id"])  # Convert ObjectId to string
     del user["_id"]  # Remove MongoDB-specific field
     return user
 
 # Transcription endpoint
 @app.post("/transcribe/")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(request: Request, file: UploadFile = File(...), auth0_id: Optional[str] = Form(None)):
     # No user-specific check here since this endpoint might be used before user creation
     # If needed, you can add authorization via headers or query params
     try:
-        # Save the uploaded file temporarily
-        temp_file_path = f"/tmp/{file.filename}"
-        with open(temp_file_path, "wb") as f:
-            f.write(await file.read())
-        
-        # Use the new OpenAI client API for transcription
-        with open(temp_file_path, "rb") as audio_file:
-            response = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
-        # Clean up the temporary file
-        os.remove(temp_file_path)
-        # Return the transcription text
-        return {"transcription": response.text}
+        # UploadLimitMiddleware has already capped the upload's size
+        if file.size is not None and file.size > TRANSCRIBE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Audio file too large")
+        metrics.transcription_bytes.observe(file.size or 0)
+
+        # Rate limited per user, like the other model endpoints. Callers that send no
+        # auth0_id, or one that is not a user, share their address's budget, so made-up
+        # IDs cannot buy fresh buckets and users behind one NAT do not share a budget.
+        if auth0_id and await db.user_exists(auth0_id):
+            caller = auth0_id
+        else:
+            caller = request.client.host if request.client else None
+
+        # The filename extension tells Whisper which audio format it is getting.
+        async with admission["transcribe"].admit(caller):
+            # Starlette spools uploads past 1 MB to disk; Whisper gets the bytes from memory
+            # instead of a blocking file. Read once admitted, so only the transcriptions in
+            # flight hold their audio (at most TRANSCRIBE_CONCURRENCY x TRANSCRIBE_MAX_BYTES).
+            audio = await file.read()
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                response = await clients.get_openai().audio.transcriptions.create(
+                    model="whisper-1",
+                    file=(file.filename or "recording.wav", audio)
+                )
+                outcome = "ok"
+            finally:
+                metrics.transcription_seconds.observe(time.perf_counter() - start, outcome)
+        # Return the transcription text, plus any profile answers it states outright
+        return {"transcription": response.text, "profile_fields": profile_extractor.extract(response.text)}
         # return {"transcription": "My age is 25. My height is 5'9\". My weight is 150 lbs. I am a beginner. I prefer to work out for 30 minutes. My goal is to lose weight. I have no dietary restrictions OR EQUIPMENT!"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         return {"error": str(e)}
             
@@ -189,15 +376,107 @@ async def transcribe_audio(file: UploadFile = File(...)):
 @app.get("/")
 async def root():
     """Root endpoint to verify server is running"""
-    return {"status": "Server is running", "endpoints": ["/onboarding/start_onboarding", "/transcribe/"]}
+    return {"status": "Server is running", "endpoints": ["/onboarding/start_onboarding", "/onboarding/start_onboarding/stream", "/workouts/add_to_workout_conversation/stream", "/transcribe/"]}
+
+OPENING_PROMPT = "Start the conversation."
+
+async def get_conversation_runner(user_id: str, message: str):
+    """Returns the runner for a user's onboarding conversation and the query to send it.
+
+    A user with no live or stored session starts a new conversation, in which
+    case the query is the opening prompt rather than their message.
+    """
+    onboarding_prewarm.discard(user_id)  # Talking already: start_onboarding must start over
+    runner = uid_to_session.get(user_id)
+    if runner is None:
+        # Evicted from this worker, or started on another one: pick up the stored conversation
+        runner = await session_runner.resume_session_runner(user_id)
+        if runner is not None:
+            uid_to_session.put(user_id, runner)
+    if runner is None:
+        # Never started: begin a new conversation
+        runner = session_runner.create_session_runner(user_id)
+        uid_to_session.put(user_id, runner)
+        return runner, OPENING_PROMPT
+    return runner, message
+
+def start_onboarding_session(user_id: str):
+    """Starts a fresh onboarding conversation and returns its runner and opening prompt."""
+    runner = session_runner.create_session_runner(user_id)
+    uid_to_session.put(user_id, runner)
+    return runner, OPENING_PROMPT
+
+def open_prewarmed_session(user_id: str, details: dict):
+    """Returns the greeting of a fresh onboarding session opened without a model call, or None.
+
+    Uses the session prepared in the background if it is still live, otherwise
+    seeds one now from the greeting cached for the user's profile shape.
+    """
+    greeting = onboarding_prewarm.take_ready(user_id)
+    if greeting is not None and uid_to_session.get(user_id) is not None:
+        return greeting
+    greeting = onboarding_prewarm.greeting(profile_cache_key(details))
+    if greeting is None:
+        return None
+    uid_to_session.put(user_id, session_runner.seed_session_runner(user_id, OPENING_PROMPT, greeting))
+    return greeting
+
+def schedule_onboarding_prewarm(user_id: str, details: dict):
+    """Prepares the user's onboarding session and greeting in the background."""
+    if not ONBOARDING_PREWARM:
+        return
+
+    async def prepare():
+        greeting = await onboarding_prewarm.get_or_generate_greeting(
+            profile_cache_key(details), lambda: session_runner.generate_greeting(OPENING_PROMPT))
+        if greeting is None:
+            return
+        async with user_turns.user_lock(user_id):
+            # Never replace a conversation the user already has going
+            if uid_to_session.get(user_id) is not None:
+                return
+            runner = await session_runner.resume_session_runner(user_id)
+            if runner is not None:
+                uid_to_session.put(user_id, runner)
+                return
+            runner = session_runner.seed_session_runner(user_id, OPENING_PROMPT, greeting)
+            uid_to_session.put(user_id, runner)
+            onboarding_prewarm.mark_ready(user_id, greeting)
+
+    onboarding_prewarm.schedule(user_id, prepare)
+
+async def stream_turn(user_id: str, prepare, limiter) -> EventSourceResponse:
+    """Streams one agent turn to the browser as Server-Sent Events.
+
+    `await prepare()` returns the (runner, query) for the turn, or (None, reply) when the
+    reply is already known (a pre-warmed greeting). Like the turn itself it only
+    runs once the user's earlier turns have finished. The turn is admitted
+    by `limiter` before the stream opens, so a rejection is a plain 429/503, and
+    its slot is held until the stream ends.
+    """
+    await limiter.acquire(user_id)
+    async def events():
+        async with user_turns.user_lock(user_id):
+            try:
+                runner, query = await prepare()
+                if runner is None:
+                    yield {"event": "final", "data": json.dumps({"type": "final", "text": query, "prewarmed": True})}
+                    return
+                async for item in session_runner.stream_agent_async(query, runner, user_id):
+                    yield {"event": item["type"], "data": json.dumps(item, default=str)}
+            except Exception as e:
+                print(f"Error streaming agent turn: {str(e)}")
+                yield {"event": "error", "data": json.dumps({"type": "error", "message": str(e)})}
+            uid_to_session.measure(user_id)
+    # Background tasks run once the response is over, even if the client disconnected early
+    return EventSourceResponse(events(), background=BackgroundTask(limiter.release))
 
 @app.post("/onboarding/start_onboarding")
-async def start_workout(request: WorkoutRequest):
+async def start_workout(request: WorkoutRequest, idempotency_key: Optional[str] = Header(None)):
     try:
         # Check if user exists and is authorized
         user_id = request.auth0_id
-        user = users_collection.find_one({"auth0_id": user_id})
-        
+        user = await db.get_user(user_id, {"details": 1})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -205,9 +484,17 @@ async def start_workout(request: WorkoutRequest):
         # if not verify_authorized_email(user.get("email", "")):
         #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
         
-        runner = session_runner.create_session_runner(user_id)
-        uid_to_session[user_id] = runner
-        greeting = await session_runner.call_agent_async("Start the conversation.", runner, user_id)
+        async def turn():
+            greeting = open_prewarmed_session(user_id, user.get("details") or {})
+            if greeting is not None:
+                return greeting
+            runner, query = start_onboarding_session(user_id)
+            greeting = await session_runner.call_agent_async(query, runner, user_id)
+            uid_to_session.measure(user_id)
+            return greeting
+
+        async with admission["onboarding"].admit(user_id):
+            greeting = await user_turns.run(user_id, turn, idempotency_key)
         return {"message": greeting}
     except HTTPException as e:
         raise e
@@ -217,27 +504,26 @@ async def start_workout(request: WorkoutRequest):
         return {"message": f"An error occurred: {str(e)}. Please check server logs."}
 
 @app.post("/workouts/add_to_workout_conversation")
-async def add_to_workout_conversation(request: WorkoutConversationRequest):
+async def add_to_workout_conversation(request: WorkoutConversationRequest, idempotency_key: Optional[str] = Header(None)):
     try:
         # Check if user exists and is authorized
         user_id = request.auth0_id
-        user = users_collection.find_one({"auth0_id": user_id})
-        
-        if not user:
+        if not await db.user_exists(user_id):
             raise HTTPException(status_code=404, detail="User not found")
         
         # Check if user has authorized email
         # if not verify_authorized_email(user.get("email", "")):
         #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
         
-        if user_id not in uid_to_session:
-            runner = session_runner.create_session_runner(user_id)
-            uid_to_session[user_id] = runner
-            greeting = await session_runner.call_agent_async("Start the conversation.", runner, user_id)
-            return {"message": greeting}
-        else:
-            runner = uid_to_session[user_id]
-            response = await session_runner.call_agent_async(request.message, runner, user_id)
+        # Turns for one user run in order, so two quick messages never race on the same session
+        async def turn():
+            runner, query = await get_conversation_runner(user_id, request.message)
+            response = await session_runner.call_agent_async(query, runner, user_id)
+            uid_to_session.measure(user_id)
+            return response
+
+        async with admission["conversation"].admit(user_id):
+            response = await user_turns.run(user_id, turn, idempotency_key)
         return {"message": response}
     except HTTPException as e:
         raise e
@@ -246,21 +532,38 @@ async def add_to_workout_conversation(request: WorkoutConversationRequest):
         print(f"Error in add_to_workout_conversation: {str(e)}")
         return {"message": f"An error occurred: {str(e)}. Please check server logs."}
 
+@app.post("/onboarding/start_onboarding/stream")
+async def start_workout_stream(request: WorkoutRequest):
+    """Streaming variant of /onboarding/start_onboarding"""
+    user_id = request.auth0_id
+    user = await db.get_user(user_id, {"details": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    async def prepare():
+        greeting = open_prewarmed_session(user_id, user.get("details") or {})
+        if greeting is not None:
+            return None, greeting
+        return start_onboarding_session(user_id)
+
+    return await stream_turn(user_id, prepare, admission["onboarding"])
+
+@app.post("/workouts/add_to_workout_conversation/stream")
+async def add_to_workout_conversation_stream(request: WorkoutConversationRequest):
+    """Streaming variant of /workouts/add_to_workout_conversation"""
+    user_id = request.auth0_id
+    if not await db.user_exists(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return await stream_turn(user_id, lambda: get_conversation_runner(user_id, request.message),
+                             admission["conversation"])
+
 # Separate endpoint to update user fitness profile
 @app.post("/users/update-fitness-profile")
 async def update_fitness_profile(profile_update: FitnessProfileUpdate):
-    print("=" * 50)
-    print("CALLED update_fitness_profile ENDPOINT")
-    print(profile_update)
-    print(f"Received update for user: {profile_update.auth0_id}")
-    print(f"With profile data: {profile_update.profile_json}")
-    print("=" * 50)
-
     try:
         # Check if user exists
-        user = users_collection.find_one({"auth0_id": profile_update.auth0_id})
-        if not user:
-            print(f"User not found: {profile_update.auth0_id}")
+        if not await db.user_exists(profile_update.auth0_id):
             raise HTTPException(status_code=404, detail="User not found")
         
         # Check if user has authorized email
@@ -270,29 +573,14 @@ async def update_fitness_profile(profile_update: FitnessProfileUpdate):
         profile_data = profile_update.profile_json
         
         # Update user with fitness profile information
-        result = users_collection.update_one(
-            {"auth0_id": profile_update.auth0_id},
-            {"$set": {
-            "details.height": profile_data.get("height"),
-            "details.weight": profile_data.get("weight"),
-            "details.age": profile_data.get("age"),
-            "details.fitness_level": profile_data.get("fitness_level"),
-            "details.workout_time": profile_data.get("workout_time"),
-            "details.goal": profile_data.get("goal"),
-            "details.preferences": profile_data.get("preferences"),
-            "details.tailoring": profile_data.get("tailoring")
-            }}
-        )
-        
-        print(f"Update result: modified_count={result.modified_count}")
+        result = await db.update_user_details(profile_update.auth0_id, profile_details(profile_data))
         
         if result.modified_count == 0:
             # If no document was modified, it might be due to the document already having the same values
             # In this case, we still want to return success
             return {"message": "Profile already up to date or no changes needed"}
         else:
-            uid_to_session.pop(profile_update.auth0_id, None)  # Clear session if it exists
-            print(f"Session cleared for user: {profile_update.auth0_id}")
+            end_onboarding_session(profile_update.auth0_id)  # Clear session if it exists
         
         return {"message": "Fitness profile updated successfully"}
     
@@ -302,41 +590,23 @@ async def update_fitness_profile(profile_update: FitnessProfileUpdate):
         print(f"Error updating fitness profile: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/users/profile")
-async def get_user_profile(auth0_id: str):
-    try:
-        # Look up user in your database
-        user_data = users_collection.find_one({"auth0_id": auth0_id})
-        
-        if not user_data:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Check if user has authorized email
-        # if not verify_authorized_email(user_data.get("email", "")):
-        #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
-        
-        # Convert ObjectId to string for JSON serialization
-        if "_id" in user_data:
-            user_data["_id"] = str(user_data["_id"])
-        
-        return user_data
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        print(f"Error fetching user profile: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
 # Endpoint to create or retrieve a workout by ID
 @app.get("/workout/{workout_id}")
-async def get_workout_by_id(workout_id: str):
+async def get_workout_by_id(workout_id: str, wait: float = 0):
     # Check if workout exists
-    workout = workouts_collection.find_one({"workout_id": workout_id})
+    workout = await db.get_workout(workout_id)
     
+    if workout and workout.get("status") == "pending" and wait > 0:
+        # Long poll: answer as soon as the job finishes instead of on the client's next poll
+        if await workout_jobs.wait(workout_id, min(wait, WORKOUT_MAX_WAIT_SECONDS)):
+            workout = await db.get_workout(workout_id)
+
     if workout:
+        workout.setdefault("status", "ready")  # Generated before jobs existed
         # Get creator information if available
-        creator_id = workout.get("workout", {}).get("created_by")
+        creator_id = (workout.get("workout") or {}).get("created_by")
         if creator_id:
-            creator = users_collection.find_one({"auth0_id": creator_id})
+            creator = await db.get_user(creator_id, {"email": 1})
             # if creator and not verify_authorized_email(creator.get("email", "")):
             #     raise HTTPException(status_code=403, detail="Access denied. Workout creator not authorized.")
                 
@@ -347,85 +617,105 @@ async def get_workout_by_id(workout_id: str):
         # Workout doesn't exist
         raise HTTPException(status_code=404, detail="Workout not found")
 
-# Endpoint to generate a new workout
-@app.post("/workout/generate", response_model=WorkoutResponse)
+# Endpoint to generate a new workout. The workout is generated in the background:
+# the response carries its ID with status "pending", and GET /workout/{workout_id}
+# returns it once ready.
+@app.post("/workout/generate", response_model=WorkoutResponse, status_code=status.HTTP_202_ACCEPTED)
 async def generate_workout(request: WorkoutGenerationRequest):
     try:
         # Check if user exists and is authorized
         user = None
         if request.auth0_id:
-            user = users_collection.find_one({"auth0_id": request.auth0_id})
+            user = await db.get_user(request.auth0_id, {"details": 1, "email": 1})
             # if user and not verify_authorized_email(user.get("email", "")):
             #     raise HTTPException(status_code=403, detail="Access denied. Email not authorized.")
-        
+        details = (user or {}).get("details") or {}
+
         # Generate a unique workout ID
         workout_id = generate_workout_id()
-        
-        url = f"{os.getenv('VITE_APP_BACKEND_URL')}/users/" + request.auth0_id
-        headers = {"Content-Type": "application/json"}
-        response = requests.get(url, headers=headers)
 
-        print(response)
+        async def generate():
+            # Users with the same plan shape share one generated workout
+            cache_key = profile_cache_key(details)
+            workout, source = await workout_cache.get_or_generate(cache_key, lambda: generate_workout_data(details))
+            print(f"Workout {workout_id} served from {source}")
+            # The cache key is only stored with a finished workout, so the cache never finds a pending one
+            return {"workout": {**workout, "created_by": request.auth0_id}, "cache_key": cache_key}
+
+        # Prepare the pending workout document for MongoDB
+        workout_doc = {
+            "workout_id": workout_id,
+            "status": "pending",
+            "workout": None,
+            "created_at": datetime.utcnow(),
+        }
+
+        # Store it and queue the generation job
+        async with admission["generate"].admit(request.auth0_id):
+            await workout_jobs.submit(workout_id, workout_doc, generate)
+
+        # Create the shareable URL
+        share_url = f"{FRONTEND_URL}/workout/{workout_id}"
+
+        return {
+            "workout_id": workout_id,
+            "status": "pending",
+            "share_url": share_url
+        }
 
-        # workout_session.create_session_runner()
-        # workout_session.call_agent_async()
-        
-        # # # For now, let's create sample workouts based on type
-        # # workout_type = request.preferences.get("type", "cardio") if request.preferences else "cardio"
-        
-        # # if workout_type == "cardio":
-        # #     workout = {
-        # #         "type": "time-based",
-        # #         "name": "Cardio Blast",
-        # #         "duration": "30 minutes",
-        # #         "description": "A high-intensity cardio workout to get your heart pumping.",
-        # #         "exercises": [
-        # #             {"name": "Jumping Jacks", "description": "Classic cardio exercise.", "duration": "2 minutes"},
-        # #             {"name": "High Knees", "description": "Run in place bringing knees to chest height.", "duration": "2 minutes"},
-        # #             {"name": "Mountain Climbers", "description": "Dynamic plank with alternating knee drives.", "duration": "1 minute"},
-        # #             {"name": "Burpees", "description": "Full-body exercise combining squat, plank, and jump.", "duration": "1 minute"},
-        # #             {"name": "Rest", "description": "Take a short break.", "duration": "1 minute"}
-        # #         ],
-        # #         "created_by": request.auth0_id if request.auth0_id else None
-        # #     }
-        # # else:
-        # #     workout = {
-        # #         "type": "rep-based",
-        # #         "name": "Strength Builder",
-        # #         "description": "A full-body strength workout targeting major muscle groups.",
-        # #         "exercises": [
-        # #             {"name": "Push-Ups", "description": "Upper body pressing exercise.", "reps": 15},
-        # #             {"name": "Squats", "description": "Lower body exercise focusing on quadriceps.", "reps": 20},
-        # #             {"name": "Dumbbell Rows", "description": "Upper back pulling exercise.", "reps": 12},
-        # #             {"name": "Lunges", "description": "Lower body exercise for quads and glutes.", "reps": 10},
-        # #             {"name": "Plank", "description": "Core stabilization exercise.", "duration": "30 seconds"}
-        # #         ],
-        # #         "created_by": request.auth0_id if request.auth0_id else None
-        # #     }
-        
-        # # Prepare the workout document for MongoDB
-        # workout_doc = {
-        #     "workout_id": workout_id,
-        #     "workout": workout,
-        #     "created_at": datetime.utcnow(),
-        # }
-        
-        # # Store in MongoDB
-        # workouts_collection.insert_one(workout_doc)
-        
-        # # Create the shareable URL (adjust the domain for production)
-        # share_url = f"http://localhost:5173/workout/{workout_id}"
-        
-        # # Return the workout with its ID and share URL
-        # return {
-        #     "workout_id": workout_id,
-        #     "workout": workout,
-        #     "share_url": share_url
-        # }
-    
     except HTTPException as e:
         raise e
+    except JobQueueFull as e:
+        print(f"Rejected workout generation: {str(e)}")
+        raise HTTPException(status_code=503, detail="Workout generation is busy, please try again shortly.",
+                            headers={"Retry-After": "5"})
     except Exception as e:
         print(f"Error generating workout: {str(e)}")
         print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error generating workout: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error generating workout: {str(e)}")
+
+# --- Metrics read at scrape time ---
+# Component counters and queue depths are served at /metrics alongside the request metrics
+metrics.user_cache_entries.read = lambda: len(db.user_cache)
+metrics.admission_queue_depth.read = lambda: {(name,): limiter.queued for name, limiter in admission.items()}
+metrics.admission_active.read = lambda: {(name,): limiter.active for name, limiter in admission.items()}
+metrics.StatsGauges("session_registry", "Onboarding session registry.", uid_to_session.stats)
+metrics.StatsGauges("user_turns", "Per-user ordering and de-duplication of agent turns.", user_turns.stats)
+metrics.StatsGauges("profile_writer", "Batched writer of agent-created profiles.", profile_writer.stats)
+metrics.StatsGauges("onboarding_prewarm", "Onboarding sessions and greetings prepared ahead of time.",
+                    onboarding_prewarm.stats)
+metrics.StatsGauges("workout_cache", "Workouts cached per profile shape.", workout_cache.stats)
+metrics.StatsGauges("workout_jobs", "Background workout generations.", workout_jobs.stats)
+
+def agent_resilience_stats() -> dict:
+    # Agents that have not loaded yet have nothing to report; reading them would load the SDKs
+    stats = {}
+    if session_runner.loaded:
+        stats[("onboarding",)] = session_runner.agent_resilience.stats()
+    if workout_session.loaded:
+        stats[("workout",)] = workout_session.workout_resilience.stats()
+    return stats
+
+metrics.StatsGauges("agent_resilience", "Retries, timeouts, hedging and circuit breaker of an agent backend.",
+                    agent_resilience_stats, labels=("agent",))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, agent, Mongo, transcription, cache, admission and queue metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Profiles are read with the same token that requests them; without it they do not exist
+@app.get("/profiles")
+def list_profiles(x_profile: Optional[str] = Header(None)):
+    """Stored request profiles, newest first"""
+    if not profiling.authorized(x_profile):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return profiling.list_profiles()
+
+@app.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """One request profile as collapsed stacks, ready for flamegraph.pl or speedscope"""
+    path = profiling.profile_path(profile_id) if profiling.authorized(x_profile) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed")
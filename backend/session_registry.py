@@ -0,0 +1,122 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+
+class SessionRegistry:
+    """Bounded registry of live agent sessions keyed by user ID.
+
+    Entries are evicted least-recently-used once `max_sessions` is reached, and
+    by a background reaper once they have been idle for `idle_ttl` seconds.
+    `sizer(user_id, value)` reports the resident bytes of an entry and
+    `on_remove(user_id, value)` releases whatever backs it (e.g. the ADK session).
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl: float, sizer=None, on_remove=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sizer = sizer
+        self.on_remove = on_remove
+        # user_id -> [value, last_used, resident_bytes]
+        self._entries = OrderedDict()
+        self._reaper = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry, now: float) -> bool:
+        return now - entry[1] > self.idle_ttl
+
+    def _remove(self, user_id: str, evicted: bool):
+        value, _, _ = self._entries.pop(user_id)
+        if evicted:
+            self.evictions += 1
+        if self.on_remove:
+            try:
+                self.on_remove(user_id, value)
+            except Exception as e:
+                print(f"Error releasing session for user {user_id}: {e}")
+        return value
+
+    def get(self, user_id: str):
+        """Returns the live entry for a user, or None if it is missing or idle-expired."""
+        entry = self._entries.get(user_id)
+        now = time.monotonic()
+        if entry is None or self._expired(entry, now):
+            if entry is not None:
+                self._remove(user_id, evicted=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[1] = now
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def put(self, user_id: str, value):
+        """Registers a user's session, evicting the least recently used ones over capacity."""
+        self._entries[user_id] = [value, time.monotonic(), 0]
+        self._entries.move_to_end(user_id)
+        self.measure(user_id)
+        while len(self._entries) > self.max_sessions:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, evicted=True)
+
+    def pop(self, user_id: str):
+        """Drops a user's session explicitly, e.g. after their profile changed."""
+        if user_id not in self._entries:
+            return None
+        return self._remove(user_id, evicted=False)
+
+    def measure(self, user_id: str):
+        """Refreshes the resident-byte estimate for a user, typically after a turn."""
+        entry = self._entries.get(user_id)
+        if entry is None or self.sizer is None:
+            return
+        try:
+            entry[2] = self.sizer(user_id, entry[0])
+        except Exception as e:
+            print(f"Error measuring session for user {user_id}: {e}")
+
+    def reap(self) -> int:
+        """Evicts every idle-expired entry and returns how many were removed."""
+        now = time.monotonic()
+        expired = [user_id for user_id, entry in self._entries.items() if self._expired(entry, now)]
+        for user_id in expired:
+            self._remove(user_id, evicted=True)
+        return len(expired)
+
+    async def _reap_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.reap()
+
+    def start_reaper(self, interval: float = 60.0):
+        """Starts the background reaper on the running event loop."""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever(interval))
+
+    async def stop_reaper(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "resident_bytes": sum(entry[2] for entry in self._entries.values()),
+        }
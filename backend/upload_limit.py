@@ -0,0 +1,64 @@
+import json
+
+# --- Upload size limits ---
+# Key Concept: FastAPI parses a multipart body, and spools the whole upload to a
+# temporary file, before the endpoint runs, so a size check in the endpoint comes
+# too late to limit anything. This ASGI middleware enforces the limit while the body
+# arrives. A declared Content-Length over the limit is refused before any of the
+# body is read. A body without one (chunked) is counted as it streams and cut off
+# once it passes the limit.
+
+
+class UploadLimitMiddleware:
+    """Answers 413 to requests for `paths` whose body is larger than `max_bytes`."""
+
+    def __init__(self, app, paths: tuple, max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Upload too large"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        too_large = False
+        started = False
+
+        async def counting_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Looks like a disconnect to the app, which stops reading the body
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if too_large:
+                return  # The 413 below replaces whatever the app answers
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not started:
+            await self._reject(send)
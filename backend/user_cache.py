@@ -0,0 +1,114 @@
+import copy
+import time
+import itertools
+from collections import OrderedDict
+
+import metrics
+
+
+class UserCache:
+    """In-process TTL cache of user documents keyed by auth0_id.
+
+    An entry is either a complete document or a partial one that only proves the
+    user exists (what an existence check fetched). Callers always get copies, so
+    handlers are free to mutate what they read. Writers must invalidate. Hits, misses
+    and invalidations are counted in metrics (user_cache_*).
+
+    Readers take generation(auth0_id) before querying Mongo and hand it to put(),
+    which drops the document if the user was invalidated in between: a read that
+    started before a write would otherwise cache the old document after the write's
+    invalidation, for a whole TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # auth0_id -> (document, complete, expires_at)
+        self._entries = OrderedDict()
+        # Mongo _id -> auth0_id, for invalidations that only carry the document key
+        self._by_object_id = {}
+        # auth0_id -> generation of its last invalidation, most recent last. Users not
+        # listed are at _floor, which rises whenever generations are forgotten, so a
+        # generation taken before that never matches again.
+        self._generations = OrderedDict()
+        self._counter = itertools.count(1)
+        self._floor = 0
+
+    def _lookup(self, auth0_id: str):
+        entry = self._entries.get(auth0_id)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            self._drop(auth0_id)
+            return None
+        self._entries.move_to_end(auth0_id)
+        return entry
+
+    def get(self, auth0_id: str):
+        """Returns a copy of the cached complete document, or None."""
+        entry = self._lookup(auth0_id)
+        if entry is None or not entry[1]:
+            metrics.user_cache_lookups.inc("miss")
+            return None
+        metrics.user_cache_lookups.inc("hit")
+        return copy.deepcopy(entry[0])
+
+    def exists(self, auth0_id: str) -> bool:
+        """True if any entry, complete or partial, is cached for the user."""
+        if self._lookup(auth0_id) is None:
+            metrics.user_cache_lookups.inc("miss")
+            return False
+        metrics.user_cache_lookups.inc("hit")
+        return True
+
+    def generation(self, auth0_id: str):
+        """Token for put(); take it before reading the document from Mongo."""
+        return self._generations.get(auth0_id, self._floor)
+
+    def put(self, auth0_id: str, document: dict, generation, complete: bool = True):
+        if self.ttl <= 0:
+            return
+        if generation != self.generation(auth0_id):
+            return  # Invalidated while it was being read; the document may predate the write
+        existing = self._entries.get(auth0_id)
+        if existing is not None and existing[1] and not complete:
+            return  # Never downgrade a complete document to a partial one
+        self._entries[auth0_id] = (copy.deepcopy(document), complete, time.monotonic() + self.ttl)
+        self._entries.move_to_end(auth0_id)
+        if "_id" in document:
+            self._by_object_id[document["_id"]] = auth0_id
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, auth0_id: str):
+        document, _, _ = self._entries.pop(auth0_id)
+        self._by_object_id.pop(document.get("_id"), None)
+
+    def _forget_generations(self):
+        self._generations.clear()
+        self._floor = next(self._counter)
+
+    def invalidate(self, auth0_id: str):
+        self._generations[auth0_id] = next(self._counter)
+        self._generations.move_to_end(auth0_id)
+        if len(self._generations) > self.max_entries:
+            self._forget_generations()
+        if auth0_id in self._entries:
+            self._drop(auth0_id)
+            metrics.user_cache_invalidations.inc()
+
+    def invalidate_object_id(self, object_id):
+        auth0_id = self._by_object_id.get(object_id)
+        if auth0_id is not None:
+            self.invalidate(auth0_id)
+        else:
+            # Not cached, but it may be being read right now; only the document key is known
+            self._forget_generations()
+
+    def clear(self):
+        self._entries.clear()
+        self._by_object_id.clear()
+        self._forget_generations()
+
+    def __len__(self) -> int:
+        return len(self._entries)
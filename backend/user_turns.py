@@ -0,0 +1,99 @@
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+
+class UserTurns:
+    """Runs agent turns for the same user one at a time, in arrival order.
+
+    Different users proceed in parallel. A request retried with the same
+    idempotency key joins the turn already in flight, or gets its result back
+    if it finished within `idempotency_ttl` seconds, instead of calling the
+    model again.
+    """
+
+    def __init__(self, idempotency_ttl: float = 300.0, max_remembered: int = 10000):
+        self.idempotency_ttl = idempotency_ttl
+        self.max_remembered = max_remembered
+        # user_id -> [asyncio.Lock, number of turns holding or waiting for it]
+        self._locks = {}
+        # (user_id, idempotency_key) -> asyncio.Future
+        self._inflight = {}
+        # (user_id, idempotency_key) -> (result, finished_at)
+        self._completed = OrderedDict()
+        self.turns = 0
+        self.joined = 0
+        self.replayed = 0
+
+    @asynccontextmanager
+    async def user_lock(self, user_id: str):
+        """Holds the user's turn lock; asyncio.Lock wakes waiters first come, first served."""
+        entry = self._locks.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    def _remembered(self, key):
+        entry = self._completed.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.idempotency_ttl:
+            del self._completed[key]
+            return None
+        return entry
+
+    def _remember(self, key, result):
+        self._completed[key] = (result, time.monotonic())
+        while len(self._completed) > self.max_remembered:
+            self._completed.popitem(last=False)
+
+    async def run(self, user_id: str, turn, idempotency_key: str = None):
+        """Runs `turn()` (an async callable) as the user's next turn and returns its result."""
+        if idempotency_key is None:
+            self.turns += 1
+            async with self.user_lock(user_id):
+                return await turn()
+
+        key = (user_id, idempotency_key)
+        remembered = self._remembered(key)
+        if remembered is not None:
+            self.replayed += 1
+            return remembered[0]
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.joined += 1
+            return await asyncio.shield(inflight)
+
+        self.turns += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            async with self.user_lock(user_id):
+                result = await turn()
+            self._remember(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no retry joined
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {
+            "active_users": len(self._locks),
+            "queued_turns": sum(count for _, count in self._locks.values()),
+            "turns": self.turns,
+            "joined_duplicates": self.joined,
+            "replayed_duplicates": self.replayed,
+        }
@@ -0,0 +1,48 @@
+from typing import Optional
+from pydantic import BaseModel
+
+from fitness_agents.multi_tool_agent import workout_generator
+
+# Turns the workout agent's (or local engine's) exercise lists into the documents the
+# workout player reads. Shared by the API and the batch regeneration job.
+
+class Exercise(BaseModel):
+    name: str
+    description: str
+    duration: Optional[str] = None
+    reps: Optional[int] = None
+
+class WorkoutData(BaseModel):
+    type: str
+    name: str
+    duration: Optional[str] = None
+    description: str
+    exercises: list[Exercise]
+    created_by: Optional[str] = None  # Auth0 ID of creator
+
+def format_minutes(seconds: int) -> str:
+    """Formats a duration the way the workout player parses it, e.g. "2 minutes"."""
+    minutes = max(1, round(seconds / 60))
+    return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+
+def build_workout(exercises: workout_generator.Exercises, details: dict) -> dict:
+    """Turns the workout agent's parallel-list output into a WorkoutData document."""
+    time_based = sum(1 for kind in exercises.type if kind == "TIME BASED")
+    rep_based = len(exercises.type) > 0 and time_based * 2 < len(exercises.type)
+    exercise_list = []
+    for name, description, duration in zip(exercises.name, exercises.description, exercises.duration):
+        if rep_based:
+            # The agent only reports seconds; assume roughly three seconds per repetition
+            exercise_list.append(Exercise(name=name, description=description, reps=max(1, duration // 3)))
+        else:
+            exercise_list.append(Exercise(name=name, description=description, duration=format_minutes(duration)))
+
+    goal = details.get("goal") or "general fitness"
+    level = details.get("fitness_level") or "any"
+    return WorkoutData(
+        type="rep-based" if rep_based else "time-based",
+        name=f"{str(goal).title()} Workout",
+        duration=format_minutes(sum(exercises.duration)),
+        description=f"A {level}-level workout focused on {goal}.",
+        exercises=exercise_list,
+    ).model_dump()
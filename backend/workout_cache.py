@@ -0,0 +1,122 @@
+import re
+import json
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from collections import OrderedDict
+
+import db
+
+# Profile fields that decide what a generated workout looks like. Height, weight, age and
+# free-text tailoring are left out so users with the same plan shape share a workout.
+CACHE_KEY_FIELDS = ("fitness_level", "goal", "workout_time", "preferences")
+
+
+def _normalize(value) -> str:
+    if value is None:
+        return ""
+    text = str(value).lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+
+def profile_cache_key(details: dict) -> str:
+    """Hashes the normalized workout-shaping fields of a user's profile."""
+    normalized = {field: _normalize(details.get(field)) for field in CACHE_KEY_FIELDS}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class WorkoutCache:
+    """Two-tier cache of generated workouts keyed by `profile_cache_key`.
+
+    The first tier is an in-process LRU bounded by `max_entries` and `ttl` seconds.
+    The second tier is the workouts collection itself: every stored workout carries
+    its cache key, so a recent workout for the same profile shape is reused across
+    workers and restarts. Concurrent misses for one key share a single generation.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (workout, stored_at)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.generation_seconds = 0.0
+
+    def _get_memory(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _put_memory(self, key: str, workout: dict):
+        self._entries[key] = (workout, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_generate(self, key: str, generate):
+        """Returns (workout, source) where source is memory, shared, mongo or generated.
+
+        `generate` is an async callable producing the workout dict on a miss.
+        """
+        workout = self._get_memory(key)
+        if workout is not None:
+            self.memory_hits += 1
+            return workout, "memory"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.shared_hits += 1
+            # Shielded so a cancelled waiter does not cancel the generation others share
+            return await asyncio.shield(inflight), "shared"
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            since = datetime.utcnow() - timedelta(seconds=self.ttl)
+            stored = await db.find_recent_workout(key, since)
+            if stored is not None:
+                self.mongo_hits += 1
+                workout, source = stored["workout"], "mongo"
+            else:
+                self.misses += 1
+                start = time.perf_counter()
+                workout, source = await generate(), "generated"
+                self.generation_seconds += time.perf_counter() - start
+            self._put_memory(key, workout)
+            future.set_result(workout)
+            return workout, source
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.mongo_hits + self.shared_hits
+        lookups = hits + self.misses
+        average_generation = self.generation_seconds / self.misses if self.misses else 0.0
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "average_generation_seconds": average_generation,
+            "latency_saved_seconds": hits * average_generation,
+        }
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import traceback
+from datetime import datetime
+
+import db
+
+
+class JobQueueFull(Exception):
+    """Raised by submit when `max_pending` jobs are already waiting or running."""
+
+
+class WorkoutJobs:
+    """Bounded pool of asyncio workers that generate workouts in the background.
+
+    `submit` stores a pending workout document and queues its job; one of
+    `workers` tasks runs the job and writes the result (or the error) into the
+    same document, so clients poll GET /workout/{workout_id} until it is ready.
+    Generation capacity is sized here, independently of request concurrency.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        # workout_id -> asyncio.Event set when the job finishes, for long polling
+        self._done = {}
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.generation_seconds = 0.0
+
+    async def submit(self, workout_id: str, pending_doc: dict, generate):
+        """Stores `pending_doc` and queues `generate()`, an async callable returning the workout.
+
+        The pending document is written before the job is queued, so a worker's
+        result always has a document to land in.
+        """
+        if self.pending >= self.max_pending:
+            raise JobQueueFull(f"{self.pending} workout jobs pending")
+        self.pending += 1
+        try:
+            await db.insert_workout(pending_doc)
+        except Exception:
+            self.pending -= 1
+            raise
+        self._done[workout_id] = asyncio.Event()
+        self._queue.put_nowait((workout_id, generate))
+
+    async def wait(self, workout_id: str, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for a job of this process; True once it finished."""
+        done = self._done.get(workout_id)
+        if done is None:
+            return False
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def start(self):
+        """Starts the workers on the running event loop."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Finishes the queued jobs, so no workout is left pending, then stops the workers."""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            workout_id, generate = await self._queue.get()
+            try:
+                await self._run(workout_id, generate)
+            finally:
+                self.pending -= 1
+                self._done.pop(workout_id).set()
+                self._queue.task_done()
+
+    async def _run(self, workout_id: str, generate):
+        start = time.monotonic()
+        try:
+            fields = await generate()
+            self.generation_seconds += time.monotonic() - start
+            await db.update_workout(workout_id, {**fields, "status": "ready", "completed_at": datetime.utcnow()})
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Error generating workout {workout_id}: {str(e)}")
+            traceback.print_exc()
+            try:
+                await db.update_workout(workout_id, {"status": "failed", "error": str(e)})
+            except Exception as e:
+                print(f"Error marking workout {workout_id} as failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "queued": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "average_generation_seconds": self.generation_seconds / self.completed if self.completed else 0.0,
+        }
@@ -5,6 +5,55 @@ import { useAuth0 } from "@auth0/auth0-react";
 import { Link } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
 
+// Runs one agent turn over Server-Sent Events, calling onText with the reply so far
+// as chunks arrive. Resolves with the final reply text.
+async function streamAgentTurn(path: string, body: object, onText: (text: string) => void): Promise<string> {
+  const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Agent request failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let text = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer = (buffer + decoder.decode(value, { stream: true })).replace(/\r\n/g, "\n");
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = frame
+        .split("\n")
+        .filter(line => line.startsWith("data:"))
+        .map(line => line.slice(5).trim())
+        .join("\n");
+      if (!data) continue; // keep-alive comments
+
+      const item = JSON.parse(data);
+      if (item.type === "text") {
+        text += item.text;
+        onText(text);
+      } else if (item.type === "final") {
+        text = item.text;
+        onText(text);
+      } else if (item.type === "error") {
+        throw new Error(item.message);
+      }
+    }
+  }
+  return text;
+}
+
 function WorkoutPage() {
   const [isRecording, setIsRecording] = useState(false);
   const [transcription, setTranscription] = useState("");
@@ -51,18 +100,11 @@ function WorkoutPage() {
         return;
       }
 
-      const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/onboarding/start_onboarding`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ auth0_id: auth0Id }),
+      await streamAgentTurn('/onboarding/start_onboarding/stream', { auth0_id: auth0Id }, (text) => {
+        // Show the greeting as soon as the first words arrive
+        setIsLoadingAgent(false);
+        setAgentMessages([text]);
       });
-
-      const data = await response.json();
-      if (data.message) {
-        setAgentMessages([data.message]);
-      }
     } catch (error) {
       console.error("Error starting workout conversation:", error);
       setAgentMessages(["Sorry, I couldn't connect to the workout assistant."]);
@@ -111,6 +153,10 @@ function WorkoutPage() {
     try {
       const formData = new FormData();
       formData.append('file', audioBlob, 'recording.wav');
+      if (user?.sub) {
+        // Rate limited per user rather than per address
+        formData.append('auth0_id', user.sub);
+      }
 
       const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/transcribe/`, {
         method: 'POST',
@@ -140,22 +186,17 @@ function WorkoutPage() {
       console.log(user);
       const auth0Id = user?.sub;
 
-      const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/workouts/add_to_workout_conversation`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          auth0_id: auth0Id,
-          message: transcription
-        }),
+      let started = false;
+      await streamAgentTurn('/workouts/add_to_workout_conversation/stream', {
+        auth0_id: auth0Id,
+        message: transcription
+      }, (text) => {
+        // Add the assistant's response to the message list, then keep growing it in place
+        const append = !started;
+        started = true;
+        setIsLoadingAgent(false);
+        setAgentMessages(prevMessages => append ? [...prevMessages, text] : [...prevMessages.slice(0, -1), text]);
       });
-
-      const data = await response.json();
-      if (data.message) {
-        // Add the assistant's response to the message list
-        setAgentMessages(prevMessages => [...prevMessages, data.message]);
-      }
     } catch (error) {
       console.error("Error sending transcription to workout assistant:", error);
       setAgentMessages(prevMessages => [
@@ -20,10 +20,28 @@ interface Workout {
 
 interface WorkoutResponse {
   workout_id: string;
-  workout: Workout;
+  status: "pending" | "ready" | "failed";
+  workout: Workout | null;
   share_url: string;
 }
 
+// Workouts are generated in the background; long-poll until the job has finished
+async function awaitWorkout(workoutId: string): Promise<Workout> {
+  for (;;) {
+    const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/workout/${workoutId}?wait=20`);
+    if (!response.ok) {
+      throw new Error('Workout not found');
+    }
+    const data = await response.json();
+    if (data.status === 'failed') {
+      throw new Error('Failed to generate workout');
+    }
+    if (data.status !== 'pending') {
+      return data.workout;
+    }
+  }
+}
+
 function formatTime(seconds: number): string {
   const mins = Math.floor(seconds / 60);
   const secs = seconds % 60;
@@ -205,13 +223,8 @@ function WorkoutSession() {
       setIsLoading(true);
       try {
         if (workoutId) {
-          const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/workout/${workoutId}`);
-          if (!response.ok) {
-            throw new Error('Workout not found');
-          }
-          const data = await response.json();
-          setWorkout(data.workout);
-          setWorkoutUrl(`${window.location.origin}/workout/${data.workout_id}`);
+          setWorkout(await awaitWorkout(workoutId));
+          setWorkoutUrl(`${window.location.origin}/workout/${workoutId}`);
         } else {
           console.log(import.meta.env.VITE_APP_BACKEND_URL);
           const response = await fetch(`${import.meta.env.VITE_APP_BACKEND_URL}/workout/generate`, {
@@ -232,9 +245,9 @@ function WorkoutSession() {
           }
 
           const data: WorkoutResponse = await response.json();
-          setWorkout(data.workout);
-          setWorkoutUrl(data.share_url);
           window.history.pushState({}, '', `/workout/${data.workout_id}`);
+          setWorkoutUrl(data.share_url);
+          setWorkout(data.workout ?? await awaitWorkout(data.workout_id));
         }
       } catch (err) {
         console.error('Error fetching workout:', err);